@@ -0,0 +1,75 @@
+"""
+Compare two benchmark result files (load_test or other benchmark scripts)
+
+Usage (from backend/):
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/new.json
+"""
+import argparse
+import json
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def change(base: float, new: float) -> str:
+    if not base:
+        return "n/a"
+    return f"{(new - base) / base * 100:+.1f}%"
+
+
+def case_key(result: dict) -> str:
+    if "name" in result:
+        return f"{result['name']} {json.dumps(result.get('params', {}), ensure_ascii=False, sort_keys=True)}"
+    # eval_retrieval configuration
+    return f"x{result['chunk_scale']} {result['backend']}:{result['index_type']} rk={result['rerank_top_k']} k={result['final_top_k']} a={result['alpha']}"
+
+
+def case_value(result: dict) -> float:
+    if "wall_ms" in result:
+        return result["wall_ms"]["median"]
+    return result["latency_ms"]["total"]["p95"]
+
+
+def compare_cases(base_results: list, new_results: list):
+    """Match per-case results (microbench, eval_retrieval) by name and parameters"""
+    base_cases = {case_key(result): result for result in base_results}
+    print(f"\n{'case':<64}{'base ms':>12}{'new ms':>12}{'change':>10}")
+    for result in new_results:
+        key = case_key(result)
+        if key not in base_cases:
+            continue
+        base_value, new_value = case_value(base_cases[key]), case_value(result)
+        print(f"{key:<64}{base_value:>12}{new_value:>12}{change(base_value, new_value):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p95", choices=["mean", "p50", "p95", "p99", "max"])
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    print(f"base: {base['meta'].get('git_commit')} {base['meta'].get('timestamp')}")
+    print(f"new:  {new['meta'].get('git_commit')} {new['meta'].get('timestamp')}")
+
+    if "summary" in base and "summary" in new:
+        base_rps, new_rps = base["summary"]["throughput_rps"], new["summary"]["throughput_rps"]
+        print(f"\nthroughput: {base_rps} -> {new_rps} req/s ({change(base_rps, new_rps)})")
+
+    if "results" in base and "results" in new:
+        compare_cases(base["results"], new["results"])
+        return
+
+    print(f"\n{'stage':<28}{'base ' + args.metric:>14}{'new ' + args.metric:>14}{'change':>10}")
+    base_latency, new_latency = base.get("latency_ms", {}), new.get("latency_ms", {})
+    for stage in sorted(set(base_latency) | set(new_latency)):
+        base_value = base_latency.get(stage, {}).get(args.metric)
+        new_value = new_latency.get(stage, {}).get(args.metric)
+        print(f"{stage:<28}{str(base_value):>14}{str(new_value):>14}{change(base_value, new_value) if base_value is not None and new_value is not None else '':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Offline retrieval quality + latency evaluation
+
+Sweeps chunking (FIELD_CHUNK_CONFIG scale), index type, RERANK_TOP_K, FINAL_TOP_K and
+RERANK_ALPHA over a labeled question set and reports recall@k, MRR and nDCG@k next to
+per-query latency, then recommends the fastest configuration that holds quality.
+
+Labeled set (JSON list or JSONL), one item per question:
+    {"question": "...", "relevant": [{"species": "Rắn hổ mang chúa", "field": "Độc tính"}]}
+"field" may be omitted to accept any field of the species. Without --questions/--corpus a
+synthetic corpus and question set are used so the tool runs offline.
+
+Usage (from backend/):
+    python -m benchmarks.eval_retrieval --corpus data/snakes.json --questions data/labeled.jsonl \\
+        --indexes faiss:flat,faiss:hnsw,faiss:ivf,qdrant:hnsw --rerank-top-k 0,10,15,20 --final-top-k 3,5 --alpha 0.5,0.7
+
+With --fit-fusion, LEARNED_FUSION_WEIGHTS / LEARNED_FUSION_BIAS are fitted (logistic regression
+on cross-encoder and dense scores of the RERANK_TOP_K candidates) and printed for RagConfig.
+"""
+import argparse
+import json
+import math
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Tuple
+import numpy as np
+from config.rag_config import RagConfig
+from rag.context_assembler import ContextAssembler
+from rag.document_processor import DocumentProcessor
+from rag.fusion import LearnedFusion
+from benchmarks.stubs import build_synthetic_corpus, build_labeled_questions
+from benchmarks.reporting import summarize, run_metadata, write_results
+
+
+def load_json_or_jsonl(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def normalize_labels(item: Dict) -> List[Tuple[str, str]]:
+    """(species, field) pairs of a labeled question; field is None when any field counts"""
+    relevant = item.get("relevant") or [{"species": item["species"], "field": item.get("field")}]
+    return [(label["species"].strip().lower(), label.get("field")) for label in relevant]
+
+
+class RelevanceJudge:
+    """Decides chunk relevance from the "{species} - {field}: " prefix every chunk carries"""
+
+    def __init__(self):
+        self.assembler = ContextAssembler()
+
+    def source(self, chunk: str) -> Tuple[str, str]:
+        snake_name, field, _ = self.assembler.split_prefix(chunk)
+        return (snake_name or "").strip().lower(), field
+
+    def matching_labels(self, chunk: str, labels: List[Tuple[str, str]]) -> List[int]:
+        species, field = self.source(chunk)
+        return [i for i, (label_species, label_field) in enumerate(labels)
+                if species == label_species and (label_field is None or field == label_field)]
+
+
+def score_ranking(ranked: List[str], labels: List[Tuple[str, str]], total_relevant: int, k: int, judge: RelevanceJudge) -> Dict[str, float]:
+    """
+    recall@k (share of labels covered), reciprocal rank and binary nDCG@k
+
+    Args:
+        ranked: Retrieved chunks, best first
+        labels: Relevant (species, field) labels
+        total_relevant: Relevant chunks in the whole corpus (for the ideal DCG)
+        k: Cut-off
+    """
+    covered = set()
+    reciprocal_rank = 0.0
+    dcg = 0.0
+    for rank, chunk in enumerate(ranked[:k], start=1):
+        matches = judge.matching_labels(chunk, labels)
+        if not matches:
+            continue
+        covered.update(matches)
+        if reciprocal_rank == 0.0:
+            reciprocal_rank = 1.0 / rank
+        dcg += 1.0 / math.log2(rank + 1)
+
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, total_relevant) + 1))
+    return {
+        "recall": len(covered) / len(labels) if labels else 0.0,
+        "mrr": reciprocal_rank,
+        "ndcg": dcg / ideal if ideal > 0 else 0.0
+    }
+
+
+def fit_fusion(reranker, questions: List[str], hits: List[Tuple[List[str], List[float]]], labels: List[List[Tuple[str, str]]], judge: RelevanceJudge) -> Dict:
+    """
+    Fit LearnedFusion on the retrieved candidates of every question
+
+    Args:
+        reranker: CrossEncoderReranker (uncached)
+        questions: Labeled questions
+        hits: (texts, similarity scores) retrieved for each question
+        labels: Relevant (species, field) labels of each question
+
+    Returns:
+        Fitted weights ([cross-encoder, dense], the order rerank_with_original_scores fuses in) and bias
+    """
+    signals, targets = [], []
+    for question, (texts, similarity_scores), query_labels in zip(questions, hits, labels):
+        if not texts:
+            continue
+        signals.append([reranker.predict_scores(question, texts), np.asarray(similarity_scores, dtype=np.float32)])
+        targets.append(np.array([1.0 if judge.matching_labels(text, query_labels) else 0.0 for text in texts]))
+    fusion = LearnedFusion.fit(signals, targets)
+    return {
+        "weights": fusion.weights.tolist(),
+        "bias": fusion.bias,
+        "candidates": int(sum(len(target) for target in targets)),
+        "relevant": int(sum(target.sum() for target in targets))
+    }
+
+
+@contextmanager
+def scaled_chunk_config(scale: float):
+    """Temporarily scale chunk_size and chunk_overlap of every field"""
+    original = RagConfig.FIELD_CHUNK_CONFIG
+    RagConfig.FIELD_CHUNK_CONFIG = {
+        field: {key: max(1, int(round(value * scale))) for key, value in config.items()}
+        for field, config in original.items()
+    }
+    try:
+        yield
+    finally:
+        RagConfig.FIELD_CHUNK_CONFIG = original
+
+
+def build_store(backend: str, index_type: str, embeddings, chunks: List[str]):
+    """In-memory vector store of the given backend and index type"""
+    if backend == "qdrant":
+        from rag.qdrant_vector_store import QdrantVectorStore
+        store = QdrantVectorStore(location=":memory:", collection_name="eval")
+    else:
+        from rag.vector_store import FAISSVectorStore
+        store = FAISSVectorStore(index_type=index_type)
+    store.add_embeddings(embeddings, chunks)
+    return store
+
+
+def parse_list(value: str, cast):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def evaluate(args) -> Dict:
+    if args.corpus:
+        documents = load_json_or_jsonl(args.corpus)
+    else:
+        documents = build_synthetic_corpus(args.species)
+    labeled = load_json_or_jsonl(args.questions) if args.questions else build_labeled_questions(documents, args.num_questions)
+    if args.limit:
+        labeled = labeled[:args.limit]
+
+    # Imported here so the scoring helpers can be used without the embedding model's dependencies
+    from rag.embeddings import EmbeddingGenerator
+
+    judge = RelevanceJudge()
+    processor = DocumentProcessor()
+    embedder = EmbeddingGenerator()
+
+    rerank_top_ks = parse_list(args.rerank_top_k, int)
+    final_top_ks = parse_list(args.final_top_k, int)
+    alphas = parse_list(args.alpha, float)
+    index_specs = [tuple(spec.split(":")) for spec in parse_list(args.indexes, str)]
+
+    reranker = None
+    if args.fit_fusion or any(rerank_top_k > 0 for rerank_top_k in rerank_top_ks):
+        from rag.reranker import CrossEncoderReranker
+        # No score cache: every configuration pays the real cross-encoder cost
+        reranker = CrossEncoderReranker(RagConfig.CROSS_ENCODER_MODEL, cache_size=0)
+
+    # Query embeddings do not depend on the swept parameters
+    questions = [item["question"] for item in labeled]
+    labels = [normalize_labels(item) for item in labeled]
+    query_embeddings, embed_ms = [], []
+    for question in questions:
+        start = time.perf_counter()
+        query_embeddings.append(embedder.generate_single_embedding(question))
+        embed_ms.append((time.perf_counter() - start) * 1000)
+
+    results = []
+    fitted_fusion = None
+    for chunk_scale in parse_list(args.chunk_scale, float):
+        with scaled_chunk_config(chunk_scale):
+            chunks = processor.process_document_with_metadata(documents)
+        embeddings = embedder.generate_embeddings(chunks, show_progress=False)
+        total_relevant = [sum(1 for chunk in chunks if judge.matching_labels(chunk, query_labels)) for query_labels in labels]
+
+        for backend, index_type in index_specs:
+            store = build_store(backend, index_type, embeddings, chunks)
+
+            # One search per retrieval depth, shared by the configurations using it
+            depths = sorted({rerank_top_k if rerank_top_k > 0 else final_top_k for rerank_top_k in rerank_top_ks for final_top_k in final_top_ks})
+            if args.fit_fusion:
+                depths = sorted(set(depths) | {RagConfig.RERANK_TOP_K})
+            searches = {}
+            for depth in depths:
+                hits, search_ms = [], []
+                for query_embedding in query_embeddings:
+                    start = time.perf_counter()
+                    hits.append(store.search(query_embedding, depth))
+                    search_ms.append((time.perf_counter() - start) * 1000)
+                searches[depth] = (hits, search_ms)
+
+            if args.fit_fusion and fitted_fusion is None:
+                # Fitted once, on the first chunking / index configuration
+                fitted_fusion = fit_fusion(reranker, questions, searches[RagConfig.RERANK_TOP_K][0], labels, judge)
+
+            for rerank_top_k in rerank_top_ks:
+                for final_top_k in final_top_ks:
+                    if 0 < rerank_top_k < final_top_k:
+                        continue
+                    for alpha in (alphas if rerank_top_k > 0 else [None]):
+                        hits, search_ms = searches[rerank_top_k if rerank_top_k > 0 else final_top_k]
+                        scores = {"recall": [], "mrr": [], "ndcg": []}
+                        rerank_ms, total_ms = [], []
+                        for i, (texts, similarity_scores) in enumerate(hits):
+                            elapsed = 0.0
+                            if rerank_top_k > 0 and texts:
+                                start = time.perf_counter()
+                                ranked = reranker.rerank_with_original_scores(
+                                    questions[i], list(zip(texts, similarity_scores)), alpha=alpha, top_k=final_top_k
+                                ).texts
+                                elapsed = (time.perf_counter() - start) * 1000
+                            else:
+                                ranked = texts[:final_top_k]
+                            rerank_ms.append(elapsed)
+                            total_ms.append(embed_ms[i] + search_ms[i] + elapsed)
+
+                            for metric, value in score_ranking(ranked, labels[i], total_relevant[i], final_top_k, judge).items():
+                                scores[metric].append(value)
+
+                        results.append({
+                            "chunk_scale": chunk_scale,
+                            "chunks": len(chunks),
+                            "backend": backend,
+                            "index_type": index_type,
+                            "rerank_top_k": rerank_top_k,
+                            "final_top_k": final_top_k,
+                            "alpha": alpha,
+                            "quality": {metric: round(sum(values) / len(values), 4) for metric, values in scores.items()},
+                            "latency_ms": {
+                                "embed": summarize(embed_ms),
+                                "search": summarize(search_ms),
+                                "rerank": summarize(rerank_ms),
+                                "total": summarize(total_ms)
+                            }
+                        })
+
+    return {
+        "meta": {
+            **run_metadata(args),
+            "questions": len(labeled),
+            "documents": len(documents),
+            "cross_encoder_model": RagConfig.CROSS_ENCODER_MODEL,
+            "fusion_strategy": RagConfig.FUSION_STRATEGY
+        },
+        "results": results,
+        "recommendation": recommend(results, args.tolerance),
+        "fitted_fusion": fitted_fusion
+    }
+
+
+def recommend(results: List[Dict], tolerance: float) -> Dict:
+    """Fastest configuration (p95 total latency) whose nDCG and recall are within tolerance of the best"""
+    if not results:
+        return {}
+    best_ndcg = max(result["quality"]["ndcg"] for result in results)
+    best_recall = max(result["quality"]["recall"] for result in results)
+    eligible = [
+        result for result in results
+        if result["quality"]["ndcg"] >= best_ndcg - tolerance and result["quality"]["recall"] >= best_recall - tolerance
+    ]
+    fastest = min(eligible, key=lambda result: result["latency_ms"]["total"]["p95"])
+    return {"best_ndcg": best_ndcg, "best_recall": best_recall, "tolerance": tolerance, "config": fastest}
+
+
+def label(result: Dict) -> str:
+    alpha = "-" if result["alpha"] is None else result["alpha"]
+    return f"x{result['chunk_scale']} {result['backend']}:{result['index_type']} rk={result['rerank_top_k']} k={result['final_top_k']} a={alpha}"
+
+
+def print_report(report: Dict):
+    print(f"\n{'config':<48}{'recall':>8}{'mrr':>8}{'ndcg':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in sorted(report["results"], key=lambda result: result["latency_ms"]["total"]["p95"]):
+        quality, total = result["quality"], result["latency_ms"]["total"]
+        print(f"{label(result):<48}{quality['recall']:>8}{quality['mrr']:>8}{quality['ndcg']:>8}{total['p50']:>10}{total['p95']:>10}")
+    if report["recommendation"]:
+        print(f"\nRecommended (fastest within {report['recommendation']['tolerance']} of best quality): {label(report['recommendation']['config'])}")
+    if report["fitted_fusion"]:
+        fitted = report["fitted_fusion"]
+        print(f"\nFitted on {fitted['candidates']} candidates ({fitted['relevant']} relevant), for RagConfig:")
+        print(f"    LEARNED_FUSION_WEIGHTS = {fitted['weights']}")
+        print(f"    LEARNED_FUSION_BIAS = {fitted['bias']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency across RAG settings")
+    parser.add_argument("--corpus", default=None, help="Documents (JSON/JSONL) in the ingest_documents_with_metadata format")
+    parser.add_argument("--questions", default=None, help="Labeled questions (JSON/JSONL)")
+    parser.add_argument("--species", type=int, default=100, help="Synthetic corpus size when --corpus is not given")
+    parser.add_argument("--num-questions", type=int, default=100, help="Synthetic questions when --questions is not given")
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate only the first N questions")
+    parser.add_argument("--chunk-scale", default="1.0", help="Comma-separated FIELD_CHUNK_CONFIG scale factors")
+    parser.add_argument("--indexes", default="faiss:flat,faiss:hnsw,faiss:ivf", help="Comma-separated backend:index_type (qdrant:hnsw runs in-memory Qdrant)")
+    parser.add_argument("--rerank-top-k", default=f"0,{RagConfig.RERANK_TOP_K}", help="Comma-separated RERANK_TOP_K values (0 = no re-ranking)")
+    parser.add_argument("--final-top-k", default=str(RagConfig.FINAL_TOP_K), help="Comma-separated FINAL_TOP_K values")
+    parser.add_argument("--alpha", default=str(RagConfig.RERANK_ALPHA), help="Comma-separated RERANK_ALPHA values")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed nDCG/recall drop for the recommendation")
+    parser.add_argument("--fit-fusion", action="store_true", help="Fit LEARNED_FUSION_WEIGHTS / LEARNED_FUSION_BIAS on the labeled set")
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = evaluate(args)
+    print_report(report)
+    print(f"Results written to {write_results(report, 'eval_retrieval', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+End-to-end load test for /chat/prompt
+
+Runs the FastAPI app in-process with a stub LLM and an in-memory FAISS or Qdrant
+index built from a synthetic snake corpus; the E5 embedder, cross-encoder and
+ConvNeXt models are the real local ones.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --mode text --concurrency 8 --requests 200
+    python -m benchmarks.load_test --mode both --backend qdrant --llm-latency 1.5
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import List, Dict
+import httpx
+from config.rag_config import RagConfig
+from benchmarks.stubs import StubLLM, build_synthetic_corpus, build_questions
+from benchmarks.reporting import summarize, run_metadata, write_results
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "snake.jpg")
+
+
+def build_app(args):
+    """Import the real app and swap the chat dependencies for benchmark instances"""
+    from main import app
+    from routers.chat_router import get_rag_service, get_image_service
+    from rag.llm_gateway import LLMGateway
+    from services.RagService import RagService
+    from services.ImageService import ImageService
+
+    if args.backend == "qdrant":
+        from rag.qdrant_vector_store import QdrantVectorStore
+        vector_store = QdrantVectorStore(location=":memory:", collection_name="benchmark")
+    else:
+        from rag.vector_store import FAISSVectorStore
+        vector_store = FAISSVectorStore()
+        vector_store.index_path = os.path.join(tempfile.mkdtemp(prefix="asksnake-bench-"), "faiss_index")
+
+    llm = StubLLM(latency=args.llm_latency, jitter=args.llm_jitter)
+    gateway = LLMGateway(
+        llm,
+        requests_per_minute=args.llm_rpm,
+        min_interval=0,
+        burst_size=max(1, args.concurrency),
+        max_queue_size=max(RagConfig.LLM_MAX_QUEUE_SIZE, args.concurrency * 2)
+    )
+    rag_service = RagService(llm=llm, vector_store=vector_store, llm_gateway=gateway)
+
+    documents = build_synthetic_corpus(args.species)
+    ingest_start = time.perf_counter()
+    stats = rag_service.ingest_documents_with_metadata(documents)
+    ingest_seconds = time.perf_counter() - ingest_start
+
+    app.dependency_overrides[get_rag_service] = lambda: rag_service
+    # All benchmark traffic comes from one client IP and there may be no MongoDB
+    RagConfig.USE_QUOTA = False
+    if args.mode != "text":
+        image_service = ImageService()
+        image_service.warm_up()
+        app.dependency_overrides[get_image_service] = lambda: image_service
+
+    corpus_info = {
+        "species": args.species,
+        "chunks": stats["total_chunks"],
+        "ingest_seconds": round(ingest_seconds, 2)
+    }
+    return app, documents, corpus_info
+
+
+async def run_load(client: httpx.AsyncClient, args, questions: List[str], image_bytes: bytes) -> Dict:
+    """Drive /chat/prompt with a fixed number of concurrent workers"""
+    stage_latencies = defaultdict(list)
+    end_to_end = []
+    status_codes = Counter()
+    errors = Counter()
+    degradations = Counter()
+    counter = iter(range(args.requests))
+    rng = random.Random(args.seed)
+    modes = ["text", "image", "both"] if args.mode == "mixed" else [args.mode]
+
+    async def send_one(record: bool):
+        mode = rng.choice(modes)
+        data = {"message": rng.choice(questions)} if mode != "image" else {}
+        files = {"file": ("snake.jpg", image_bytes, "image/jpeg")} if mode != "text" else None
+
+        headers = {"X-Request-Deadline-Ms": str(args.deadline_ms)} if args.deadline_ms else None
+
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat/prompt", data=data, files=files, headers=headers)
+        except Exception as e:
+            if record:
+                errors[type(e).__name__] += 1
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        if not record:
+            return
+
+        status_codes[response.status_code] += 1
+        if response.status_code != 200:
+            return
+        end_to_end.append(elapsed)
+        stage_latencies[f"end_to_end_{mode}"].append(elapsed)
+        body = response.json()
+        for stage, value in body.get("timings", {}).items():
+            stage_latencies[stage].append(value)
+        degradations.update(body.get("degradations", []))
+
+    async def worker():
+        for _ in counter:
+            await send_one(record=True)
+
+    for _ in range(args.warmup):
+        await send_one(record=False)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    duration = time.perf_counter() - start
+
+    return {
+        "summary": {
+            "requests": args.requests,
+            "succeeded": len(end_to_end),
+            "status_codes": {str(code): count for code, count in status_codes.items()},
+            "errors": dict(errors),
+            "degradations": dict(degradations),
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(len(end_to_end) / duration, 3) if duration > 0 else 0.0
+        },
+        "latency_ms": {
+            "end_to_end": summarize(end_to_end),
+            **{stage: summarize(values) for stage, values in sorted(stage_latencies.items())}
+        }
+    }
+
+
+async def main_async(args):
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    if args.url:
+        # Drive an already running server (its own LLM, index and models)
+        questions = build_questions(build_synthetic_corpus(args.species), seed=args.seed)
+        corpus_info = {"external_server": args.url}
+        transport_client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        app, documents, corpus_info = build_app(args)
+        questions = build_questions(documents, seed=args.seed)
+        transport_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+    async with transport_client as client:
+        results = await run_load(client, args, questions, image_bytes)
+
+    return {
+        "meta": {
+            **run_metadata(args),
+            "corpus": corpus_info,
+            "config": {
+                "vector_backend": args.backend,
+                "embedding_model": RagConfig.EMBEDDING_MODEL,
+                "use_reranking": RagConfig.USE_RERANKING,
+                "cross_encoder_model": RagConfig.CROSS_ENCODER_MODEL,
+                "cascade_rerank": RagConfig.USE_CASCADE_RERANK,
+                "adaptive_rerank": RagConfig.USE_ADAPTIVE_RERANK,
+                "fusion_strategy": RagConfig.FUSION_STRATEGY,
+                "rerank_top_k": RagConfig.RERANK_TOP_K,
+                "final_top_k": RagConfig.FINAL_TOP_K,
+                "context_assembly": RagConfig.USE_CONTEXT_ASSEMBLY
+            }
+        },
+        **results
+    }
+
+
+def print_report(report: Dict):
+    summary = report["summary"]
+    print(f"\n{summary['succeeded']}/{summary['requests']} succeeded in {summary['duration_seconds']}s "
+          f"-> {summary['throughput_rps']} req/s  status={summary['status_codes']} errors={summary['errors']}")
+    if summary.get("degradations"):
+        print(f"degradations: {summary['degradations']}")
+    print(f"{'stage':<24}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for stage, stats in report["latency_ms"].items():
+        if stats.get("count"):
+            print(f"{stage:<24}{stats['count']:>7}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test /chat/prompt with local stand-ins")
+    parser.add_argument("--mode", choices=["text", "image", "both", "mixed"], default="text")
+    parser.add_argument("--backend", choices=["faiss", "qdrant"], default="faiss", help="In-memory vector index")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded requests sent before measuring")
+    parser.add_argument("--species", type=int, default=100, help="Documents in the synthetic corpus")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub LLM latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-rpm", type=float, default=60000, help="Gateway rate limit for the stub LLM")
+    parser.add_argument("--deadline-ms", type=int, default=None, help="Per-request deadline sent as X-Request-Deadline-Ms")
+    parser.add_argument("--image", default=DEFAULT_IMAGE)
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of an in-process app")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Result JSON path (default: benchmarks/results/<time>_<commit>_load_<mode>.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    output = write_results(report, f"load_{args.mode}", args.output)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
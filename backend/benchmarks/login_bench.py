@@ -0,0 +1,100 @@
+"""
+Login throughput under concurrency: bcrypt on the event loop vs the hashing pool
+
+Runs N concurrent password verifications (the CPU part of POST /auth/login) for a fixed
+duration, once the old way ("inline": a new CryptContext per call, verify on the event
+loop) and once through AuthUtils.averify_and_update ("pool": shared context on the
+password hashing thread pool). A ticker coroutine measures event loop lag meanwhile,
+which is what every other request on the worker waits for. Runs offline, no MongoDB.
+
+Usage (from backend/):
+    python -m benchmarks.login_bench --concurrency 16 --duration 10
+    BCRYPT_ROUNDS=10 PASSWORD_HASH_WORKERS=8 python -m benchmarks.login_bench
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+from passlib.context import CryptContext
+from benchmarks.reporting import summarize, run_metadata, write_results
+from utils.AuthUtlis import AuthUtils, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, pwd_context
+
+PASSWORD = "correct horse battery staple"
+
+
+def inline_verify(password: str, hashed_password: str):
+    # Pre-pool behaviour of AuthUtils.verify_password
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return context.verify(password, hashed_password), None
+
+
+async def measure_lag(stop: asyncio.Event, lags: List[float], interval: float = 0.01):
+    """Record how late a periodic timer fires (ms) while the logins run"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, (time.perf_counter() - start - interval) * 1000))
+
+
+async def run_case(mode: str, hashed_password: str, args) -> Dict:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    deadline = time.perf_counter() + args.duration
+
+    async def login_loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if mode == "inline":
+                valid, _ = inline_verify(PASSWORD, hashed_password)
+                # Yield like the awaited DB calls around the check would
+                await asyncio.sleep(0)
+            else:
+                valid, _ = await AuthUtils.averify_and_update(PASSWORD, hashed_password)
+            assert valid
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.gather(*(login_loop() for _ in range(args.concurrency)))
+    stop.set()
+    await ticker
+
+    result = {
+        "name": "login",
+        "params": {"mode": mode, "concurrency": args.concurrency, "rounds": BCRYPT_ROUNDS, "hash_workers": PASSWORD_HASH_WORKERS},
+        "throughput_rps": round(len(latencies) / args.duration, 2),
+        "latency_ms": summarize(latencies),
+        "event_loop_lag_ms": summarize(lags)
+    }
+    print(
+        f"{mode:<8}{result['throughput_rps']:>12}{result['latency_ms'].get('p50', '-'):>12}"
+        f"{result['latency_ms'].get('p95', '-'):>12}{result['event_loop_lag_ms'].get('p99', '-'):>14}"
+        f"{result['event_loop_lag_ms'].get('max', '-'):>14}"
+    )
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Login (bcrypt verify) throughput and event loop lag")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent login loops")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per mode")
+    parser.add_argument("--modes", default="inline,pool", help="inline (old, on the event loop), pool (hashing thread pool)")
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+async def run(args):
+    hashed_password = pwd_context.hash(PASSWORD)
+    print(f"bcrypt rounds={BCRYPT_ROUNDS} hash_workers={PASSWORD_HASH_WORKERS} concurrency={args.concurrency}")
+    print(f"{'mode':<8}{'logins/s':>12}{'p50 ms':>12}{'p95 ms':>12}{'lag p99 ms':>14}{'lag max ms':>14}")
+    return [await run_case(mode.strip(), hashed_password, args) for mode in args.modes.split(",")]
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    report = {"meta": run_metadata(args), "results": results}
+    print(f"Results written to {write_results(report, 'login', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Component microbenchmarks on synthetic data (runs offline)
+
+Each case reports wall time over repeated runs plus allocations and peak memory of one
+extra traced run (tracemalloc for Python allocations, RSS growth for native ones such as
+torch/faiss buffers). Timed runs are not traced so tracing overhead does not skew them.
+
+Usage (from backend/):
+    python -m benchmarks.microbench                       # all components
+    python -m benchmarks.microbench --only chunk,search   # subset
+    python -m benchmarks.microbench --repeat 20 --output results.json
+"""
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+from typing import Callable, Dict, List
+import numpy as np
+import psutil
+from config.rag_config import RagConfig
+from benchmarks.stubs import VOCABULARY
+from benchmarks.reporting import run_metadata, write_results
+
+COMPONENTS = ["chunk", "embed", "search", "rerank", "image"]
+
+
+def synthetic_text(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    # Sentence breaks so char-based chunking has boundaries to split on
+    tokens = rng.choices(VOCABULARY, k=words)
+    return " ".join(token + ("." if i % 15 == 14 else "") for i, token in enumerate(tokens))
+
+
+def synthetic_vectors(count: int, dimension: int = RagConfig.VECTOR_DIMENSION, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_jpeg(width: int, height: int, seed: int = 0) -> bytes:
+    from PIL import Image
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def measure(name: str, fn: Callable, repeat: int, warmup: int = 1, **params) -> Dict:
+    """
+    Benchmark one case
+
+    Args:
+        name: Case name
+        fn: Zero-argument callable to benchmark
+        repeat: Timed runs
+        warmup: Untimed runs first (model/JIT warm-up, caches)
+        params: Case parameters recorded in the result
+
+    Returns:
+        Result dict with wall time (ms), allocations and peak memory
+    """
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # One traced run for memory
+    process = psutil.Process()
+    gc.collect()
+    rss_before = process.memory_info().rss
+    tracemalloc.start()
+    fn()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = process.memory_info().rss
+    allocations = snapshot.statistics("filename")
+
+    result = {
+        "name": name,
+        "params": params,
+        "repeat": repeat,
+        "wall_ms": {
+            "min": round(min(times), 3),
+            "median": round(statistics.median(times), 3),
+            "mean": round(statistics.fmean(times), 3),
+            "stdev": round(statistics.stdev(times), 3) if len(times) > 1 else 0.0
+        },
+        "alloc_blocks": sum(stat.count for stat in allocations),
+        "alloc_kib": round(sum(stat.size for stat in allocations) / 1024, 1),
+        "peak_traced_kib": round(peak / 1024, 1),
+        "rss_growth_kib": round(max(0, rss_after - rss_before) / 1024, 1)
+    }
+    print(f"{name:<18}{str(params):<40}{result['wall_ms']['median']:>12}{result['wall_ms']['min']:>12}{result['peak_traced_kib']:>14}{result['rss_growth_kib']:>14}")
+    return result
+
+
+def bench_chunk(args) -> List[Dict]:
+    from rag.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    results = []
+    for words in [500, 2000, 10000]:
+        text = synthetic_text(words)
+        results.append(measure("chunk_by_words", lambda: processor._chunk_by_words(text, "Rắn - Độc tính: ", 200, 50), args.repeat, words=words))
+        results.append(measure("chunk_by_chars", lambda: processor._chunk_by_chars(text, "Rắn - Độc tính: ", RagConfig.CHUNK_SIZE, RagConfig.CHUNK_OVERLAP), args.repeat, words=words))
+    return results
+
+
+def bench_embed(args) -> List[Dict]:
+    from rag.embeddings import EmbeddingGenerator
+    generator = EmbeddingGenerator()
+    texts = [synthetic_text(150, seed=i) for i in range(64)]
+    results = []
+    for batch_size in [1, 8, 16, 32, 64]:
+        results.append(measure(
+            "embed",
+            lambda: generator.generate_embeddings(texts, batch_size=batch_size, show_progress=False),
+            max(1, args.repeat // 4),
+            texts=len(texts),
+            batch_size=batch_size
+        ))
+    return results
+
+
+def bench_search(args) -> List[Dict]:
+    from rag.vector_store import FAISSVectorStore
+    queries = synthetic_vectors(64, seed=1)
+    results = []
+    for index_type in args.index_types.split(","):
+        for corpus_size in [1_000, 10_000, 100_000]:
+            store = FAISSVectorStore(index_type=index_type)
+            store.add_embeddings(synthetic_vectors(corpus_size), [f"chunk {i}" for i in range(corpus_size)])
+
+            def search_all():
+                for query in queries:
+                    store.search(query, RagConfig.RERANK_TOP_K)
+
+            result = measure("faiss_search", search_all, args.repeat, index_type=index_type, corpus=corpus_size, queries=len(queries))
+            result["per_query_ms"] = round(result["wall_ms"]["median"] / len(queries), 4)
+            results.append(result)
+    return results
+
+
+def bench_rerank(args) -> List[Dict]:
+    from rag.reranker import CrossEncoderReranker
+    # Cache off: measure the cross-encoder, not cache hits
+    reranker = CrossEncoderReranker(RagConfig.CROSS_ENCODER_MODEL, cache_size=0)
+    query = "Rắn hổ mang chúa có độc không?"
+    results = []
+    for candidates in [5, 10, 15, 30]:
+        passages = [(synthetic_text(200, seed=i), 0.9 - i * 0.01) for i in range(candidates)]
+        results.append(measure(
+            "rerank",
+            lambda: reranker.rerank_with_original_scores(query, passages, alpha=RagConfig.RERANK_ALPHA, top_k=RagConfig.FINAL_TOP_K),
+            max(1, args.repeat // 2),
+            candidates=candidates
+        ))
+    return results
+
+
+def bench_image(args) -> List[Dict]:
+    from services.ImageService import build_transform, preprocess_image
+    transform = build_transform()
+    results = []
+    for width, height in [(640, 480), (1920, 1080), (4000, 3000)]:
+        image_bytes = synthetic_jpeg(width, height)
+        results.append(measure("image_preprocess", lambda: preprocess_image(image_bytes, transform), args.repeat, size=f"{width}x{height}", jpeg_kib=len(image_bytes) // 1024))
+    return results
+
+
+BENCHMARKS = {
+    "chunk": bench_chunk,
+    "embed": bench_embed,
+    "search": bench_search,
+    "rerank": bench_rerank,
+    "image": bench_image,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Component microbenchmarks on synthetic data")
+    parser.add_argument("--only", default=",".join(COMPONENTS), help=f"Comma-separated subset of {COMPONENTS}")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per case (model cases use fewer)")
+    parser.add_argument("--index-types", default="flat,hnsw", help="FAISS index types for the search benchmark")
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"{'case':<18}{'params':<40}{'median ms':>12}{'min ms':>12}{'peak KiB':>14}{'RSS +KiB':>14}")
+    results = []
+    for component in args.only.split(","):
+        results.extend(BENCHMARKS[component.strip()](args))
+
+    report = {"meta": run_metadata(args), "results": results}
+    print(f"Results written to {write_results(report, 'microbench', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Mixed image + text model throughput, with and without CPU thread budgets
+
+Runs ConvNeXt inference and the text path (E5 query embedding + cross-encoder scoring of
+RERANK_TOP_K passages) concurrently from worker threads for a fixed duration, once with
+torch's default thread count for every model ("off") and once with the per-model budgets
+from utils.cpu_budget ("auto"). Runs offline on synthetic inputs.
+
+Usage (from backend/):
+    python -m benchmarks.mixed_load --duration 30 --image-concurrency 2 --text-concurrency 4
+    python -m benchmarks.mixed_load --budgets auto --cpus 4
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from config.rag_config import RagConfig
+from benchmarks.microbench import synthetic_jpeg, synthetic_text
+from benchmarks.reporting import summarize, run_metadata, write_results
+from utils.cpu_budget import cpu_budget
+
+
+def load_models():
+    from services.ImageService import ImageService, preprocess_image
+    from rag.embeddings import EmbeddingGenerator
+    from rag.reranker import CrossEncoderReranker
+
+    image_service = ImageService()
+    image_tensor = preprocess_image(synthetic_jpeg(640, 480), image_service.transform)
+    embedding_generator = EmbeddingGenerator()
+    # Cache off so every text request runs the cross-encoder
+    reranker = CrossEncoderReranker(RagConfig.CROSS_ENCODER_MODEL, cache_size=0)
+    passages = [synthetic_text(120, seed=i) for i in range(RagConfig.RERANK_TOP_K)]
+
+    def image_request():
+        image_service._predict_probs(image_tensor)
+
+    def text_request():
+        embedding_generator.generate_single_embedding(RagConfig.WARMUP_QUERY)
+        reranker.predict_scores(RagConfig.WARMUP_QUERY, passages)
+
+    return {"image": image_request, "text": text_request}
+
+
+def run_mixed(requests: Dict, concurrency: Dict[str, int], duration: float) -> Dict[str, List[float]]:
+    """Call each request kind in a closed loop from its own threads until the duration is over"""
+    latencies = {kind: [] for kind in requests}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(kind: str):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            requests[kind]()
+            with lock:
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    workers = [kind for kind, count in concurrency.items() for _ in range(count)]
+    with ThreadPoolExecutor(len(workers)) as executor:
+        list(executor.map(loop, workers))
+    return latencies
+
+
+def run_case(requests: Dict, budget: str, args) -> Dict:
+    import torch
+
+    RagConfig.CPU_THREAD_BUDGET = budget
+    cpu_budget.configure(cpus=args.cpus)
+    # "off": every model call uses all cores, torch's default
+    torch.set_num_threads(cpu_budget.cpus)
+
+    concurrency = {"image": args.image_concurrency, "text": args.text_concurrency}
+    run_mixed(requests, concurrency, min(3.0, args.duration))  # warm-up
+    latencies = run_mixed(requests, concurrency, args.duration)
+
+    result = {
+        "name": "mixed_load",
+        "params": {"budget": budget, "cpus": cpu_budget.cpus, **concurrency},
+        "threads": cpu_budget.threads if budget == "auto" else {"all": cpu_budget.cpus},
+        "throughput_rps": {kind: round(len(values) / args.duration, 2) for kind, values in latencies.items()},
+        "latency_ms": {**{kind: summarize(values) for kind, values in latencies.items()}, "total": summarize(sum(latencies.values(), []))}
+    }
+    result["throughput_rps"]["total"] = round(sum(result["throughput_rps"].values()), 2)
+    print(
+        f"{budget:<8}{str(result['threads']):<44}"
+        f"{result['throughput_rps']['image']:>10}{result['throughput_rps']['text']:>10}"
+        f"{result['latency_ms']['image'].get('p95', '-'):>12}{result['latency_ms']['text'].get('p95', '-'):>12}"
+    )
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mixed image + text throughput with and without CPU thread budgets")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per configuration")
+    parser.add_argument("--image-concurrency", type=int, default=2)
+    parser.add_argument("--text-concurrency", type=int, default=4)
+    parser.add_argument("--budgets", default="off,auto", help="Configurations to run: off (torch defaults), auto (per-model budgets)")
+    parser.add_argument("--cpus", type=int, default=None, help="CPUs to split (default: detected from affinity/cgroup)")
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    requests = load_models()
+    print(f"{'budget':<8}{'threads':<44}{'image/s':>10}{'text/s':>10}{'image p95':>12}{'text p95':>12}")
+    results = [run_case(requests, budget.strip(), args) for budget in args.budgets.split(",")]
+
+    if len(results) == 2:
+        before, after = results[0]["throughput_rps"]["total"], results[1]["throughput_rps"]["total"]
+        if before:
+            print(f"\ntotal throughput {before} -> {after} req/s ({(after - before) / before * 100:+.1f}%)")
+
+    report = {"meta": run_metadata(args), "cpu_budget": cpu_budget.to_dict(), "results": results}
+    print(f"Results written to {write_results(report, 'mixed_load', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import List, Dict
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Count, mean and tail percentiles of latencies in ms"""
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(values.max()), 2)
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_metadata(args) -> Dict:
+    """Where and how a benchmark ran, so result files can be compared across commits"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args)
+    }
+
+
+def write_results(report: Dict, name: str, output: str = None) -> str:
+    """
+    Write a benchmark report as JSON
+
+    Args:
+        report: Report with a "meta" section from run_metadata
+        name: Short benchmark name used in the default file name
+        output: Explicit output path
+
+    Returns:
+        Path written
+    """
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{report['meta']['git_commit']}_{name}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return output
@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+from typing import List, Dict
+from config.rag_config import RagConfig
+from rag.llm import GeminiLLM
+
+# Từ vựng để sinh corpus rắn giả lập (không cần dữ liệu thật hay API)
+SNAKE_GENERA = ["Naja", "Bungarus", "Trimeresurus", "Python", "Ptyas", "Ophiophagus", "Calloselasma", "Daboia", "Enhydris", "Boiga"]
+SNAKE_EPITHETS = ["kaouthia", "multicinctus", "albolabris", "bivittatus", "korros", "hannah", "rhodostoma", "siamensis", "plumbea", "multifasciata"]
+VOCABULARY = [
+    "rắn", "nọc", "độc", "vảy", "đầu", "thân", "đuôi", "màu", "nâu", "xanh", "đen", "vàng", "khoang", "sọc",
+    "rừng", "ruộng", "suối", "đồng", "bằng", "núi", "ẩm", "ban", "đêm", "ngày", "săn", "mồi", "chuột", "ếch",
+    "chim", "thằn", "lằn", "cắn", "sưng", "đau", "tê", "liệt", "băng", "ép", "bất", "động", "bệnh", "viện",
+    "huyết", "thanh", "kháng", "trứng", "con", "non", "dài", "ngắn", "mét", "phân", "bố", "miền", "bắc", "nam"
+]
+# (câu hỏi mẫu, field chứa câu trả lời)
+QUESTION_TEMPLATES = [
+    ("{name} có độc không?", "Độc tính"),
+    ("Nọc của {name} nguy hiểm thế nào?", "Độc tính"),
+    ("{name} sống ở đâu?", "Phân bố địa lý và môi trường sống"),
+    ("Đặc điểm nhận dạng của {name} là gì?", "Đặc điểm hình thái"),
+    ("{name} ăn gì?", "Tập tính săn mồi"),
+    ("{name} sinh sản như thế nào?", "Sinh sản")
+]
+
+
+class StubLLM(GeminiLLM):
+    """Local stand-in for GeminiLLM: same prompt building, fixed simulated latency, no API calls"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, response_words: int = 120):
+        """
+        Args:
+            latency: Simulated generation time in seconds
+            jitter: Uniform +/- jitter added to latency in seconds
+            response_words: Length of the canned answer
+        """
+        self.client = None
+        self.model = "stub"
+        self.latency = latency
+        self.jitter = jitter
+        self.response = " ".join(random.Random(0).choices(VOCABULARY, k=response_words))
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    async def agenerate(self, prompt: str) -> str:
+        await asyncio.sleep(self._delay())
+        return self.response
+
+    def generate_response(self, query: str, context: List[str]) -> str:
+        self.build_prompt(query, context)
+        time.sleep(self._delay())
+        return self.response
+
+    def generate_simple_response(self, text: str) -> str:
+        time.sleep(self._delay())
+        return self.response
+
+
+def build_synthetic_corpus(num_species: int = 100, seed: int = 42) -> List[Dict]:
+    """
+    Build snake documents shaped like the real dataset (name_vn + FIELD_CHUNK_CONFIG fields)
+
+    Field lengths follow the configured averages so chunk counts per field resemble production.
+
+    Args:
+        num_species: Number of documents
+        seed: Random seed (same seed = same corpus)
+
+    Returns:
+        List of document dictionaries
+    """
+    rng = random.Random(seed)
+    documents = []
+    for i in range(num_species):
+        genus = SNAKE_GENERA[i % len(SNAKE_GENERA)]
+        epithet = SNAKE_EPITHETS[(i // len(SNAKE_GENERA)) % len(SNAKE_EPITHETS)]
+        document = {"name_vn": f"Rắn {genus} {epithet} {i}"}
+        for field, config in RagConfig.FIELD_CHUNK_CONFIG.items():
+            # chunk_size is ~2/3 of the field's average length
+            length = int(config["chunk_size"] * rng.uniform(1.1, 1.9))
+            document[field] = " ".join(rng.choices(VOCABULARY, k=length))
+        documents.append(document)
+    return documents
+
+
+def build_questions(documents: List[Dict], count: int = 200, seed: int = 7) -> List[str]:
+    """Questions about random species of the synthetic corpus"""
+    return [item["question"] for item in build_labeled_questions(documents, count, seed)]
+
+
+def build_labeled_questions(documents: List[Dict], count: int = 200, seed: int = 7) -> List[Dict]:
+    """
+    Questions about random species labeled with the species and field that answer them
+
+    Returns:
+        List of {"question", "relevant": [{"species", "field"}]} in the eval_retrieval format
+    """
+    rng = random.Random(seed)
+    labeled = []
+    for _ in range(count):
+        template, field = rng.choice(QUESTION_TEMPLATES)
+        name = rng.choice(documents)["name_vn"]
+        labeled.append({
+            "question": template.format(name=name),
+            "relevant": [{"species": name, "field": field}]
+        })
+    return labeled
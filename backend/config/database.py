@@ -1,20 +1,37 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import os
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 
+# Connection pool per process (serve.py workers each have their own); defaults are the driver's
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+# How long a request may wait for a free connection / for a reachable server
+MONGO_WAIT_QUEUE_TIMEOUT_MS = os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+
 if not MONGO_URI or not DATABASE_NAME:
     raise ValueError("MONGO_URI or DATABASE_NAME is not set in the environment variables.")
 
 try:
-    client = AsyncIOMotorClient(MONGO_URI)
-    client = AsyncIOMotorClient(MONGO_URI)
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=int(MONGO_MAX_IDLE_TIME_MS) if MONGO_MAX_IDLE_TIME_MS else None,
+        waitQueueTimeoutMS=int(MONGO_WAIT_QUEUE_TIMEOUT_MS) if MONGO_WAIT_QUEUE_TIMEOUT_MS else None,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS
+    )
     db = client.get_database(DATABASE_NAME)
-    print("MongoDB connection: Successfully")
+    logger.info("MongoDB connection: Successfully")
 except Exception as e:
-    print("MongoDB connection: Failed", e)
+    logger.error(f"MongoDB connection: Failed {e}")
     raise e
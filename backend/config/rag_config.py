@@ -20,6 +20,59 @@ class RagConfig:
     # LLM Rate limiting (Gemini Free Tier: 10 requests/minute)
     LLM_REQUESTS_PER_MINUTE = 9  # Stay under 10 to be safe
     LLM_DELAY_BETWEEN_REQUESTS = 7  # Delay in seconds (60/9 ≈ 6.7s)
+    LLM_BURST_SIZE = 1  # Số request được gửi liên tiếp sau khi rảnh (token bucket capacity)
+    LLM_MAX_QUEUE_SIZE = 50  # Hàng đợi đầy → từ chối ngay (503 + Retry-After)
+    LLM_QUEUE_TIMEOUT = 60  # Thời gian tối đa (giây) một request được chờ trong gateway
+    LLM_MAX_CONCURRENCY = 4  # Số request Gemini chạy song song tối đa
+    LLM_MAX_RETRIES = 3  # Retry khi gặp 429/5xx
+    LLM_BACKOFF_BASE = 1.0  # Backoff (giây) cho lần retry đầu, nhân đôi mỗi lần, có jitter
+    LLM_BACKOFF_MAX = 20.0
+
+    # Admission control cho /chat/prompt: giới hạn đồng thời + hàng đợi có giới hạn mỗi stage,
+    # quá tải → 503 (hàng đợi đầy / chờ quá lâu) hoặc 429 (1 client gửi quá nhiều) kèm Retry-After
+    ADMISSION_IMAGE_CONCURRENCY = 4       # Request ảnh chạy ConvNeXt cùng lúc
+    ADMISSION_IMAGE_QUEUE = 32
+    ADMISSION_TEXT_CONCURRENCY = 32       # Request text đang xử lý (tính cả thời gian chờ LLM)
+    ADMISSION_TEXT_QUEUE = 64
+    ADMISSION_RETRIEVAL_CONCURRENCY = 4   # Embed + search + rerank chạy cùng lúc (CPU-bound)
+    ADMISSION_RETRIEVAL_QUEUE = 32
+    ADMISSION_MAX_WAIT = 10               # Giây chờ tối đa trong hàng đợi trước khi bị từ chối
+    ADMISSION_MAX_PER_CLIENT = 4          # Request text đồng thời tối đa của 1 client (vượt → 429)
+
+    # Quota mỗi user / mỗi IP cho /chat/prompt (token bucket trong RAM, flush định kỳ vào MongoDB)
+    USE_QUOTA = True
+    QUOTA_USER_PER_MINUTE = 3         # Request text (có gọi Gemini) mỗi phút của 1 user đăng nhập
+    QUOTA_USER_BURST = 5
+    QUOTA_IP_PER_MINUTE = 5           # Áp dụng cho mọi request (kể cả đã đăng nhập) theo IP
+    QUOTA_IP_BURST = 10
+    QUOTA_TEXT_COST = 1.0             # Số token trừ cho request có message (dùng LLM)
+    QUOTA_IMAGE_COST = 0.2            # Request chỉ có ảnh rẻ hơn (không gọi LLM)
+    QUOTA_FLUSH_INTERVAL = 10         # Giây giữa 2 lần ghi bulk vào MongoDB
+    QUOTA_DAILY_RETENTION_DAYS = 30   # Số ngày giữ usage theo ngày (mỗi ngày 1 document, TTL index xóa ngày cũ)
+
+    # Lịch sử chat (conversations + messages trong MongoDB), ghi theo lô ở background
+    CHAT_HISTORY_BATCH_SIZE = 200        # Số thao tác tối đa mỗi lần bulk write; đầy thì flush ngay
+    CHAT_HISTORY_FLUSH_INTERVAL = 1.0    # Giây giữa 2 lần flush
+    CHAT_HISTORY_MAX_PENDING = 10000     # Quá số này (MongoDB lỗi kéo dài) thì bỏ lượt cũ nhất
+    CHAT_HISTORY_PAGE_SIZE = 20          # Mặc định / tối đa 100 mỗi trang
+    CHAT_HISTORY_PREVIEW_CHARS = 120     # Độ dài đoạn trích câu trả lời cuối trong danh sách conversation
+
+    # Hội thoại nhiều lượt: trạng thái rút gọn mỗi conversation (loài vừa nhận diện, các loài đang nói tới)
+    USE_CONVERSATION_STATE = True
+    CONVERSATION_STATE_MAX_ENTITIES = 5      # Số loài gần nhất giữ lại
+    CONVERSATION_STATE_CACHE_SIZE = 10000    # Số conversation giữ trạng thái trong RAM
+    CONVERSATION_STATE_TTL = 1800            # Giây; hết hạn thì đọc lại từ MongoDB (1 lần)
+
+    # Gộp các request giống hệt nhau đang chạy đồng thời (câu hỏi đã chuẩn hóa / hash ảnh) thành 1 lần chạy pipeline
+    USE_REQUEST_COALESCING = True
+
+    # Deadline: ngân sách thời gian của mỗi request; khi sắp hết thì giảm chất lượng thay vì trả lời trễ
+    REQUEST_DEADLINE = 25.0               # Giây (None = không giới hạn); client rút ngắn bằng header X-Request-Deadline-Ms
+    DEADLINE_LLM_ESTIMATE = 4.0           # Ước lượng ban đầu thời gian 1 lần gọi LLM (giây), sau đó dùng EWMA
+    DEADLINE_RERANK_PAIR_ESTIMATE = 0.01  # Ước lượng ban đầu thời gian rerank mỗi cặp (giây), sau đó dùng EWMA
+    DEADLINE_LLM_HEADROOM = 1.5           # Còn < 1.5 x ước lượng LLM → prompt ngắn hơn (ít chunk, token budget nhỏ)
+    DEGRADED_FINAL_TOP_K = 3
+    DEGRADED_CONTEXT_TOKEN_BUDGET = 1000
     
     # RAG configurations
     CHUNK_SIZE = 200
@@ -119,10 +172,70 @@ class RagConfig:
     # - Nếu câu hỏi phức tạp: có thể tăng FINAL_TOP_K lên 8-10
     
     RERANK_ALPHA = 0.7  # Weight for cross-encoder score (0.7) vs original score (0.3)
-    
+
+    # Score fusion (dùng chung cho rerank và hybrid retrieval)
+    FUSION_STRATEGY = "linear"        # "linear" (RERANK_ALPHA) | "rrf" | "learned"
+    SCORE_NORMALIZATION = "minmax"    # Chuẩn hóa cho linear fusion: "minmax" | "zscore"
+    RRF_K = 60                        # Hằng số làm mượt của Reciprocal Rank Fusion
+    # Trọng số logistic cho "learned": [cross-encoder, dense]. Giá trị dưới đây chỉ là mặc định chọn tay,
+    # chưa được fit → fit trên bộ câu hỏi có nhãn: python -m benchmarks.eval_retrieval --fit-fusion, rồi dán kết quả vào đây
+    LEARNED_FUSION_WEIGHTS = [1.6, 0.9]
+    LEARNED_FUSION_BIAS = -0.2
+
+    # Cache điểm cross-encoder: LRU theo (query-hash, chunk-id) → score
+    RERANK_CACHE_SIZE = 2048  # Số cặp (query, chunk) tối đa giữ trong cache (0 = tắt cache)
+
+    # Adaptive re-ranking: bỏ qua hoặc thu hẹp rerank khi dense scores đã tách biệt rõ
+    USE_ADAPTIVE_RERANK = True
+    RERANK_SKIP_GAP = 0.05       # Gap giữa rank FINAL_TOP_K và rank kế tiếp > ngưỡng → bỏ qua rerank
+    RERANK_PRUNE_MARGIN = 0.08   # Bỏ candidates có dense score thấp hơn score rank FINAL_TOP_K quá margin này
+
+    # Cascaded re-ranking: model nhỏ chấm tất cả candidates, model L-12 chỉ chấm lại vùng gần cut-off
+    # (model nhỏ phải có sẵn trong cache HuggingFace vì chạy offline)
+    USE_CASCADE_RERANK = False
+    CASCADE_FIRST_STAGE_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    CASCADE_FRONTIER_SIZE = 8    # Số candidates (theo điểm model nhỏ) được model L-12 chấm lại (>= FINAL_TOP_K)
+
+    # Context assembly: gộp các chunk chồng lấn cùng nguồn, bỏ prefix lặp, đóng gói theo token budget
+    USE_CONTEXT_ASSEMBLY = True
+    CONTEXT_TOKEN_BUDGET = 2000        # Số token (ước lượng) tối đa cho phần context trong prompt
+    CONTEXT_CHARS_PER_TOKEN = 3.0      # Ước lượng số ký tự / token cho tiếng Việt
+    CONTEXT_MIN_SECTION_TOKENS = 100   # Phần còn lại của budget nhỏ hơn mức này thì không cắt thêm section
+    CONTEXT_MIN_OVERLAP_WORDS = 5      # Số từ trùng tối thiểu để coi 2 chunk là liền kề
+
+    # Khởi động: nạp song song các model rồi chạy thử 1 lần để request đầu tiên không bị chậm
+    WARMUP_ON_STARTUP = True
+    WARMUP_QUERY = "Rắn hổ mang chúa có độc không?"
+
+    # Inference workers: chạy ConvNeXt / E5 / cross-encoder trong process riêng (không tranh GIL với API),
+    # ndarray/tensor truyền qua shared memory thay vì pickle
+    USE_INFERENCE_WORKERS = False
+    INFERENCE_IMAGE_WORKERS = 1       # Số process cho từng loại model (cấu hình độc lập)
+    INFERENCE_EMBED_WORKERS = 1
+    INFERENCE_RERANK_WORKERS = 1
+    INFERENCE_THREADS_PER_WORKER = None  # torch threads mỗi process (None = chia từ CPU budget của model)
+    INFERENCE_SHM_SLOT_MB = 8         # Shared memory mỗi process cho input/output (lớn hơn thì gửi qua pipe)
+    INFERENCE_TIMEOUT = 30            # Giây chờ tối đa cho một lần inference
+    INFERENCE_RESTART_ATTEMPTS = 5    # Số lần thử khởi động lại một process lỗi trước khi bỏ (pool bị đánh dấu degraded)
+    INFERENCE_RESTART_BACKOFF = 2.0   # Giây chờ trước lần thử lại đầu, nhân đôi mỗi lần
+    INFERENCE_RESTART_BACKOFF_MAX = 60.0
+
+    # CPU thread budget: chia số CPU khả dụng (affinity + cgroup quota) cho 3 model để ảnh và text
+    # chạy đồng thời không tranh nhau toàn bộ core
+    CPU_THREAD_BUDGET = "auto"        # "auto" | "off" (giữ mặc định của torch)
+    CPU_BUDGET_WEIGHTS = {"image": 2, "embed": 1, "rerank": 1}  # Tỉ lệ chia core giữa các model
+    CPU_BUDGET_THREADS = {}           # Cố định số intra-op threads cho model, vd {"image": 4}
+    CPU_INTER_OP_THREADS = 1          # Inter-op pool của torch (pipeline không dùng song song inter-op)
+
     # FAISS configurations
     VECTOR_DIMENSION = 384  # multilingual-e5-small embedding dimension
     FAISS_INDEX_PATH = "faiss_index"
+    FAISS_INDEX_TYPE = "flat"       # "flat" (chính xác) | "hnsw" | "ivf" (xấp xỉ, nhanh hơn khi corpus lớn)
+    FAISS_HNSW_M = 32               # Số cạnh mỗi node của đồ thị HNSW
+    FAISS_HNSW_EF_CONSTRUCTION = 80
+    FAISS_HNSW_EF_SEARCH = 64       # Tăng → recall cao hơn, search chậm hơn
+    FAISS_IVF_NLIST = 64            # Số cluster của IVF (tự giảm nếu corpus nhỏ)
+    FAISS_IVF_NPROBE = 8            # Số cluster được quét khi search
     
     # Qdrant configurations 
     USE_QDRANT = True  # Set to True to use Qdrant instead of FAISS (tạm thời dùng FAISS vì mạng không ổn)
@@ -1,14 +1,41 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, EmailStr
 from config.database import client, db
 from routers.auth_router import app_router as auth_router
 from routers.user_router import app_router as user_router
-# from routers.chat_router import app_router as chat_router
+from routers.chat_router import app_router as chat_router
+from routers.admin_router import app_router as admin_router
+from routers.health_router import app_router as health_router
+from services.UserService import UserService
+from services.StartupService import startup_service
+from services.QuotaService import quota_service
+from services.SchemaService import schema_service
+from services.RefreshTokenService import refresh_token_service
+from services.ConversationService import conversation_service
+from contextlib import asynccontextmanager
 
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
+from utils.logger import start_request_context, end_request_context, request_id_var
+from utils.profiling import ProfileSession, profile_store, should_sample, PROFILE_HEADER
+import uuid
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background; /health/ready turns 200 once they are warmed up
+    startup_service.start()
+    schema_service.start()
+    quota_service.start()
+    refresh_token_service.start()
+    conversation_service.start()
+    yield
+    await conversation_service.stop()
+    await refresh_token_service.stop()
+    await quota_service.stop()
+    await startup_service.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,7 +44,52 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Requests that can be profiled (opt-in: admin header or PROFILE_SAMPLE_RATE)
+PROFILED_PATHS = {"/chat/prompt"}
+
+@app.middleware("http")
+async def request_profiler(request: Request, call_next):
+    if request.url.path not in PROFILED_PATHS:
+        return await call_next(request)
+
+    reason = None
+    if request.headers.get(PROFILE_HEADER) and await UserService.is_admin_token(request.cookies.get("access_token")):
+        reason = "admin"
+    elif should_sample():
+        reason = "sampled"
+    if reason is None:
+        return await call_next(request)
+
+    session = ProfileSession(request.url.path, reason, request_id_var.get())
+    token = session.start()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        session.stop(token, status_code)
+        profile_store.add(session)
+    response.headers["X-Profile-Id"] = session.id
+    return response
+
+# Registered last so it wraps the profiler and every log line has the request id
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Bind a request id to every log line written while serving the request
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    tokens = start_request_context(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_context(tokens)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(user_router, prefix="/user", tags=["user"])
-# app.include_router(chat_router, prefix="/chat", tags=["chat"])
+app.include_router(chat_router, prefix="/chat", tags=["chat"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
+app.include_router(health_router, prefix="/health", tags=["health"])
 
+# Prometheus scrape endpoint
+app.mount("/metrics", make_asgi_app())
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional, List
+
+class ChatMessage(BaseModel):
+    id: str
+    role: str  # "user" or "assistant"
+    content: str
+    prediction: Optional[str] = None
+    probability: Optional[float] = None
+    create_at: datetime
+
+class MessagePage(BaseModel):
+    conversation_id: str
+    # Oldest first; pass next_cursor as `cursor` to get the page of older messages
+    messages: List[ChatMessage]
+    next_cursor: Optional[str] = None
+
+class ConversationSummary(BaseModel):
+    id: str
+    title: str
+    message_count: int
+    last_message_preview: Optional[str] = None
+    create_at: datetime
+    updated_at: datetime
+
+class ConversationPage(BaseModel):
+    # Most recently updated first
+    conversations: List[ConversationSummary]
+    next_cursor: Optional[str] = None
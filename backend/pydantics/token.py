@@ -1,7 +1,10 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class AccessToken(BaseModel):
     access_token: str
+    # Set when the refresh token was rotated
+    refresh_token: Optional[str] = None
     
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,147 @@
+import math
+from typing import List, Dict, Tuple, Optional
+from config.rag_config import RagConfig
+
+class ContextAssembler:
+    """Builds the LLM context: merges overlapping chunks from the same source and packs them into a token budget"""
+
+    def __init__(
+        self,
+        token_budget: int = RagConfig.CONTEXT_TOKEN_BUDGET,
+        chars_per_token: float = RagConfig.CONTEXT_CHARS_PER_TOKEN,
+        min_section_tokens: int = RagConfig.CONTEXT_MIN_SECTION_TOKENS,
+        field_names: List[str] = None
+    ):
+        """
+        Initialize context assembler
+
+        Args:
+            token_budget: Maximum estimated tokens of assembled context
+            chars_per_token: Characters per token used for the token estimate
+            min_section_tokens: Smallest truncated section worth sending when the budget runs out
+            field_names: Metadata field names used in chunk prefixes (default: FIELD_CHUNK_CONFIG keys)
+        """
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        self.min_section_tokens = min_section_tokens
+
+        field_names = field_names or list(RagConfig.FIELD_CHUNK_CONFIG.keys())
+        self.prefix_markers = [(field, f" - {field}: ") for field in field_names]
+
+        # Overlap between consecutive chunks never exceeds the largest configured overlap
+        self.max_overlap_words = max(
+            [config["chunk_overlap"] for config in RagConfig.FIELD_CHUNK_CONFIG.values()] + [RagConfig.CHUNK_OVERLAP]
+        )
+        self.min_overlap_words = RagConfig.CONTEXT_MIN_OVERLAP_WORDS
+
+    def estimate_tokens(self, text: str) -> int:
+        """Rough token estimate from character count"""
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def split_prefix(self, chunk: str) -> Tuple[Optional[str], Optional[str], str]:
+        """
+        Split a chunk into its "{snake} - {field}: " prefix and body
+
+        Args:
+            chunk: Chunk text as produced by DocumentProcessor.chunk_text_with_metadata_context
+
+        Returns:
+            tuple of (snake_name, field, body); snake_name and field are None if the chunk has no prefix
+        """
+        for field, marker in self.prefix_markers:
+            index = chunk.find(marker)
+            if index > 0:
+                return chunk[:index], field, chunk[index + len(marker):]
+        return None, None, chunk
+
+    def _merge_words(self, first: List[str], second: List[str]) -> Optional[List[str]]:
+        """Merge second into first if it is contained in it or continues it with an overlap"""
+        if f" {' '.join(second)} " in f" {' '.join(first)} ":
+            return first
+
+        longest = min(len(first), len(second), self.max_overlap_words)
+        for overlap in range(longest, self.min_overlap_words - 1, -1):
+            if first[-overlap:] == second[:overlap]:
+                return first + second[overlap:]
+        return None
+
+    def _merge_pieces(self, pieces: List[List[str]]) -> List[List[str]]:
+        """Merge adjacent/overlapping pieces of the same source until nothing changes"""
+        merged = True
+        while merged and len(pieces) > 1:
+            merged = False
+            for i in range(len(pieces)):
+                for j in range(len(pieces)):
+                    if i == j:
+                        continue
+                    combined = self._merge_words(pieces[i], pieces[j])
+                    if combined is not None:
+                        pieces[i] = combined
+                        del pieces[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return pieces
+
+    def assemble(self, chunks: List[str], token_budget: int = None) -> Tuple[List[str], Dict]:
+        """
+        Assemble ranked chunks into deduplicated context sections within a token budget
+
+        Args:
+            chunks: Retrieved chunks in rank order (best first)
+            token_budget: Override for the configured token budget
+
+        Returns:
+            tuple of (context_sections, stats)
+        """
+        if token_budget is None:
+            token_budget = self.token_budget
+
+        # Group chunks by source, keeping the best rank of each source
+        groups = {}
+        for chunk in chunks:
+            snake_name, field, body = self.split_prefix(chunk)
+            key = (snake_name, field) if field else (None, chunk)
+            groups.setdefault(key, []).append(body.split())
+
+        sections = []
+        merged_chunks = 0
+        for (snake_name, field), pieces in groups.items():
+            merged_chunks += len(pieces)
+            pieces = self._merge_pieces(pieces)
+            merged_chunks -= len(pieces)
+
+            body = " [...] ".join(" ".join(piece) for piece in pieces)
+            sections.append(f"{snake_name} - {field}: {body}" if snake_name else body)
+
+        # Pack sections in rank order until the budget is spent
+        packed = []
+        used_tokens = 0
+        truncated = False
+        for section in sections:
+            section_tokens = self.estimate_tokens(section)
+            if used_tokens + section_tokens <= token_budget:
+                packed.append(section)
+                used_tokens += section_tokens
+                continue
+
+            remaining_tokens = token_budget - used_tokens
+            if remaining_tokens >= self.min_section_tokens:
+                max_chars = int(remaining_tokens * self.chars_per_token)
+                cut = section[:max_chars].rsplit(" ", 1)[0]
+                packed.append(cut + " ...")
+                used_tokens += self.estimate_tokens(cut)
+            truncated = True
+            break
+
+        stats = {
+            "input_chunks": len(chunks),
+            "sections": len(packed),
+            "merged_chunks": merged_chunks,
+            "input_tokens_estimate": sum(self.estimate_tokens(chunk) for chunk in chunks),
+            "context_tokens_estimate": used_tokens,
+            "token_budget": token_budget,
+            "truncated": truncated
+        }
+        return packed, stats
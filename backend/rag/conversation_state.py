@@ -0,0 +1,189 @@
+from config.rag_config import RagConfig
+from typing import Dict, Any, List, Optional
+import os
+import threading
+import unicodedata
+
+
+def normalize_name(text: str) -> str:
+    """Matching form: no diacritics, case-folded, punctuation and underscores as spaces, whitespace collapsed"""
+    text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    # "Naja kaouthia?" must match "naja kaouthia"
+    text = "".join(ch if ch.isalnum() else " " for ch in text if unicodedata.category(ch) != "Mn")
+    return " ".join(text.casefold().split())
+
+
+def chunk_entity(chunk: str) -> Optional[str]:
+    """Snake name of a metadata chunk ("<name> - <field>: <text>", see DocumentProcessor)"""
+    head, separator, _ = chunk.partition(" - ")
+    if not separator or ":" not in chunk or len(head) > 80:
+        return None
+    return head.strip() or None
+
+
+class EntityLexicon:
+    """
+    Snake names that can be recognized in a question
+
+    Seeded with the image classifier's classes (scientific names) and extended with the
+    names found in retrieved chunks, so it covers the indexed corpus after some traffic.
+    Matching cost depends on the lexicon size, not on the conversation length.
+    """
+
+    def __init__(self, names: List[str] = None, max_size: int = 5000):
+        self.max_size = max_size
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        for name in names or []:
+            self.add(name)
+
+    @classmethod
+    def from_classes_file(cls, path: str = None) -> "EntityLexicon":
+        path = path or os.path.join(os.getcwd(), "classes.txt")
+        names = []
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                names = [line.strip().replace("_", " ") for line in f if line.strip()]
+        return cls(names)
+
+    def add(self, name: str):
+        key = normalize_name(name)
+        # Very short keys ("ran") would match almost every question
+        if len(key) < 4 or key in self._names:
+            return
+        with self._lock:
+            if len(self._names) < self.max_size:
+                self._names[key] = name
+
+    def find(self, text: str) -> List[str]:
+        """Names mentioned in text, longest first (so "Naja kaouthia" wins over "Naja")"""
+        padded = f" {normalize_name(text)} "
+        found = [(key, name) for key, name in list(self._names.items()) if f" {key} " in padded]
+        return [name for _, name in sorted(found, key=lambda item: -len(item[0]))]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+entity_lexicon = EntityLexicon.from_classes_file()
+
+
+class ConversationState:
+    """
+    Condensed, incrementally updated state of one conversation used for retrieval
+
+    Instead of the full history it keeps the last species predicted from an image and the
+    most recently discussed snakes. A follow-up question that names no snake ("còn cách
+    sơ cứu thì sao?") is searched together with the current focus, so retrieval embeds
+    one short query per turn no matter how long the conversation is.
+
+    Requests work on a copy(); the turns folded into the copy are replayed on the shared
+    state by merge_into, so concurrent requests on one conversation do not overwrite
+    each other's turn.
+    """
+
+    def __init__(self, species: str = None, entities: List[str] = None, turns: int = 0):
+        """
+        Args:
+            species: Last class predicted by ImageService in this conversation
+            entities: Snakes discussed, most recent first
+            turns: Number of turns folded into the state
+        """
+        self.species = species
+        self.entities = list(entities or [])[:RagConfig.CONVERSATION_STATE_MAX_ENTITIES]
+        self.turns = turns
+        # Set on working copies: the state copied from and the changes to replay on it
+        self.base: Optional["ConversationState"] = None
+        self._changes: Optional[List[tuple]] = None
+
+    def copy(self) -> "ConversationState":
+        """Working copy for one request; merge_into applies its changes to the shared state"""
+        state = ConversationState(self.species, self.entities, self.turns)
+        state.base = self
+        state._changes = []
+        return state
+
+    def merge_into(self, shared: "ConversationState" = None) -> "ConversationState":
+        """
+        Replay the changes made to this copy on the shared state (default: the one it was copied from)
+
+        Returns:
+            The shared state
+        """
+        shared = shared if shared is not None else self.base
+        if shared is None or shared is self:
+            # Not a copy: the changes were made to the shared state itself
+            return self
+        for method, args in self._changes or []:
+            getattr(shared, method)(*args)
+        self._changes = []
+        return shared
+
+    def _record(self, method: str, *args):
+        if self._changes is not None:
+            self._changes.append((method, args))
+
+    @property
+    def focus(self) -> Optional[str]:
+        """The snake a follow-up question is most likely about"""
+        return self.entities[0] if self.entities else None
+
+    def _push(self, name: str):
+        if name in self.entities:
+            self.entities.remove(name)
+        self.entities.insert(0, name)
+        del self.entities[RagConfig.CONVERSATION_STATE_MAX_ENTITIES:]
+
+    def observe_prediction(self, predicted_class: str):
+        """An uploaded image was classified: it becomes the focus of the conversation"""
+        self._record("observe_prediction", predicted_class)
+        self.species = predicted_class.replace("_", " ")
+        self._push(self.species)
+
+    def is_follow_up(self, question: str, lexicon: EntityLexicon = entity_lexicon) -> bool:
+        """True if the question names no snake (neither a known one nor one of this conversation)"""
+        if lexicon.find(question):
+            return False
+        padded = f" {normalize_name(question)} "
+        return not any(f" {normalize_name(name)} " in padded for name in self.entities)
+
+    def retrieval_query(self, question: str, lexicon: EntityLexicon = entity_lexicon) -> str:
+        """Question to embed and re-rank: prefixed with the focus for follow-ups (matches the chunk prefix format)"""
+        if self.focus is None or not self.is_follow_up(question, lexicon):
+            return question
+        return f"{self.focus} - {question}"
+
+    def prompt_question(self, question: str, lexicon: EntityLexicon = entity_lexicon) -> str:
+        """Question for the LLM prompt: a one-line hint instead of the previous turns"""
+        if self.focus is None or not self.is_follow_up(question, lexicon):
+            return question
+        return f"{question}\n(Cuộc trò chuyện đang nói về: {self.focus})"
+
+    def update(self, question: str, context: List[str], lexicon: EntityLexicon = entity_lexicon):
+        """
+        Fold one answered turn into the state
+
+        Args:
+            question: The user's question
+            context: Final context chunks the answer was based on
+            lexicon: Names to recognize (learns the names of the context chunks)
+        """
+        self._record("update", question, context, lexicon)
+        names = [name for name in (chunk_entity(chunk) for chunk in context) if name]
+        for name in names:
+            lexicon.add(name)
+        mentioned = lexicon.find(question)
+        for name in reversed(mentioned):
+            self._push(name)
+        if not mentioned and self.focus is None and names:
+            # First question without a name: what the answer was about becomes the focus
+            self._push(names[0])
+        self.turns += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"species": self.species, "entities": self.entities, "turns": self.turns}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any] = None) -> "ConversationState":
+        data = data or {}
+        return cls(data.get("species"), data.get("entities"), data.get("turns", 0))
@@ -1,6 +1,9 @@
 import re
 from typing import List, Dict, Optional
 from config.rag_config import RagConfig
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class DocumentProcessor:
     """Handles document processing and text chunking with metadata context"""
@@ -123,7 +126,7 @@ class DocumentProcessor:
             chunk_size = field_config["chunk_size"]
             chunk_overlap = field_config["chunk_overlap"]
             chunk_by = RagConfig.CHUNK_BY
-            print(f"  Using field-specific config for '{metadata_key}': chunk_size={chunk_size} {chunk_by}, overlap={chunk_overlap} {chunk_by}")
+            logger.debug("Using field-specific config for '%s': chunk_size=%s %s, overlap=%s %s", metadata_key, chunk_size, chunk_by, chunk_overlap, chunk_by)
         else:
             # Use default chunk size and overlap
             chunk_size = self.chunk_size
@@ -259,7 +262,7 @@ class DocumentProcessor:
             # Get snake name
             snake_name = doc.get(name_field) or doc.get("name_en") or "Unknown"
             
-            print(f"\n📄 Processing: {snake_name}")
+            logger.debug("Processing: %s", snake_name)
             
             # Process each metadata field
             for metadata_key in metadata_fields:
@@ -274,9 +277,9 @@ class DocumentProcessor:
                     )
                     
                     all_chunks.extend(chunks)
-                    print(f"  ✓ {metadata_key}: {len(chunks)} chunks")
+                    logger.debug("%s: %d chunks", metadata_key, len(chunks))
         
-        print(f"\n✅ Total processed: {len(all_chunks)} chunks with context")
+        logger.info(f"Total processed: {len(all_chunks)} chunks with context")
         
         # Print statistics
         if all_chunks:
@@ -284,10 +287,10 @@ class DocumentProcessor:
             max_length = max(len(chunk) for chunk in all_chunks)
             min_length = min(len(chunk) for chunk in all_chunks)
             
-            print(f"\nChunk statistics:")
-            print(f"  Average length: {avg_length:.0f} characters")
-            print(f"  Max length: {max_length} characters")
-            print(f"  Min length: {min_length} characters")
+            logger.info(
+                f"Chunk statistics: avg {avg_length:.0f}, max {max_length}, min {min_length} characters",
+                extra={"avg_length": round(avg_length), "max_length": max_length, "min_length": min_length}
+            )
         
         return all_chunks
     
@@ -304,17 +307,17 @@ class DocumentProcessor:
         chunks = self.chunk_text(text)
         
         if chunks:
-            print(f"Document processed into {len(chunks)} chunks")
+            logger.info(f"Document processed into {len(chunks)} chunks")
             
             # Print chunk statistics
             avg_length = sum(len(chunk) for chunk in chunks) / len(chunks)
             max_length = max(len(chunk) for chunk in chunks)
             min_length = min(len(chunk) for chunk in chunks)
             
-            print(f"Chunk statistics:")
-            print(f"  Average length: {avg_length:.0f} characters")
-            print(f"  Max length: {max_length} characters")
-            print(f"  Min length: {min_length} characters")
+            logger.info(
+                f"Chunk statistics: avg {avg_length:.0f}, max {max_length}, min {min_length} characters",
+                extra={"avg_length": round(avg_length), "max_length": max_length, "min_length": min_length}
+            )
         
         return chunks
         """
@@ -327,7 +330,7 @@ class DocumentProcessor:
             List of processed text chunks
         """
         chunks = self.chunk_text(text)
-        print(f"Document processed into {len(chunks)} chunks")
+        logger.info(f"Document processed into {len(chunks)} chunks")
         
         # Print chunk statistics
         if chunks:
@@ -335,9 +338,9 @@ class DocumentProcessor:
             max_length = max(len(chunk) for chunk in chunks)
             min_length = min(len(chunk) for chunk in chunks)
             
-            print(f"Chunk statistics:")
-            print(f"  Average length: {avg_length:.0f} characters")
-            print(f"  Max length: {max_length} characters")
-            print(f"  Min length: {min_length} characters")
+            logger.info(
+                f"Chunk statistics: avg {avg_length:.0f}, max {max_length}, min {min_length} characters",
+                extra={"avg_length": round(avg_length), "max_length": max_length, "min_length": min_length}
+            )
         
         return chunks
\ No newline at end of file
@@ -1,5 +1,7 @@
 from sentence_transformers import SentenceTransformer
 from config.rag_config import RagConfig
+from utils.logger import get_logger
+from utils.cpu_budget import cpu_budget
 import numpy as np
 from typing import List, Union
 import time
@@ -10,16 +12,29 @@ import os
 os.environ['TRANSFORMERS_OFFLINE'] = '1'
 os.environ['HF_HUB_OFFLINE'] = '1'
 
+logger = get_logger(__name__)
+
 class EmbeddingGenerator:
     """Handles text embedding generation using local embedding model"""
     
-    def __init__(self):
-        """Initialize the embedding generator with local model"""
-        print(f"Loading embedding model: {RagConfig.EMBEDDING_MODEL}")
+    def __init__(self, model=None):
+        """
+        Initialize the embedding generator with local model
+        
+        Args:
+            model: Already loaded model, e.g. a RemoteSentenceTransformer running in an
+                inference worker process (default: load RagConfig.EMBEDDING_MODEL here)
+        """
+        if model is not None:
+            self.device = 'worker'
+            self.model = model
+            return
+        
+        logger.info(f"Loading embedding model: {RagConfig.EMBEDDING_MODEL}")
         
         # Set device
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f"Using device: {self.device}")
+        logger.info(f"Using device: {self.device}")
         
         try:
             # Load model from cache (offline mode is set globally)
@@ -27,11 +42,12 @@ class EmbeddingGenerator:
                 RagConfig.EMBEDDING_MODEL, 
                 device=self.device
             )
-            print(f"✓ Model loaded from cache! Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
+            logger.info(f"Model loaded from cache! Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
         except Exception as e:
-            print(f"❌ Error loading model: {e}")
-            print(f"💡 Model may not be cached yet. Please run once with internet to download:")
-            print(f"   python -c \"from sentence_transformers import SentenceTransformer; SentenceTransformer('{RagConfig.EMBEDDING_MODEL}')\"")
+            logger.error(
+                f"Error loading model: {e}. Model may not be cached yet. Please run once with internet to download: "
+                f"python -c \"from sentence_transformers import SentenceTransformer; SentenceTransformer('{RagConfig.EMBEDDING_MODEL}')\""
+            )
             raise
     
     def generate_embeddings(self, texts: Union[str, List[str]], batch_size: int = None, show_progress: bool = True) -> np.ndarray:
@@ -56,22 +72,23 @@ class EmbeddingGenerator:
             # Preprocess texts for E5 model (add prefix for better performance)
             processed_texts = [f"passage: {text}" for text in texts]
             
-            print(f"  Generating {len(texts)} embeddings with {RagConfig.EMBEDDING_MODEL}...")
+            logger.debug("Generating %d embeddings with %s...", len(texts), RagConfig.EMBEDDING_MODEL)
             
             # Generate embeddings in batches
-            embeddings = self.model.encode(
-                processed_texts,
-                batch_size=batch_size,
-                show_progress_bar=show_progress,
-                convert_to_numpy=True,
-                normalize_embeddings=True  # Normalize for cosine similarity
-            )
+            with cpu_budget.limit("embed"):
+                embeddings = self.model.encode(
+                    processed_texts,
+                    batch_size=batch_size,
+                    show_progress_bar=show_progress,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True  # Normalize for cosine similarity
+                )
             
-            print(f"  ✓ Successfully generated {len(embeddings)} embeddings")
+            logger.debug("Successfully generated %d embeddings", len(embeddings))
             return embeddings
             
         except Exception as e:
-            print(f"Error generating embeddings: {e}")
+            logger.error(f"Error generating embeddings: {e}")
             raise
     
     def generate_single_embedding(self, text: str) -> np.ndarray:
@@ -88,14 +105,15 @@ class EmbeddingGenerator:
             # Use "query:" prefix for queries (E5 model recommendation)
             processed_text = f"query: {text}"
             
-            embedding = self.model.encode(
-                processed_text,
-                convert_to_numpy=True,
-                normalize_embeddings=True
-            )
+            with cpu_budget.limit("embed"):
+                embedding = self.model.encode(
+                    processed_text,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                )
             
             return embedding
             
         except Exception as e:
-            print(f"Error generating single embedding: {e}")
+            logger.error(f"Error generating single embedding: {e}")
             raise
\ No newline at end of file
@@ -0,0 +1,227 @@
+from typing import List, Sequence
+import numpy as np
+from config.rag_config import RagConfig
+
+
+def min_max_normalize(scores: np.ndarray) -> np.ndarray:
+    """
+    Scale scores to [0, 1]
+
+    Args:
+        scores: 1-D array of scores
+
+    Returns:
+        Normalized scores (unchanged if every score is equal)
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return scores
+
+    score_min = scores.min()
+    score_range = scores.max() - score_min
+    if score_range == 0:
+        # Nothing to spread: keep the raw scores, as the pre-vectorized reranker did
+        return scores
+    return (scores - score_min) / score_range
+
+
+def z_score_normalize(scores: np.ndarray) -> np.ndarray:
+    """
+    Standardize scores to zero mean and unit variance
+
+    Args:
+        scores: 1-D array of scores
+
+    Returns:
+        Standardized scores (all zeros if every score is equal)
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return scores
+
+    std = scores.std()
+    if std == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.mean()) / std
+
+
+NORMALIZERS = {
+    "minmax": min_max_normalize,
+    "zscore": z_score_normalize,
+}
+
+
+def top_k_indices(scores: np.ndarray, k: int = None) -> np.ndarray:
+    """
+    Indices of the k highest scores, sorted by descending score
+
+    Uses argpartition so only the selected k elements are fully sorted.
+
+    Args:
+        scores: 1-D array of scores
+        k: Number of indices to return (None = all)
+
+    Returns:
+        Array of indices into scores
+    """
+    scores = np.asarray(scores)
+    if k is None or k >= scores.size:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class LinearFusion:
+    """Weighted sum of normalized scores"""
+
+    name = "linear"
+
+    def __init__(self, weights: Sequence[float], normalization: str = RagConfig.SCORE_NORMALIZATION):
+        """
+        Args:
+            weights: One weight per score signal
+            normalization: "minmax" or "zscore"
+        """
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.normalize = NORMALIZERS[normalization]
+
+    def fuse(self, signals: Sequence[np.ndarray]) -> np.ndarray:
+        """Combine score signals (one array per signal, aligned by candidate)"""
+        normalized = np.vstack([self.normalize(signal) for signal in signals])
+        return self.weights[:len(signals)] @ normalized
+
+
+class RRFFusion:
+    """Reciprocal Rank Fusion: sum of weight / (k + rank) over signals"""
+
+    name = "rrf"
+
+    def __init__(self, weights: Sequence[float] = None, k: int = RagConfig.RRF_K):
+        """
+        Args:
+            weights: Optional weight per score signal (default: all 1)
+            k: RRF smoothing constant
+        """
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float32)
+        self.k = k
+
+    def fuse(self, signals: Sequence[np.ndarray]) -> np.ndarray:
+        """Combine score signals (one array per signal, aligned by candidate)"""
+        scores = np.vstack([np.asarray(signal, dtype=np.float32) for signal in signals])
+
+        # 1-based rank of each candidate within each signal
+        ranks = np.argsort(np.argsort(-scores, axis=1, kind="stable"), axis=1) + 1
+
+        weights = np.ones(len(scores), dtype=np.float32) if self.weights is None else self.weights[:len(scores)]
+        return weights @ (1.0 / (self.k + ranks))
+
+
+class LearnedFusion:
+    """Logistic combination of normalized scores with weights fitted offline (see fit)"""
+
+    name = "learned"
+
+    def __init__(self, weights: Sequence[float], bias: float = 0.0, normalization: str = "zscore"):
+        """
+        Args:
+            weights: Learned weight per score signal
+            bias: Learned intercept
+            normalization: "minmax" or "zscore"
+        """
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = bias
+        self.normalize = NORMALIZERS[normalization]
+
+    def fuse(self, signals: Sequence[np.ndarray]) -> np.ndarray:
+        """Combine score signals (one array per signal, aligned by candidate)"""
+        normalized = np.vstack([self.normalize(signal) for signal in signals])
+        logits = self.weights[:len(signals)] @ normalized + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    @classmethod
+    def fit(
+        cls,
+        queries: Sequence[Sequence[np.ndarray]],
+        labels: Sequence[np.ndarray],
+        normalization: str = "zscore",
+        l2: float = 0.01,
+        learning_rate: float = 0.5,
+        iterations: int = 2000
+    ) -> "LearnedFusion":
+        """
+        Fit weights and bias by L2-regularized logistic regression on labeled candidates
+
+        Signals are normalized per query exactly as fuse does, so the fitted weights apply as is.
+
+        Args:
+            queries: Per query, one score array per signal (aligned by candidate)
+            labels: Per query, 1 for relevant candidates and 0 otherwise
+            normalization: "minmax" or "zscore"
+            l2: Regularization strength on the weights (not the bias)
+            learning_rate: Gradient descent step size
+            iterations: Full-batch gradient descent steps
+
+        Returns:
+            LearnedFusion with the fitted weights and bias
+        """
+        normalize = NORMALIZERS[normalization]
+        features = np.hstack([np.vstack([normalize(signal) for signal in signals]) for signals in queries]).T
+        targets = np.concatenate([np.asarray(label, dtype=np.float32) for label in labels])
+        if features.size == 0 or targets.min() == targets.max():
+            raise ValueError("Fitting needs both relevant and irrelevant candidates")
+
+        weights = np.zeros(features.shape[1], dtype=np.float64)
+        bias = 0.0
+        for _ in range(iterations):
+            predictions = 1.0 / (1.0 + np.exp(-(features @ weights + bias)))
+            error = predictions - targets
+            weights -= learning_rate * (features.T @ error / len(targets) + l2 * weights)
+            bias -= learning_rate * error.mean()
+        return cls(weights.round(4).tolist(), round(float(bias), 4), normalization)
+
+
+def get_fusion_strategy(name: str = None, alpha: float = RagConfig.RERANK_ALPHA):
+    """
+    Build the fusion strategy configured in RagConfig
+
+    Args:
+        name: "linear", "rrf" or "learned" (default: RagConfig.FUSION_STRATEGY)
+        alpha: Weight of the first signal for linear fusion (1-alpha for the second)
+
+    Returns:
+        Fusion strategy with a fuse(signals) method
+    """
+    name = name or RagConfig.FUSION_STRATEGY
+    if name == "linear":
+        return LinearFusion([alpha, 1 - alpha], RagConfig.SCORE_NORMALIZATION)
+    if name == "rrf":
+        return RRFFusion([alpha, 1 - alpha], RagConfig.RRF_K)
+    if name == "learned":
+        return LearnedFusion(RagConfig.LEARNED_FUSION_WEIGHTS, RagConfig.LEARNED_FUSION_BIAS)
+    raise ValueError(f"Unknown fusion strategy: {name}")
+
+
+class RerankResult:
+    """Re-ranked passages with their scores kept as aligned numpy arrays"""
+
+    def __init__(self, texts: List[str], combined_scores: np.ndarray, cross_encoder_scores: np.ndarray, original_scores: np.ndarray, scored_pairs: int = 0):
+        self.texts = texts
+        self.combined_scores = combined_scores
+        self.cross_encoder_scores = cross_encoder_scores
+        self.original_scores = original_scores
+        # Pairs the cross-encoder actually ran on (cached scores excluded)
+        self.scored_pairs = scored_pairs
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable view of the scores"""
+        return {
+            "cross_encoder_scores": self.cross_encoder_scores.tolist(),
+            "original_scores": self.original_scores.tolist(),
+            "combined_scores": self.combined_scores.tolist()
+        }
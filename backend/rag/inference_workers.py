@@ -0,0 +1,432 @@
+"""
+Out-of-process model inference
+
+Each InferencePool runs N spawned worker processes holding one model kind (image, embed
+or rerank), so torch work does not compete with request handling for the API process's
+GIL and cores. Control messages (method name, texts) go over a Pipe; arrays (image
+tensors, embeddings, scores) go through a shared memory slot owned by each worker
+instead of being pickled.
+
+The proxies (RemoteImageModel, RemoteSentenceTransformer, RemoteCrossEncoder) mimic the
+model objects, so ImageService, EmbeddingGenerator and CrossEncoderReranker keep their
+pre/post-processing and caches in the API process and only the forward pass moves.
+"""
+from multiprocessing import resource_tracker, shared_memory
+from config.rag_config import RagConfig
+from utils.metrics import QUEUE_DEPTH, QUEUE_WAIT
+from utils.logger import get_logger
+from utils.cpu_budget import cpu_budget, blas_env
+from typing import Dict, Any
+import multiprocessing
+import numpy as np
+import os
+import queue
+import sys
+import threading
+import time
+
+logger = get_logger(__name__)
+
+# Serializes the temporary environment change around process spawns (pools start in parallel)
+_spawn_lock = threading.Lock()
+
+
+def write_array(buffer: memoryview, array: np.ndarray) -> Dict[str, Any]:
+    """
+    Copy an array into a shared memory slot
+
+    Args:
+        buffer: Shared memory buffer
+        array: Array to send
+
+    Returns:
+        Descriptor for read_array (shape/dtype, or the array itself if it does not fit the slot)
+    """
+    array = np.ascontiguousarray(array)
+    if array.nbytes > len(buffer):
+        # Rare large batches (e.g. ingestion) fall back to pickling through the pipe
+        return {"inline": array}
+    np.ndarray(array.shape, dtype=array.dtype, buffer=buffer)[...] = array
+    return {"shape": array.shape, "dtype": array.dtype.str}
+
+
+def read_array(buffer: memoryview, descriptor: Dict[str, Any], copy: bool = True) -> np.ndarray:
+    """
+    Read an array written by write_array
+
+    Args:
+        buffer: Shared memory buffer
+        descriptor: Descriptor returned by write_array
+        copy: Copy out of the slot (needed when the slot is reused before the array is dropped)
+
+    Returns:
+        The array, or None if the message carried none
+    """
+    if descriptor is None:
+        return None
+    if "inline" in descriptor:
+        return descriptor["inline"]
+    array = np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=buffer)
+    return array.copy() if copy else array
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a segment owned by the API process without registering it with the resource tracker
+
+    Before Python 3.13 attaching registers the segment as if this process owned it, so a
+    tracker could unlink it or warn about a leak when the worker exits. Unregistering
+    afterwards is not an option: spawned workers share the API process's tracker, so that
+    would drop the owner's registration.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _build_handlers(kind: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Load the model of one pool kind and return its request handlers (worker process side)"""
+    import torch
+
+    if kind == "image":
+        from services.ImageService import ImageService
+        service = ImageService()
+
+        def forward(array):
+            with torch.no_grad():
+                return service.model(torch.from_numpy(array).to(service.device)).cpu().numpy()
+
+        if RagConfig.WARMUP_ON_STARTUP:
+            service.warm_up()
+        return {"forward": forward}
+
+    if kind == "embed":
+        from rag.embeddings import EmbeddingGenerator
+        generator = EmbeddingGenerator()
+
+        def encode(_, texts, **kwargs):
+            return generator.model.encode(texts, show_progress_bar=False, convert_to_numpy=True, **kwargs)
+
+        if RagConfig.WARMUP_ON_STARTUP:
+            generator.generate_single_embedding(RagConfig.WARMUP_QUERY)
+        return {"encode": encode}
+
+    if kind == "rerank":
+        from sentence_transformers import CrossEncoder
+        models = {"main": CrossEncoder(options["model_name"])}
+        if options.get("first_stage_model_name"):
+            models["first_stage"] = CrossEncoder(options["first_stage_model_name"])
+
+        def predict(_, pairs, stage="main"):
+            return np.asarray(models[stage].predict(pairs), dtype=np.float32)
+
+        if RagConfig.WARMUP_ON_STARTUP:
+            for model in models.values():
+                model.predict([(RagConfig.WARMUP_QUERY, RagConfig.WARMUP_QUERY)])
+        return {"predict": predict}
+
+    raise ValueError(f"Unknown inference worker kind: {kind}")
+
+
+def _worker_main(kind: str, conn, shm_name: str, threads: int, options: Dict[str, Any]):
+    """Worker process loop: load the model, then serve one request at a time"""
+    cpu_budget.apply_process(intra_op=threads)
+    # The whole process is this model's budget; no per-call limits on top
+    RagConfig.CPU_THREAD_BUDGET = "off"
+
+    shm = attach_shared_memory(shm_name)
+    try:
+        handlers = _build_handlers(kind, options)
+    except Exception as e:
+        conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        shm.close()
+        return
+    conn.send({"ok": True})
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        try:
+            # Zero-copy view of the input; the result overwrites it once the forward pass is done
+            array = read_array(shm.buf, message["array"], copy=False)
+            result = handlers[message["method"]](array, *message["args"], **message["kwargs"])
+            del array
+            conn.send({"ok": True, "array": write_array(shm.buf, np.asarray(result))})
+        except Exception as e:
+            conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    shm.close()
+
+
+class InferenceWorker:
+    """API process handle of one worker process: its pipe and its shared memory slot"""
+
+    def __init__(self, pool: "InferencePool", index: int):
+        self.pool = pool
+        self.index = index
+        self.shm = shared_memory.SharedMemory(create=True, size=pool.slot_bytes)
+        self.conn = None
+        self.process = None
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(self.pool.kind, child_conn, self.shm.name, self.pool.threads, self.pool.options),
+            name=f"inference-{self.pool.kind}-{self.index}",
+            daemon=True
+        )
+        # The child's OpenMP/BLAS pools read these when it imports numpy/torch
+        with _spawn_lock:
+            saved = {name: os.environ.get(name) for name in blas_env(0)}
+            os.environ.update(blas_env(self.pool.threads))
+            try:
+                self.process.start()
+            finally:
+                for name, value in saved.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+        child_conn.close()
+
+    def wait_ready(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"{self.process.name} did not load its model within {timeout}s")
+        reply = self.conn.recv()
+        if not reply["ok"]:
+            raise RuntimeError(f"{self.process.name} failed to load: {reply['error']}")
+
+    def call(self, method: str, array: np.ndarray, args: tuple, kwargs: dict, timeout: float) -> np.ndarray:
+        descriptor = write_array(self.shm.buf, array) if array is not None else None
+        self.conn.send({"method": method, "array": descriptor, "args": args, "kwargs": kwargs})
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"{self.process.name} did not answer within {timeout}s")
+        reply = self.conn.recv()
+        if not reply["ok"]:
+            raise RuntimeError(f"{self.process.name}: {reply['error']}")
+        return read_array(self.shm.buf, reply["array"])
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferencePool:
+    """
+    Fixed-size pool of worker processes for one model kind
+
+    Calls are blocking (run them from worker threads, as the RAG pipeline already does);
+    each call checks out an idle worker, so at most `size` forward passes of this kind run
+    at once. A worker that crashes or times out is replaced in the background, with
+    backoff and at most INFERENCE_RESTART_ATTEMPTS tries; the pool reports itself degraded
+    meanwhile and after giving up.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        size: int,
+        threads: int = RagConfig.INFERENCE_THREADS_PER_WORKER,
+        slot_mb: int = RagConfig.INFERENCE_SHM_SLOT_MB,
+        timeout: float = RagConfig.INFERENCE_TIMEOUT,
+        **options
+    ):
+        """
+        Args:
+            kind: "image", "embed" or "rerank"
+            size: Number of worker processes
+            threads: torch/BLAS threads per worker (default: the model's CPU budget split across the workers)
+            slot_mb: Shared memory per worker for request/response arrays
+            timeout: Seconds to wait for a forward pass
+            options: Model options passed to the workers (e.g. model_name for rerank)
+        """
+        self.kind = kind
+        self.size = max(1, size)
+        self.threads = threads or cpu_budget.threads_for(kind, self.size)
+        self.slot_bytes = slot_mb * 2**20
+        self.timeout = timeout
+        self.options = options
+        self.workers = [InferenceWorker(self, i) for i in range(self.size)]
+        self._idle = queue.Queue()
+        # Worker indexes being restarted / given up on
+        self.restarting = set()
+        self.failed = set()
+        self._lock = threading.Lock()
+
+    @property
+    def degraded(self) -> bool:
+        """Some workers are not serving (restarting or given up)"""
+        return bool(self.restarting or self.failed)
+
+    @property
+    def available(self) -> bool:
+        """At least one worker serves or may come back"""
+        return len(self.failed) < self.size
+
+    def start(self, load_timeout: float = 600):
+        """Spawn the workers and block until every model is loaded"""
+        start = time.perf_counter()
+        for worker in self.workers:
+            worker.start()
+        try:
+            for worker in self.workers:
+                worker.wait_ready(load_timeout)
+                self._idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+        logger.info(f"Inference pool '{self.kind}' ready: {self.size} workers x {self.threads} threads in {time.perf_counter() - start:.1f}s")
+        return self
+
+    def call(self, method: str, array: np.ndarray = None, *args, **kwargs) -> np.ndarray:
+        """
+        Run one request on an idle worker
+
+        Args:
+            method: Worker handler name
+            array: Array passed through shared memory (optional)
+            args, kwargs: Small picklable arguments (texts, options)
+
+        Returns:
+            Result array (copied out of the shared memory slot)
+        """
+        if not self.available:
+            raise RuntimeError(f"Inference pool '{self.kind}' has no workers left")
+        queue_name = f"inference_{self.kind}"
+        QUEUE_DEPTH.labels(queue=queue_name).inc()
+        wait_start = time.perf_counter()
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No idle '{self.kind}' inference worker within {self.timeout}s")
+        finally:
+            QUEUE_DEPTH.labels(queue=queue_name).dec()
+            QUEUE_WAIT.labels(queue=queue_name).observe(time.perf_counter() - wait_start)
+
+        try:
+            result = worker.call(method, array, args, kwargs, self.timeout)
+        except (EOFError, OSError, TimeoutError) as e:
+            # Dead or stuck worker: replace it without blocking this request's caller further
+            logger.error(f"Inference worker {worker.process.name} failed ({e}), restarting")
+            with self._lock:
+                self.restarting.add(worker.index)
+            threading.Thread(target=self._restart, args=(worker,), name=f"restart-{worker.process.name}", daemon=True).start()
+            raise RuntimeError(f"Inference worker failed: {e}") from e
+        except Exception:
+            # The handler raised inside the worker (bad input, ...): the worker itself is fine
+            self._idle.put(worker)
+            raise
+        self._idle.put(worker)
+        return result
+
+    def _restart(self, worker: InferenceWorker):
+        """Replace a failed worker process (background thread); gives up after INFERENCE_RESTART_ATTEMPTS"""
+        name = worker.process.name
+        delay = RagConfig.INFERENCE_RESTART_BACKOFF
+        for attempt in range(1, RagConfig.INFERENCE_RESTART_ATTEMPTS + 1):
+            worker.process.kill()
+            worker.process.join()
+            worker.conn.close()
+            try:
+                worker.start()
+                worker.wait_ready(600)
+            except Exception as e:
+                logger.error(f"Restarting {name} failed (attempt {attempt}/{RagConfig.INFERENCE_RESTART_ATTEMPTS}): {e}")
+                if attempt < RagConfig.INFERENCE_RESTART_ATTEMPTS:
+                    time.sleep(delay)
+                    delay = min(delay * 2, RagConfig.INFERENCE_RESTART_BACKOFF_MAX)
+                continue
+            with self._lock:
+                self.restarting.discard(worker.index)
+            self._idle.put(worker)
+            logger.info(f"Restarted {name} (attempt {attempt})")
+            return
+
+        # The model cannot be loaded any more (out of memory, missing weights): run with fewer workers
+        worker.process.kill()
+        worker.process.join()
+        with self._lock:
+            self.restarting.discard(worker.index)
+            self.failed.add(worker.index)
+        logger.critical(f"Gave up restarting {name}: pool '{self.kind}' has {self.size - len(self.failed)}/{self.size} workers")
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.stop()
+            worker.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "size": self.size,
+            "threads_per_worker": self.threads,
+            "idle": self._idle.qsize(),
+            "degraded": self.degraded,
+            "restarting": len(self.restarting),
+            "failed": len(self.failed),
+            "slot_mb": self.slot_bytes // 2**20,
+            "pids": [worker.process.pid for worker in self.workers if worker.process is not None]
+        }
+
+
+class RemoteImageModel:
+    """Stands in for the ConvNeXt module in ImageService: tensor in, logits out"""
+
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+
+    def __call__(self, tensor):
+        import torch
+        return torch.from_numpy(self.pool.call("forward", tensor.detach().cpu().numpy()))
+
+
+class RemoteSentenceTransformer:
+    """Stands in for SentenceTransformer in EmbeddingGenerator"""
+
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, convert_to_numpy: bool = True, normalize_embeddings: bool = False):
+        single = isinstance(sentences, str)
+        embeddings = self.pool.call(
+            "encode", None, [sentences] if single else list(sentences),
+            batch_size=batch_size, normalize_embeddings=normalize_embeddings
+        )
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return RagConfig.VECTOR_DIMENSION
+
+
+class RemoteCrossEncoder:
+    """Stands in for a CrossEncoder in CrossEncoderReranker (main or first-stage model)"""
+
+    def __init__(self, pool: InferencePool, stage: str = "main"):
+        self.pool = pool
+        self.stage = stage
+
+    def predict(self, pairs):
+        return self.pool.call("predict", None, [tuple(pair) for pair in pairs], stage=self.stage)
+
@@ -1,8 +1,11 @@
 from google import genai
 from google.genai import types
 from config.rag_config import RagConfig
+from utils.logger import get_logger
 from typing import List
 
+logger = get_logger(__name__)
+
 class GeminiLLM:
     """Gemini 2.5 Flash LLM for generating responses"""
     
@@ -12,22 +15,26 @@ class GeminiLLM:
         self.client = genai.Client(api_key=RagConfig.GOOGLE_API_KEY)
         self.model = RagConfig.LLM_MODEL
     
-    def generate_response(self, query: str, context: List[str]) -> str:
+    def reconnect(self):
+        """Create a fresh HTTP client (connections must not be shared across forked workers)"""
+        self.client = genai.Client(api_key=RagConfig.GOOGLE_API_KEY)
+    
+    def build_prompt(self, query: str, context: List[str]) -> str:
         """
-        Generate response using query and retrieved context
+        Build the RAG prompt from the query and retrieved context
         
         Args:
             query: User's question
             context: List of relevant text chunks from vector search
             
         Returns:
-            Generated response string
+            Prompt string
         """
         # Prepare context
         context_text = "\n\n".join([f"Context {i+1}: {text}" for i, text in enumerate(context)])
         
         # Create prompt
-        prompt = f"""Consider yourself a snake expert to give professional answers, answer users like an expert and not answer like you rely on this or that information to give results even though you have to get results from context to answer
+        return f"""Consider yourself a snake expert to give professional answers, answer users like an expert and not answer like you rely on this or that information to give results even though you have to get results from context to answer
 
 Based on the following context information, please answer the question accurately and comprehensively.
 
@@ -39,6 +46,56 @@ Question: {query}
 Please provide a detailed answer based on the context provided. If the context doesn't contain enough information to answer the question, please mention that.
 
 Position yourself as a snake expert, give the user some more questions related to the current question so the user can build on that and then continue saying what question you want me to help you answer"""
+    
+    def _generate_config(self) -> types.GenerateContentConfig:
+        """Generation config with thinking disabled"""
+        return types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=0,
+            ),
+        )
+    
+    async def agenerate(self, prompt: str) -> str:
+        """
+        Generate a response asynchronously (used by LLMGateway)
+        
+        Unlike generate_response, errors are raised so the gateway can retry them.
+        
+        Args:
+            prompt: Full prompt text
+            
+        Returns:
+            Generated response string
+        """
+        contents = [
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_text(text=prompt),
+                ],
+            ),
+        ]
+        
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=self._generate_config()
+        )
+        
+        return response.candidates[0].content.parts[0].text
+    
+    def generate_response(self, query: str, context: List[str]) -> str:
+        """
+        Generate response using query and retrieved context
+        
+        Args:
+            query: User's question
+            context: List of relevant text chunks from vector search
+            
+        Returns:
+            Generated response string
+        """
+        prompt = self.build_prompt(query, context)
 
         try:
             contents = [
@@ -67,7 +124,7 @@ Position yourself as a snake expert, give the user some more questions related t
             return final_response
             
         except Exception as e:
-            print(f"Error generating response: {e}")
+            logger.error(f"Error generating response: {e}")
             return f"Sorry, I encountered an error while generating the response: {str(e)}"
     
     def generate_simple_response(self, text: str) -> str:
@@ -106,5 +163,5 @@ Position yourself as a snake expert, give the user some more questions related t
             return final_response
             
         except Exception as e:
-            print(f"Error generating simple response: {e}")
+            logger.error(f"Error generating simple response: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
\ No newline at end of file
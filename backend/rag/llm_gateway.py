@@ -0,0 +1,382 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+from config.rag_config import RagConfig
+from utils.metrics import QUEUE_WAIT
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class LLMGatewayError(Exception):
+    """Base error for requests the LLM gateway could not serve"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMQueueFullError(LLMGatewayError):
+    """The request queue is full, the request was rejected without waiting"""
+
+
+class LLMDeadlineExceededError(LLMGatewayError):
+    """The request deadline passed before the LLM could answer"""
+
+
+class LLMUnavailableError(LLMGatewayError):
+    """The LLM kept failing after all retries"""
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for an asyncio event loop"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until_available(self) -> float:
+        """Seconds until one token is available (0 if available now)"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, deadline: float = None):
+        """
+        Wait for one token
+
+        Args:
+            deadline: Absolute time.monotonic() deadline; raises LLMDeadlineExceededError if the token comes later
+        """
+        while True:
+            wait = self.time_until_available()
+            if wait == 0:
+                self.tokens -= 1
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise LLMDeadlineExceededError("Deadline exceeded while waiting for LLM rate limit", retry_after=wait)
+            await asyncio.sleep(wait)
+
+    def refund(self):
+        """Give back a token that was acquired but not used"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _PendingRequest:
+    """A queued LLM call"""
+
+    def __init__(self, prompt: str, client_id: str, deadline: float, future: asyncio.Future):
+        self.prompt = prompt
+        self.client_id = client_id
+        self.deadline = deadline
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        # Counted in the gateway's queue depth until popped or cancelled
+        self.queued = True
+
+
+class LLMGateway:
+    """
+    Async gateway in front of the LLM: token-bucket rate limiting, a fair per-client
+    queue with deadlines and retries with jittered backoff on 429/5xx
+
+    The wrapped llm only needs an async agenerate(prompt) -> str method, so a local
+    stub can replace GeminiLLM.
+    """
+
+    def __init__(
+        self,
+        llm,
+        requests_per_minute: float = RagConfig.LLM_REQUESTS_PER_MINUTE,
+        min_interval: float = RagConfig.LLM_DELAY_BETWEEN_REQUESTS,
+        burst_size: int = RagConfig.LLM_BURST_SIZE,
+        max_queue_size: int = RagConfig.LLM_MAX_QUEUE_SIZE,
+        max_concurrency: int = RagConfig.LLM_MAX_CONCURRENCY,
+        max_retries: int = RagConfig.LLM_MAX_RETRIES,
+        backoff_base: float = RagConfig.LLM_BACKOFF_BASE,
+        backoff_max: float = RagConfig.LLM_BACKOFF_MAX
+    ):
+        """
+        Args:
+            llm: Object with an async agenerate(prompt) method
+            requests_per_minute: Sustained request rate
+            min_interval: Minimum steady-state spacing between requests in seconds
+            burst_size: Requests allowed back-to-back after an idle period
+            max_queue_size: Queued requests beyond this are rejected immediately
+            max_concurrency: Maximum LLM calls in flight
+            max_retries: Retries on 429/5xx/network errors
+            backoff_base: First retry delay in seconds (doubles each attempt)
+            backoff_max: Upper bound for a single retry delay
+        """
+        self.llm = llm
+        self.interval = max(60.0 / requests_per_minute, min_interval)
+        self.bucket = TokenBucket(rate=1.0 / self.interval, capacity=burst_size)
+        self.max_queue_size = max_queue_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Fair queue: one FIFO per client, served round-robin
+        self._queues = OrderedDict()
+        self._queue_depth = 0
+        self._wakeup = None
+        self._slots = None
+        self._dispatcher = None
+        self._running = set()
+        self._in_flight = 0
+
+        # EWMA of successful LLM call durations (seconds), for deadline planning
+        self.call_time = RagConfig.DEADLINE_LLM_ESTIMATE
+
+        # Metrics
+        self.wait_times = deque(maxlen=1000)
+        self.counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "expired": 0,
+            "cancelled": 0,
+            "retries": 0
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting in the queue"""
+        return self._queue_depth
+
+    @property
+    def in_flight(self) -> int:
+        """Number of LLM calls currently running"""
+        return self._in_flight
+
+    def estimated_latency(self) -> float:
+        """
+        Rough seconds until a prompt submitted now would be answered: the rate-limit
+        wait for the queue ahead of it plus a typical call duration
+        """
+        bucket = self.bucket
+        tokens = min(bucket.capacity, bucket.tokens + (time.monotonic() - bucket.updated_at) * bucket.rate)
+        # Read-only (no refill), so it is safe to call from retrieval worker threads
+        queue_wait = max(0.0, self._queue_depth + 1 - tokens) * self.interval
+        return queue_wait + self.call_time
+
+    def _ensure_started(self):
+        """Start the dispatcher on the running event loop (lazily, on first use)"""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    async def generate(self, prompt: str, client_id: str = "anonymous", timeout: float = RagConfig.LLM_QUEUE_TIMEOUT, deadline: float = None) -> str:
+        """
+        Queue a prompt and wait for the LLM answer
+
+        Args:
+            prompt: Full prompt text
+            client_id: Key for fair queueing (user id, IP, ...)
+            timeout: Seconds the request may spend in the gateway (ignored if deadline is given)
+            deadline: Absolute time.monotonic() deadline
+
+        Returns:
+            Generated response text
+
+        Raises:
+            LLMQueueFullError, LLMDeadlineExceededError, LLMUnavailableError
+        """
+        self._ensure_started()
+
+        if self._queue_depth >= self.max_queue_size:
+            self.counters["rejected"] += 1
+            raise LLMQueueFullError(
+                "LLM request queue is full",
+                retry_after=(self._queue_depth + 1) * self.interval
+            )
+
+        if deadline is None:
+            deadline = time.monotonic() + timeout
+
+        request = _PendingRequest(prompt, client_id, deadline, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(client_id, deque()).append(request)
+        self._queue_depth += 1
+        # A caller that goes away stops counting against max_queue_size right away
+        request.future.add_done_callback(lambda _: self._dequeue_cancelled(request))
+        self.counters["submitted"] += 1
+        self._wakeup.set()
+
+        return await request.future
+
+    def _dequeue_cancelled(self, request: _PendingRequest):
+        """Take a cancelled request out of the queue depth; _next_request drops the entry itself"""
+        if request.future.cancelled() and request.queued:
+            request.queued = False
+            self._queue_depth -= 1
+            self.counters["cancelled"] += 1
+
+    def _next_request(self) -> Optional[_PendingRequest]:
+        """Pop the next request round-robin across clients, skipping cancelled ones"""
+        while self._queues:
+            client_id, queue = next(iter(self._queues.items()))
+            request = queue.popleft()
+            if not request.queued:
+                # Cancelled while queued: the client keeps its turn
+                if not queue:
+                    del self._queues[client_id]
+                continue
+            del self._queues[client_id]
+            if queue:
+                # Client goes to the back of the rotation
+                self._queues[client_id] = queue
+            request.queued = False
+            self._queue_depth -= 1
+            return request
+        return None
+
+    async def _dispatch_loop(self):
+        """Hand queued requests to the LLM at the allowed rate"""
+        while True:
+            request = self._next_request()
+            if request is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if request.future.done():
+                # Caller went away (cancelled)
+                continue
+
+            if time.monotonic() >= request.deadline:
+                self.counters["expired"] += 1
+                request.future.set_exception(LLMDeadlineExceededError("Deadline exceeded while queued for the LLM", retry_after=self.interval))
+                continue
+
+            await self._slots.acquire()
+            try:
+                await self.bucket.acquire(request.deadline)
+            except LLMDeadlineExceededError as e:
+                self._slots.release()
+                self.counters["expired"] += 1
+                if not request.future.done():
+                    request.future.set_exception(e)
+                continue
+
+            if request.future.done():
+                # Caller went away while waiting for the rate limit: nothing was sent
+                self.bucket.refund()
+                self._slots.release()
+                self.counters["cancelled"] += 1
+                continue
+
+            if time.monotonic() >= request.deadline:
+                # Spent its time waiting for a free concurrency slot
+                self.bucket.refund()
+                self._slots.release()
+                self.counters["expired"] += 1
+                request.future.set_exception(LLMDeadlineExceededError("Deadline exceeded while queued for the LLM", retry_after=self.interval))
+                continue
+
+            wait = time.monotonic() - request.enqueued_at
+            self.wait_times.append(wait)
+            QUEUE_WAIT.labels(queue="llm").observe(wait)
+            task = asyncio.get_running_loop().create_task(self._run(request))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """429, 5xx and transport errors are worth retrying"""
+        if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+            return True
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        return isinstance(code, int) and (code == 429 or code >= 500)
+
+    async def _run(self, request: _PendingRequest):
+        """Call the LLM with retries, then resolve the caller's future"""
+        self._in_flight += 1
+        # A caller cancelled mid-call stops the LLM call (or its retry backoff) too. Registered
+        # here rather than by the dispatcher: a task cancelled before it starts would skip the finally
+        task = asyncio.current_task()
+        request.future.add_done_callback(lambda future: task.cancel() if future.cancelled() else None)
+        try:
+            attempt = 0
+            while True:
+                try:
+                    call_start = time.monotonic()
+                    response = await asyncio.wait_for(
+                        self.llm.agenerate(request.prompt),
+                        timeout=max(request.deadline - time.monotonic(), 0.001)
+                    )
+                    self.counters["completed"] += 1
+                    self.call_time = 0.8 * self.call_time + 0.2 * (time.monotonic() - call_start)
+                    if not request.future.done():
+                        request.future.set_result(response)
+                    return
+                except Exception as e:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                    out_of_time = time.monotonic() + delay >= request.deadline
+                    if not self._is_retryable(e) or attempt >= self.max_retries or out_of_time:
+                        self.counters["failed"] += 1
+                        if not request.future.done():
+                            if out_of_time and self._is_retryable(e):
+                                error = LLMDeadlineExceededError(f"LLM did not answer before the deadline: {e}", retry_after=self.interval)
+                            else:
+                                error = LLMUnavailableError(f"LLM request failed: {e}", retry_after=self.interval)
+                            request.future.set_exception(error)
+                        return
+
+                    attempt += 1
+                    self.counters["retries"] += 1
+                    logger.warning(
+                        f"LLM call failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s",
+                        extra={"client_id": request.client_id, "attempt": attempt}
+                    )
+                    await asyncio.sleep(delay)
+                    if request.future.done():
+                        return
+                    # Every retry is a new request against the quota
+                    try:
+                        await self.bucket.acquire(request.deadline)
+                    except LLMDeadlineExceededError as deadline_error:
+                        self.counters["failed"] += 1
+                        if not request.future.done():
+                            request.future.set_exception(deadline_error)
+                        return
+                    if request.future.done():
+                        self.bucket.refund()
+                        return
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def get_stats(self) -> dict:
+        """Queue depth, wait times and request counters"""
+        waits = sorted(self.wait_times)
+        return {
+            "queue_depth": self._queue_depth,
+            "in_flight": self._in_flight,
+            "clients_waiting": len(self._queues),
+            "interval_seconds": round(self.interval, 3),
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+            "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2) if waits else 0.0,
+            "wait_max_ms": round(waits[-1] * 1000, 2) if waits else 0.0,
+            **self.counters
+        }
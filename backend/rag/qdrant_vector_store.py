@@ -3,16 +3,26 @@ from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, Fi
 import numpy as np
 from typing import List, Tuple, Optional
 from config.rag_config import RagConfig
+from utils.logger import get_logger
 import uuid
 import time
 
+logger = get_logger(__name__)
+
 class QdrantVectorStore:
     """Qdrant-based vector store for similarity search"""
     
-    def __init__(self):
-        """Initialize Qdrant vector store"""
+    def __init__(self, location: str = None, collection_name: str = None):
+        """
+        Initialize Qdrant vector store
+        
+        Args:
+            location: Local Qdrant location (e.g. ":memory:") instead of RagConfig.QDRANT_URL
+            collection_name: Collection to use instead of RagConfig.QDRANT_COLLECTION_NAME
+        """
         self.dimension = RagConfig.VECTOR_DIMENSION
-        self.collection_name = RagConfig.QDRANT_COLLECTION_NAME
+        self.collection_name = collection_name or RagConfig.QDRANT_COLLECTION_NAME
+        self.location = location
         self.client = None
         self.texts = []  # Local cache for texts (optional, for compatibility)
         
@@ -22,19 +32,23 @@ class QdrantVectorStore:
     def _initialize_client(self):
         """Initialize Qdrant client and create collection if needed"""
         try:
-            print(f"Connecting to Qdrant at {RagConfig.QDRANT_URL}...")
-            self.client = QdrantClient(
-                url=RagConfig.QDRANT_URL,
-                api_key=RagConfig.QDRANT_API_KEY,
-                timeout=300  # 5 minutes timeout for large uploads
-            )
+            if self.location:
+                logger.info(f"Using local Qdrant at {self.location}...")
+                self.client = QdrantClient(location=self.location)
+            else:
+                logger.info(f"Connecting to Qdrant at {RagConfig.QDRANT_URL}...")
+                self.client = QdrantClient(
+                    url=RagConfig.QDRANT_URL,
+                    api_key=RagConfig.QDRANT_API_KEY,
+                    timeout=300  # 5 minutes timeout for large uploads
+                )
             
             # Check if collection exists, create if not
             collections = self.client.get_collections().collections
             collection_names = [c.name for c in collections]
             
             if self.collection_name not in collection_names:
-                print(f"Creating collection '{self.collection_name}'...")
+                logger.info(f"Creating collection '{self.collection_name}'...")
                 self.client.create_collection(
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(
@@ -42,14 +56,18 @@ class QdrantVectorStore:
                         distance=Distance.COSINE
                     )
                 )
-                print(f"✓ Collection '{self.collection_name}' created successfully!")
+                logger.info(f"Collection '{self.collection_name}' created successfully!")
             else:
-                print(f"✓ Using existing collection '{self.collection_name}'")
+                logger.info(f"Using existing collection '{self.collection_name}'")
                 
         except Exception as e:
-            print(f"Error initializing Qdrant client: {e}")
+            logger.error(f"Error initializing Qdrant client: {e}")
             raise
     
+    def reconnect(self):
+        """Create a fresh client (connections must not be shared across forked workers)"""
+        self._initialize_client()
+    
     def create_index(self):
         """Create/recreate collection (for compatibility with FAISS interface)"""
         try:
@@ -59,7 +77,7 @@ class QdrantVectorStore:
             
             if self.collection_name in collection_names:
                 self.client.delete_collection(collection_name=self.collection_name)
-                print(f"Deleted existing collection '{self.collection_name}'")
+                logger.info(f"Deleted existing collection '{self.collection_name}'")
             
             # Create new collection
             self.client.create_collection(
@@ -69,10 +87,10 @@ class QdrantVectorStore:
                     distance=Distance.COSINE
                 )
             )
-            print(f"Created new Qdrant collection '{self.collection_name}' with dimension {self.dimension}")
+            logger.info(f"Created new Qdrant collection '{self.collection_name}' with dimension {self.dimension}")
             
         except Exception as e:
-            print(f"Error creating collection: {e}")
+            logger.error(f"Error creating collection: {e}")
             raise
     
     def add_embeddings(self, embeddings: np.ndarray, texts: List[str], metadata: Optional[List[dict]] = None, batch_size: int = 50):
@@ -89,7 +107,7 @@ class QdrantVectorStore:
             embeddings = embeddings.astype('float32')
             total_embeddings = len(embeddings)
             
-            print(f"Uploading {total_embeddings} embeddings to Qdrant in batches of {batch_size}...")
+            logger.info(f"Uploading {total_embeddings} embeddings to Qdrant in batches of {batch_size}...")
             
             # Process in batches
             for batch_start in range(0, total_embeddings, batch_size):
@@ -133,7 +151,7 @@ class QdrantVectorStore:
                         break  # Success, exit retry loop
                     except Exception as e:
                         if attempt < max_retries - 1:
-                            print(f"  ⚠️  Upload failed (attempt {attempt + 1}/{max_retries}), retrying in {retry_delay}s...")
+                            logger.warning(f"Upload failed (attempt {attempt + 1}/{max_retries}), retrying in {retry_delay}s...")
                             time.sleep(retry_delay)
                             retry_delay *= 2  # Exponential backoff
                         else:
@@ -144,16 +162,16 @@ class QdrantVectorStore:
                 
                 batch_num = (batch_start // batch_size) + 1
                 total_batches = (total_embeddings + batch_size - 1) // batch_size
-                print(f"  ✓ Uploaded batch {batch_num}/{total_batches} ({batch_end}/{total_embeddings} embeddings)")
+                logger.debug("Uploaded batch %d/%d (%d/%d embeddings)", batch_num, total_batches, batch_end, total_embeddings)
                 
                 # Small delay between batches to avoid overwhelming the server
                 if batch_end < total_embeddings:
                     time.sleep(0.5)
             
-            print(f"✓ Successfully added {total_embeddings} embeddings to Qdrant. Total: {len(self.texts)}")
+            logger.info(f"Successfully added {total_embeddings} embeddings to Qdrant. Total: {len(self.texts)}")
             
         except Exception as e:
-            print(f"Error adding embeddings to Qdrant: {e}")
+            logger.error(f"Error adding embeddings to Qdrant: {e}")
             raise
     
     def search(self, query_embedding: np.ndarray, k: int = RagConfig.TOP_K_RESULTS) -> Tuple[List[str], List[float]]:
@@ -190,7 +208,7 @@ class QdrantVectorStore:
             return similar_texts, similarity_scores
             
         except Exception as e:
-            print(f"Error searching in Qdrant: {e}")
+            logger.error(f"Error searching in Qdrant: {e}")
             return [], []
     
     def save_index(self, filepath: str = None):
@@ -198,7 +216,7 @@ class QdrantVectorStore:
         Save index (for Qdrant, data is already persisted in cloud)
         This method is kept for compatibility with FAISS interface
         """
-        print(f"✓ Data already persisted in Qdrant cloud (collection: {self.collection_name})")
+        logger.info(f"Data already persisted in Qdrant cloud (collection: {self.collection_name})")
         return True
     
     def load_index(self, filepath: str = None):
@@ -215,7 +233,7 @@ class QdrantVectorStore:
             collection_names = [c.name for c in collections]
             
             if self.collection_name not in collection_names:
-                print(f"Collection '{self.collection_name}' not found in Qdrant")
+                logger.warning(f"Collection '{self.collection_name}' not found in Qdrant")
                 return False
             
             # Get collection info
@@ -223,19 +241,19 @@ class QdrantVectorStore:
             points_count = collection_info.points_count
             
             if points_count == 0:
-                print(f"Collection '{self.collection_name}' exists but is empty")
+                logger.warning(f"Collection '{self.collection_name}' exists but is empty")
                 return False
             
-            print(f"Connected to Qdrant collection '{self.collection_name}' with {points_count} vectors")
+            logger.info(f"Connected to Qdrant collection '{self.collection_name}' with {points_count} vectors")
             
             # Skip rebuilding text cache for faster startup
             # Text will be fetched on-demand during search
-            print("✓ Index loaded (text cache will be built on-demand for faster startup)")
+            logger.info("Index loaded (text cache will be built on-demand for faster startup)")
             
             return True
             
         except Exception as e:
-            print(f"Error loading from Qdrant: {e}")
+            logger.error(f"Error loading from Qdrant: {e}")
             return False
     
     def _rebuild_text_cache(self):
@@ -248,10 +266,10 @@ class QdrantVectorStore:
             )
             
             self.texts = [point.payload["text"] for point in points]
-            print(f"Rebuilt text cache with {len(self.texts)} texts")
+            logger.info(f"Rebuilt text cache with {len(self.texts)} texts")
             
         except Exception as e:
-            print(f"Warning: Could not rebuild text cache: {e}")
+            logger.warning(f"Could not rebuild text cache: {e}")
             self.texts = []
     
     def get_stats(self):
@@ -281,9 +299,9 @@ class QdrantVectorStore:
         """Delete the collection from Qdrant"""
         try:
             self.client.delete_collection(collection_name=self.collection_name)
-            print(f"✓ Deleted collection '{self.collection_name}' from Qdrant")
+            logger.info(f"Deleted collection '{self.collection_name}' from Qdrant")
             self.texts = []
             
         except Exception as e:
-            print(f"Error deleting collection: {e}")
+            logger.error(f"Error deleting collection: {e}")
             raise
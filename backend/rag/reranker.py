@@ -1,31 +1,249 @@
 from typing import List, Tuple
+from collections import OrderedDict
 import numpy as np
 from sentence_transformers import CrossEncoder
-import logging
+from config.rag_config import RagConfig
+from rag.fusion import RerankResult, get_fusion_strategy, top_k_indices
+from utils.metrics import record_cache
+from utils.logger import get_logger
+from utils.cpu_budget import cpu_budget
+import hashlib
+import threading
+import time
+
+logger = get_logger(__name__)
 
 class CrossEncoderReranker:
     """Cross-encoder based re-ranking for RAG pipeline"""
     
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-12-v2"):
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-12-v2",
+        cache_size: int = RagConfig.RERANK_CACHE_SIZE,
+        first_stage_model_name: str = None,
+        frontier_size: int = RagConfig.CASCADE_FRONTIER_SIZE,
+        model=None,
+        first_stage_model=None
+    ):
         """
         Initialize cross-encoder re-ranker
         
         Args:
             model_name: Hugging Face model name for cross-encoder
+            cache_size: Maximum number of (query, chunk) scores kept in the LRU cache (0 disables it)
+            first_stage_model_name: Small cross-encoder scoring all candidates first (None = single stage)
+            frontier_size: Number of first-stage top candidates rescored by the main model
+            model: Already loaded main model, e.g. a RemoteCrossEncoder (default: load model_name)
+            first_stage_model: Already loaded first-stage model (used together with model)
         """
         self.model_name = model_name
         self.model = None
-        self._load_model()
+        self.first_stage_model_name = first_stage_model_name
+        self.first_stage_model = None
+        self.frontier_size = frontier_size
+        
+        # LRU cache: (model, query_hash, chunk_id) -> cross-encoder score
+        self.cache_size = cache_size
+        self._score_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        if model is not None:
+            self.model = model
+            self.first_stage_model = first_stage_model
+        else:
+            self._load_model()
         
     def _load_model(self):
         """Load the cross-encoder model"""
         try:
-            print(f"Loading cross-encoder model: {self.model_name}")
+            logger.info(f"Loading cross-encoder model: {self.model_name}")
             self.model = CrossEncoder(self.model_name)
-            print("Cross-encoder model loaded successfully!")
+            logger.info("Cross-encoder model loaded successfully!")
         except Exception as e:
-            logging.error(f"Failed to load cross-encoder model: {e}")
+            logger.error(f"Failed to load cross-encoder model: {e}")
             raise e
+        
+        if self.first_stage_model_name:
+            try:
+                logger.info(f"Loading first-stage cross-encoder model: {self.first_stage_model_name}")
+                self.first_stage_model = CrossEncoder(self.first_stage_model_name)
+                logger.info("First-stage cross-encoder loaded, cascaded re-ranking enabled!")
+            except Exception as e:
+                # The cascade is an optimization: fall back to single-stage re-ranking
+                logger.warning(f"Failed to load first-stage cross-encoder, using single stage: {e}")
+                self.first_stage_model = None
+    
+    @property
+    def is_cascade(self) -> bool:
+        """Whether the two-stage cascade is active"""
+        return self.first_stage_model is not None
+    
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        """Short stable hash used for query hashes and chunk ids"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+    
+    def predict_scores(self, query: str, passages: List[str], first_stage: bool = False) -> np.ndarray:
+        """
+        Score (query, passage) pairs with the cross-encoder, reusing cached scores
+        
+        Args:
+            query: Search query
+            passages: List of passage texts to score
+            first_stage: Score with the small first-stage model instead of the main model
+            
+        Returns:
+            numpy array of cross-encoder scores aligned with passages
+        """
+        return self._score_pairs(query, passages, first_stage)[0]
+    
+    def _score_pairs(self, query: str, passages: List[str], first_stage: bool = False) -> Tuple[np.ndarray, int]:
+        """predict_scores plus the number of pairs the model actually ran on (cache misses)"""
+        model = self.first_stage_model if first_stage else self.model
+        if model is None:
+            raise RuntimeError("Cross-encoder model not loaded")
+        
+        if self.cache_size <= 0:
+            with cpu_budget.limit("rerank"):
+                return np.asarray(model.predict([[query, passage] for passage in passages])), len(passages)
+        
+        model_key = self.first_stage_model_name if first_stage else self.model_name
+        query_hash = self._hash_text(query)
+        keys = [(model_key, query_hash, self._hash_text(passage)) for passage in passages]
+        scores = np.empty(len(passages), dtype=np.float32)
+        missing = []
+        
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._score_cache:
+                    self._score_cache.move_to_end(key)
+                    scores[i] = self._score_cache[key]
+                else:
+                    missing.append(i)
+            self.cache_hits += len(passages) - len(missing)
+            self.cache_misses += len(missing)
+        record_cache("rerank_score", len(passages) - len(missing), len(missing))
+        
+        if missing:
+            # Only the uncached pairs go through the model, in one batch
+            with cpu_budget.limit("rerank"):
+                new_scores = model.predict([[query, passages[i]] for i in missing])
+            
+            with self._cache_lock:
+                for i, score in zip(missing, new_scores):
+                    scores[i] = score
+                    self._score_cache[keys[i]] = float(score)
+                    self._score_cache.move_to_end(keys[i])
+                while len(self._score_cache) > self.cache_size:
+                    self._score_cache.popitem(last=False)
+        
+        return scores, len(missing)
+    
+    def adaptive_candidate_count(
+        self,
+        original_scores: List[float],
+        top_k: int,
+        skip_gap: float = RagConfig.RERANK_SKIP_GAP,
+        prune_margin: float = RagConfig.RERANK_PRUNE_MARGIN
+    ) -> int:
+        """
+        Decide how many dense candidates are worth re-ranking
+        
+        Args:
+            original_scores: Dense retrieval scores (any order)
+            top_k: Number of passages that will be kept after re-ranking
+            skip_gap: Skip re-ranking when the gap between rank top_k and rank top_k+1 exceeds this
+            prune_margin: Drop candidates scoring more than this below the rank top_k score
+            
+        Returns:
+            0 if re-ranking can be skipped, otherwise the number of top dense candidates to re-rank
+        """
+        if len(original_scores) <= top_k:
+            return len(original_scores)
+        
+        sorted_scores = np.sort(np.asarray(original_scores, dtype=np.float32))[::-1]
+        cutoff_score = sorted_scores[top_k - 1]
+        
+        # Dense scores already separate the top_k clearly -> re-ranking would not change the selected set
+        if cutoff_score - sorted_scores[top_k] > skip_gap:
+            return 0
+        
+        # Candidates far below the cut-off are very unlikely to be promoted by the cross-encoder
+        return int(np.count_nonzero(sorted_scores >= cutoff_score - prune_margin))
+    
+    def cascade_scores(self, query: str, passages: List[str], top_k: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Two-stage scoring: the small model scores every candidate, the main model
+        rescores only the frontier around the top_k cut-off
+        
+        Args:
+            query: Search query
+            passages: List of passage texts to score
+            top_k: Number of passages that will be kept after re-ranking
+            
+        Returns:
+            tuple of (frontier_indices, main_model_scores, scored_pairs): indices and scores aligned
+            with each other, and the number of pairs both models actually ran on (cache misses)
+        """
+        frontier_size = max(self.frontier_size, top_k or 0)
+        if not self.is_cascade or len(passages) <= frontier_size:
+            scores, scored = self._score_pairs(query, passages)
+            return np.arange(len(passages)), scores, scored
+        
+        first_stage_scores, first_scored = self._score_pairs(query, passages, first_stage=True)
+        frontier = np.argsort(-first_stage_scores, kind="stable")[:frontier_size]
+        scores, scored = self._score_pairs(query, [passages[i] for i in frontier])
+        return frontier, scores, first_scored + scored
+    
+    def evaluate_cascade(self, query: str, passages: List[str], top_k: int) -> dict:
+        """
+        Compare cascaded re-ranking against main-model-only ordering (bypasses the cache)
+        
+        Args:
+            query: Search query
+            passages: List of passage texts to score
+            top_k: Number of passages kept after re-ranking
+            
+        Returns:
+            Dictionary with agreement metrics and latency of both strategies
+        """
+        if not self.is_cascade:
+            raise RuntimeError("Cascaded re-ranking is not enabled")
+        
+        pairs = [[query, passage] for passage in passages]
+        
+        start = time.perf_counter()
+        full_scores = np.asarray(self.model.predict(pairs))
+        full_latency = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        first_stage_scores = np.asarray(self.first_stage_model.predict(pairs))
+        frontier = np.argsort(-first_stage_scores, kind="stable")[:max(self.frontier_size, top_k)]
+        frontier_scores = np.asarray(self.model.predict([pairs[i] for i in frontier]))
+        cascade_latency = time.perf_counter() - start
+        
+        full_top = np.argsort(-full_scores, kind="stable")[:top_k]
+        cascade_top = frontier[np.argsort(-frontier_scores, kind="stable")][:top_k]
+        
+        return {
+            "num_candidates": len(passages),
+            "frontier_size": len(frontier),
+            "top_k": top_k,
+            "overlap_at_k": len(set(full_top.tolist()) & set(cascade_top.tolist())) / max(len(full_top), 1),
+            "exact_order_match": full_top.tolist() == cascade_top.tolist(),
+            "top1_match": bool(len(full_top) and full_top[0] == cascade_top[0]),
+            "full_latency_ms": round(full_latency * 1000, 2),
+            "cascade_latency_ms": round(cascade_latency * 1000, 2)
+        }
+    
+    def clear_cache(self):
+        """Clear the cross-encoder score cache"""
+        with self._cache_lock:
+            self._score_cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
     
     def rerank(self, query: str, passages: List[str], top_k: int = None) -> List[Tuple[str, float]]:
         """
@@ -45,25 +263,16 @@ class CrossEncoderReranker:
         if self.model is None:
             raise RuntimeError("Cross-encoder model not loaded")
         
-        print(f"Re-ranking {len(passages)} passages...")
-        
-        # Create query-passage pairs
-        pairs = [[query, passage] for passage in passages]
-        
-        # Get relevance scores
-        scores = self.model.predict(pairs)
+        logger.debug("Re-ranking %d passages...", len(passages))
         
-        # Combine passages with scores
-        passage_scores = list(zip(passages, scores))
+        # Get relevance scores (cached pairs are not re-scored)
+        scores = self.predict_scores(query, passages)
         
-        # Sort by score (descending)
-        passage_scores.sort(key=lambda x: x[1], reverse=True)
+        # Select top_k without sorting the whole candidate list
+        order = top_k_indices(scores, top_k)
+        passage_scores = [(passages[i], float(scores[i])) for i in order]
         
-        # Return top_k if specified
-        if top_k is not None:
-            passage_scores = passage_scores[:top_k]
-        
-        print(f"Re-ranking completed. Top score: {passage_scores[0][1]:.4f}")
+        logger.debug("Re-ranking completed. Top score: %.4f", passage_scores[0][1])
         
         return passage_scores
     
@@ -72,8 +281,9 @@ class CrossEncoderReranker:
         query: str, 
         passages_with_scores: List[Tuple[str, float]], 
         alpha: float = 0.7,
-        top_k: int = None
-    ) -> List[Tuple[str, float, float, float]]:
+        top_k: int = None,
+        fusion=None
+    ) -> RerankResult:
         """
         Re-rank passages combining original retrieval scores with cross-encoder scores
         
@@ -82,57 +292,56 @@ class CrossEncoderReranker:
             passages_with_scores: List of tuples (passage, original_score)
             alpha: Weight for cross-encoder score (1-alpha for original score)
             top_k: Number of top passages to return
+            fusion: Fusion strategy (default: built from RagConfig.FUSION_STRATEGY)
             
         Returns:
-            List of tuples (passage, combined_score, cross_encoder_score, original_score)
+            RerankResult with passages and combined/cross-encoder/original score arrays
         """
         if not passages_with_scores:
-            return []
+            return RerankResult([], np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
         
         passages = [item[0] for item in passages_with_scores]
-        original_scores = [item[1] for item in passages_with_scores]
-        
-        # Get cross-encoder scores
-        cross_encoder_scores = self.model.predict([[query, passage] for passage in passages])
-        
-        # Normalize scores to [0, 1] range
-        if len(cross_encoder_scores) > 1:
-            ce_min, ce_max = min(cross_encoder_scores), max(cross_encoder_scores)
-            if ce_max != ce_min:
-                cross_encoder_scores = [(score - ce_min) / (ce_max - ce_min) for score in cross_encoder_scores]
+        original_scores = np.fromiter((item[1] for item in passages_with_scores), dtype=np.float32, count=len(passages_with_scores))
         
-        orig_min, orig_max = min(original_scores), max(original_scores)
-        if orig_max != orig_min:
-            normalized_orig_scores = [(score - orig_min) / (orig_max - orig_min) for score in original_scores]
+        if self.is_cascade:
+            # Only the frontier selected by the small model competes for the final top_k
+            frontier, cross_encoder_scores, scored_pairs = self.cascade_scores(query, passages, top_k)
+            passages = [passages[i] for i in frontier]
+            original_scores = original_scores[frontier]
         else:
-            normalized_orig_scores = original_scores
+            # Get cross-encoder scores (cached pairs are not re-scored)
+            cross_encoder_scores, scored_pairs = self._score_pairs(query, passages)
         
-        # Combine scores
-        combined_results = []
-        for i, passage in enumerate(passages):
-            combined_score = alpha * cross_encoder_scores[i] + (1 - alpha) * normalized_orig_scores[i]
-            combined_results.append((
-                passage, 
-                combined_score, 
-                cross_encoder_scores[i], 
-                original_scores[i]
-            ))
+        cross_encoder_scores = np.asarray(cross_encoder_scores, dtype=np.float32)
         
-        # Sort by combined score
-        combined_results.sort(key=lambda x: x[1], reverse=True)
+        # Normalize and combine both signals in one vectorized pass
+        if fusion is None:
+            fusion = get_fusion_strategy(alpha=alpha)
+        combined_scores = fusion.fuse([cross_encoder_scores, original_scores])
         
-        # Return top_k if specified
-        if top_k is not None:
-            combined_results = combined_results[:top_k]
+        order = top_k_indices(combined_scores, top_k)
+        result = RerankResult(
+            texts=[passages[i] for i in order],
+            combined_scores=combined_scores[order],
+            cross_encoder_scores=cross_encoder_scores[order],
+            original_scores=original_scores[order],
+            scored_pairs=scored_pairs
+        )
         
-        print(f"Combined re-ranking completed. Top combined score: {combined_results[0][1]:.4f}")
+        logger.debug("Combined re-ranking completed (%s fusion). Top combined score: %.4f", fusion.name, result.combined_scores[0])
         
-        return combined_results
+        return result
     
     def get_model_info(self) -> dict:
         """Get information about the loaded model"""
         return {
             "model_name": self.model_name,
             "model_loaded": self.model is not None,
-            "model_type": "cross-encoder"
+            "model_type": "cross-encoder",
+            "first_stage_model_name": self.first_stage_model_name if self.is_cascade else None,
+            "frontier_size": self.frontier_size if self.is_cascade else None,
+            "cache_size": self.cache_size,
+            "cache_entries": len(self._score_cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
         }
\ No newline at end of file
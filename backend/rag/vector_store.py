@@ -4,22 +4,58 @@ import pickle
 import os
 from typing import List, Tuple
 from config.rag_config import RagConfig
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class FAISSVectorStore:
     """FAISS-based vector store for similarity search"""
     
-    def __init__(self):
-        """Initialize FAISS vector store"""
+    def __init__(self, index_type: str = None):
+        """
+        Initialize FAISS vector store
+        
+        Args:
+            index_type: "flat", "hnsw" or "ivf" (default: RagConfig.FAISS_INDEX_TYPE)
+        """
         self.dimension = RagConfig.VECTOR_DIMENSION
+        self.index_type = index_type or RagConfig.FAISS_INDEX_TYPE
         self.index = None
         self.texts = []  # Store original texts
         self.index_path = RagConfig.FAISS_INDEX_PATH
         
-    def create_index(self):
-        """Create a new FAISS index"""
-        # Using IndexFlatIP for cosine similarity (Inner Product)
-        self.index = faiss.IndexFlatIP(self.dimension)
-        print(f"Created new FAISS index with dimension {self.dimension}")
+    def create_index(self, num_vectors: int = None):
+        """
+        Create a new FAISS index
+        
+        Args:
+            num_vectors: Expected number of vectors (caps the IVF cluster count on small corpora)
+        """
+        # Inner product on L2-normalized vectors = cosine similarity
+        if self.index_type == "flat":
+            self.index = faiss.IndexFlatIP(self.dimension)
+        elif self.index_type == "hnsw":
+            self.index = faiss.IndexHNSWFlat(self.dimension, RagConfig.FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = RagConfig.FAISS_HNSW_EF_CONSTRUCTION
+        elif self.index_type == "ivf":
+            nlist = RagConfig.FAISS_IVF_NLIST
+            if num_vectors:
+                # FAISS wants ~39 training points per cluster
+                nlist = max(1, min(nlist, num_vectors // 39))
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            self.index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            raise ValueError(f"Unknown FAISS index type: {self.index_type}")
+        
+        self._apply_search_params()
+        logger.info(f"Created new FAISS {self.index_type} index with dimension {self.dimension}")
+    
+    def _apply_search_params(self):
+        """Set query-time parameters of approximate indexes (also needed after load_index)"""
+        if isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = RagConfig.FAISS_HNSW_EF_SEARCH
+        elif isinstance(self.index, faiss.IndexIVF):
+            self.index.nprobe = RagConfig.FAISS_IVF_NPROBE
     
     def add_embeddings(self, embeddings: np.ndarray, texts: List[str]):
         """
@@ -30,17 +66,21 @@ class FAISSVectorStore:
             texts: list of corresponding text chunks
         """
         if self.index is None:
-            self.create_index()
+            self.create_index(len(embeddings))
         
         # Convert to float32 first, then normalize
         embeddings = embeddings.astype('float32')
         faiss.normalize_L2(embeddings)
         
+        # IVF clusters are learned from the first batch
+        if not self.index.is_trained:
+            self.index.train(embeddings)
+        
         # Add to index
         self.index.add(embeddings)
         self.texts.extend(texts)
         
-        print(f"Added {len(embeddings)} embeddings to index. Total: {self.index.ntotal}")
+        logger.info(f"Added {len(embeddings)} embeddings to index. Total: {self.index.ntotal}")
     
     def search(self, query_embedding: np.ndarray, k: int = RagConfig.TOP_K_RESULTS) -> Tuple[List[str], List[float]]:
         """
@@ -63,9 +103,10 @@ class FAISSVectorStore:
         # Search
         scores, indices = self.index.search(query_embedding, k)
         
-        # Get corresponding texts
-        similar_texts = [self.texts[idx] for idx in indices[0] if idx < len(self.texts)]
-        similarity_scores = scores[0].tolist()
+        # Get corresponding texts (approximate indexes pad missing results with -1)
+        valid = [(idx, score) for idx, score in zip(indices[0], scores[0]) if 0 <= idx < len(self.texts)]
+        similar_texts = [self.texts[idx] for idx, _ in valid]
+        similarity_scores = [float(score) for _, score in valid]
         
         return similar_texts, similarity_scores
     
@@ -83,7 +124,7 @@ class FAISSVectorStore:
         with open(f"{filepath}_texts.pkl", 'wb') as f:
             pickle.dump(self.texts, f)
         
-        print(f"Index saved to {filepath}")
+        logger.info(f"Index saved to {filepath}")
     
     def load_index(self, filepath: str = None):
         """Load FAISS index and texts from disk"""
@@ -93,25 +134,27 @@ class FAISSVectorStore:
         try:
             # Load FAISS index
             self.index = faiss.read_index(f"{filepath}.index")
+            self._apply_search_params()
             
             # Load texts
             with open(f"{filepath}_texts.pkl", 'rb') as f:
                 self.texts = pickle.load(f)
             
-            print(f"Index loaded from {filepath}. Total embeddings: {self.index.ntotal}")
+            logger.info(f"Index loaded from {filepath}. Total embeddings: {self.index.ntotal}")
             return True
             
         except FileNotFoundError:
-            print(f"Index files not found at {filepath}")
+            logger.warning(f"Index files not found at {filepath}")
             return False
     
     def get_stats(self):
         """Get statistics about the vector store"""
         if self.index is None:
-            return {"total_embeddings": 0, "dimension": self.dimension}
+            return {"total_embeddings": 0, "dimension": self.dimension, "index_type": self.index_type}
         
         return {
             "total_embeddings": self.index.ntotal,
             "dimension": self.dimension,
+            "index_type": self.index_type,
             "total_texts": len(self.texts)
         }
\ No newline at end of file
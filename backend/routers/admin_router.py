@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import PlainTextResponse
+from services.UserService import UserService
+from utils.profiling import profile_store
+from services.QuotaService import quota_service
+
+app_router = APIRouter(dependencies=[Depends(UserService.get_current_admin)])
+
+@app_router.get("/profiles", status_code=status.HTTP_200_OK)
+async def list_profiles():
+    return {"profiles": profile_store.list()}
+
+@app_router.get("/profiles/{profile_id}", status_code=status.HTTP_200_OK)
+async def get_profile(profile_id: str):
+    session = profile_store.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return session.to_dict()
+
+@app_router.get("/profiles/{profile_id}/flamegraph", response_class=PlainTextResponse)
+async def get_profile_flamegraph(profile_id: str):
+    # Collapsed stacks: open in speedscope or pipe into flamegraph.pl
+    session = profile_store.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return session.collapsed_stacks()
+
+@app_router.get("/usage", status_code=status.HTTP_200_OK)
+async def list_usage(kind: str = "user", limit: int = 50):
+    # Heaviest users ("user") or client IPs ("ip") by /chat/prompt requests
+    if kind not in ("user", "ip"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="kind must be 'user' or 'ip'")
+    return {"usage": await quota_service.top_usage(kind, min(limit, 500))}
+
+@app_router.get("/usage/{kind}/{subject}", status_code=status.HTTP_200_OK)
+async def get_usage(kind: str, subject: str):
+    if kind not in ("user", "ip"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="kind must be 'user' or 'ip'")
+    return await quota_service.get_usage(f"{kind}:{subject}")
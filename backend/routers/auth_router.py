@@ -4,6 +4,9 @@ from pydantics.token import AccessToken
 from services.AuthService import AuthService
 from services.UserService import UserService
 from typing import Annotated
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 app_router = APIRouter()
 
 @app_router.post("/login", status_code=status.HTTP_200_OK)
@@ -17,7 +20,7 @@ async def login(user: UserLogin, response: Response):
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(e)
+        logger.exception(f"Unhandled error: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 @app_router.post("/register", status_code=status.HTTP_201_CREATED)
@@ -29,30 +32,37 @@ async def register(user: UserRegister):
     except HTTPException as e:  
         raise e
     except Exception as e:
-        print(e)
+        logger.exception(f"Unhandled error: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 @app_router.post("/logout", status_code=status.HTTP_200_OK)
-async def logout(response: Response, token: Annotated[str, Depends(AuthService.verify_refresh_token)]):
+async def logout(response: Response, revoked: Annotated[bool, Depends(AuthService.revoke_refresh_token)]):
     response.delete_cookie(key="access_token")
     response.delete_cookie(key="refresh_token")
     return {"message": "Logout successful"}
 
 @app_router.post("/update-password", status_code=status.HTTP_201_CREATED)
-async def update_password(payload: UserUpdatePassword, current_user: Annotated[dict, Depends(UserService.get_current_user)]):
+async def update_password(payload: UserUpdatePassword, response: Response, current_user: Annotated[dict, Depends(UserService.get_current_user)]):
     payload_dict = payload.dict()
     old_password = payload_dict['old_password']
     new_password = payload_dict['new_password']
     try:
         await AuthService.update_password(current_user,old_password,new_password)
+        # Tokens issued before the change are no longer valid: keep this session logged in
+        token = await AuthService.issue_tokens(current_user)
+        response.set_cookie(key="access_token", value=token.access_token, httponly=True)
+        response.set_cookie(key="refresh_token", value=token.refresh_token, httponly=True)
         return {"message": "Your password has been updated successfully!"}
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(e)
+        logger.exception(f"Unhandled error: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 @app_router.post("/refresh-token", status_code=status.HTTP_200_OK)
 async def get_new_access_token(response: Response, token: Annotated[AccessToken, Depends(AuthService.get_access_token)]):
     response.set_cookie(key="access_token", value = token.access_token, httponly=True)
+    if token.refresh_token:
+        response.set_cookie(key="refresh_token", value=token.refresh_token, httponly=True)
+        return {"message":  "Access token refreshed", "access_token": token.access_token, "refresh_token": token.refresh_token}
     return {"message":  "Access token refreshed", "access_token": token.access_token}
@@ -1,34 +1,106 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Request, Depends, Query
 from services.ImageService import ImageService
 from services.RagService import RagService
+from services.StartupService import startup_service
+from services.AdmissionService import admission_service, AdmissionRejectedError, PRIORITY_HIGH
+from services.QuotaService import quota_service, QuotaExceededError
+from services.UserService import UserService
+from services.ConversationService import conversation_service, parse_id
+from pydantics.chat import ConversationPage, MessagePage
+from rag.conversation_state import ConversationState
+from typing import Annotated, Optional
+from rag.llm_gateway import LLMGatewayError
+from utils.deadline import Deadline, DEADLINE_HEADER
+from utils.logger import get_logger
+from datetime import datetime
+import math
 
+logger = get_logger(__name__)
 app_router = APIRouter()
-image_service = ImageService()
-rag_service = RagService()
 
-# Kiểm tra xem có index sẵn chưa
-if not rag_service.load_existing_index():
-    print("No existing index found. Please run with --ingest first.")
+
+def get_image_service() -> ImageService:
+    """Shared ImageService loaded by StartupService (503 until ready; override in app.dependency_overrides for benchmarks)"""
+    return startup_service.require("image")
+
+
+def get_rag_service() -> RagService:
+    """Shared RagService assembled by StartupService (503 until ready; override in app.dependency_overrides for benchmarks)"""
+    return startup_service.require("rag")
+
+
+def save_turn(current_user: Optional[dict], conversation_id: Optional[str], question: Optional[str], answer: str,
+              asked_at: datetime, prediction: str = None, probability: float = None,
+              conversation: ConversationState = None) -> Optional[str]:
+    """Queue a turn in the user's chat history (background write); returns the conversation id, None for anonymous users"""
+    if current_user is None:
+        return None
+    conversation_id = conversation_id or conversation_service.new_conversation_id()
+    conversation_service.record_turn(
+        current_user["_id"], conversation_id, question, answer,
+        prediction=prediction, probability=probability, asked_at=asked_at, state=conversation
+    )
+    return conversation_id
+
 
 @app_router.post("/prompt", status_code=status.HTTP_200_OK)
 async def get_answer(
+    request: Request,
     message: str = Form(None),
-    file: UploadFile = File(None)
+    file: UploadFile = File(None),
+    image_service: ImageService = Depends(get_image_service),
+    rag_service: RagService = Depends(get_rag_service),
+    current_user: Annotated[Optional[dict], Depends(UserService.get_optional_user)] = None,
+    conversation_id: str = Form(None)
 ):
+    asked_at = datetime.utcnow()
+    client_ip = request.client.host if request.client else None
+    # Fair-queueing key for the LLM gateway: the account if logged in, else the IP
+    client_id = f"user:{current_user['_id']}" if current_user else (client_ip or "anonymous")
+    # Latency budget for the whole request, including admission and LLM queueing
+    deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
     try:
+        if conversation_id is not None:
+            try:
+                parse_id(conversation_id)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            # Turns are only ever written into the caller's own conversations
+            if current_user is not None and not await conversation_service.is_owner(current_user["_id"], conversation_id):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+
+        # Per-user / per-IP rate limit before any work is queued
+        if file or message:
+            await quota_service.consume(current_user, client_ip, kind="text" if message else "image")
+
+        # Condensed context of earlier turns (last predicted species, snakes discussed) for follow-ups
+        conversation = None
+        if current_user is not None:
+            conversation = await conversation_service.get_state(current_user["_id"], conversation_id)
+
         # Trường hợp: chỉ có file
         if file and not message:
             file_bytes = await file.read()
-            result = await image_service.detect_image(file_bytes)
+            # Priority lane: cheap image-only requests go ahead of image work of mixed requests
+            async with admission_service.admit("image", priority=PRIORITY_HIGH):
+                result = await image_service.detect_image(file_bytes)
+            if conversation is not None:
+                conversation.observe_prediction(result["predicted_class"])
             return {
                 "message": "Image processed successfully",
                 "prediction": result["predicted_class"],
-                "probability": result["probability"]
+                "probability": result["probability"],
+                "timings": result["timings"],
+                "conversation_id": save_turn(
+                    current_user, conversation_id, None, result["predicted_class"], asked_at,
+                    prediction=result["predicted_class"], probability=result["probability"], conversation=conversation
+                )
             }
 
         # Trường hợp: chỉ có message
         elif message and not file:
-            result_rag = rag_service.query(message)
+            async with admission_service.admit("text", client_id=client_id):
+                result_rag = await rag_service.aquery(message, client_id=client_id, deadline=deadline, conversation=conversation)
             if "error" in result_rag:
                 return {
                     "message": "RAG query failed",
@@ -38,14 +110,22 @@ async def get_answer(
             return {
                 "message": "RAG query successful",
                 "received_message": message,
-                "response_rag": result_rag["response"]
+                "response_rag": result_rag["response"],
+                "timings": result_rag["timings"],
+                "degradations": result_rag["degradations"],
+                "conversation_id": save_turn(current_user, conversation_id, message, result_rag["response"], asked_at, conversation=conversation)
             }
 
         # Trường hợp: có cả file và message
         elif file and message:
             file_bytes = await file.read()
-            result = await image_service.detect_image(file_bytes)
-            result_rag = rag_service.query(message)
+            async with admission_service.admit("text", client_id=client_id):
+                async with admission_service.admit("image"):
+                    result = await image_service.detect_image(file_bytes)
+                if conversation is not None:
+                    # "Con này có độc không?": the question is about the uploaded snake
+                    conversation.observe_prediction(result["predicted_class"])
+                result_rag = await rag_service.aquery(message, client_id=client_id, deadline=deadline, conversation=conversation)
 
             if "error" in result_rag:
                 return {
@@ -61,7 +141,13 @@ async def get_answer(
                 "received_message": message,
                 "response_rag": result_rag["response"],
                 "prediction": result["predicted_class"],
-                "probability": result["probability"]
+                "probability": result["probability"],
+                "timings": {**result["timings"], **result_rag["timings"]},
+                "degradations": result_rag["degradations"],
+                "conversation_id": save_turn(
+                    current_user, conversation_id, message, result_rag["response"], asked_at,
+                    prediction=result["predicted_class"], probability=result["probability"], conversation=conversation
+                )
             }
 
         # Trường hợp không có gì
@@ -71,14 +157,74 @@ async def get_answer(
                 detail="You must provide either a file or a message."
             )
 
+    except HTTPException as e:
+        raise e
+    except QuotaExceededError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except AdmissionRejectedError as e:
+        # Shed early: 503 when a stage is saturated, 429 when this client has too many requests in flight
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except LLMGatewayError as e:
+        # Rate-limited / queue full / LLM down: tell the client when to retry instead of answering with an error text
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after or 1))}
+        )
     except Exception as e:
-        print("Error:", e)
+        logger.exception(f"Unhandled error in /chat/prompt: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
 
+@app_router.get("/conversations", response_model=ConversationPage, status_code=status.HTTP_200_OK)
+async def list_conversations(
+    current_user: Annotated[dict, Depends(UserService.get_current_user)],
+    limit: int = Query(None, ge=1, le=100),
+    cursor: str = None
+):
+    # Summaries only (title, count, preview of the last answer); pass next_cursor back for the next page
+    try:
+        return await conversation_service.list_conversations(current_user["_id"], limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app_router.get("/conversations/{conversation_id}/messages", response_model=MessagePage, status_code=status.HTTP_200_OK)
+async def list_messages(
+    conversation_id: str,
+    current_user: Annotated[dict, Depends(UserService.get_current_user)],
+    limit: int = Query(None, ge=1, le=100),
+    cursor: str = None
+):
+    # Newest page first; next_cursor pages back to older messages
+    try:
+        return await conversation_service.list_messages(current_user["_id"], conversation_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app_router.delete("/conversations/{conversation_id}", status_code=status.HTTP_200_OK)
+async def delete_conversation(conversation_id: str, current_user: Annotated[dict, Depends(UserService.get_current_user)]):
+    try:
+        deleted = await conversation_service.delete_conversation(current_user["_id"], conversation_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    return {"message": "Conversation deleted"}
+
+
 
 
 
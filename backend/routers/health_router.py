@@ -0,0 +1,21 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from services.StartupService import startup_service
+from services.SchemaService import schema_service
+
+app_router = APIRouter()
+
+@app_router.get("/live", status_code=status.HTTP_200_OK)
+async def liveness():
+    # The process is up and the event loop responds
+    return {"status": "alive"}
+
+@app_router.get("/ready")
+async def readiness():
+    report = startup_service.report()
+    # Informational: the app serves requests without its indexes, just slower
+    report["schema"] = schema_service.report()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if report["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=report
+    )
@@ -1,6 +1,7 @@
 from pydantics.user import UserBase  
 from fastapi import APIRouter, HTTPException, Depends, status
 from services.UserService import UserService
+from services.QuotaService import quota_service
 from typing import Annotated  
 from pydantics.user import UserBase
 
@@ -14,4 +15,9 @@ async def get_users_me(current_user: Annotated[dict, Depends(UserService.get_cur
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
+
+@app_router.get("/usage", status_code=status.HTTP_200_OK)
+async def get_my_usage(current_user: Annotated[dict, Depends(UserService.get_current_user)]):
+    # Chat usage and remaining rate-limit tokens of the logged-in user
+    return await quota_service.get_usage(f"user:{current_user['_id']}")
@@ -0,0 +1,209 @@
+"""
+Preload-and-fork server
+
+Loads ConvNeXt, E5, the cross-encoder and the vector index once in the master process,
+then forks workers that share the weights copy-on-write. Each worker runs its own
+uvicorn server on the shared listening socket.
+
+Usage (from backend/):
+    python serve.py --workers 4 --port 8000
+"""
+import os
+
+# Must be set before tokenizers/torch are imported: HF tokenizers' thread pool is not
+# fork-safe, and OpenMP reads its thread count once
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import argparse
+import gc
+import signal
+import socket
+import threading
+import time
+import psutil
+
+from utils.logger import get_logger
+from utils.cpu_budget import cpu_budget, available_cpus, blas_env
+
+logger = get_logger("serve")
+
+
+def memory_report(pids: list) -> list:
+    """RSS, PSS and USS per process; PSS/USS show how much is really shared (Linux only)"""
+    report = []
+    for pid in pids:
+        try:
+            process = psutil.Process(pid)
+            info = process.memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        report.append({
+            "pid": pid,
+            "rss_mb": round(info.rss / 2**20, 1),
+            "pss_mb": round(getattr(info, "pss", 0) / 2**20, 1),
+            "uss_mb": round(getattr(info, "uss", 0) / 2**20, 1)
+        })
+    return report
+
+
+def run_worker(sock: socket.socket, args, threads_per_worker: int):
+    """Worker process body: own thread pools and clients, shared weights"""
+    import uvicorn
+    from services.StartupService import startup_service
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # Each worker owns its share of the CPUs; the per-model budgets split that share
+    cpu_budget.configure(cpus=threads_per_worker)
+    cpu_budget.apply_process(intra_op=threads_per_worker)
+    startup_service.after_fork()
+
+    # Imported after fork so the Mongo client and its monitor threads belong to this worker
+    from main import app
+
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    """Preloads the models, forks the workers and replaces workers that die"""
+
+    def __init__(self, args):
+        self.args = args
+        # pid -> start time (time.monotonic())
+        self.workers = {}
+        self.stopping = False
+        self.stopped = threading.Event()
+        # Workers in a row that died within --min-uptime of starting
+        self.rapid_failures = 0
+        # cgroup/affinity aware, so a container limited to 4 CPUs does not get 4 x host-cores threads
+        self.threads_per_worker = args.threads_per_worker or max(1, available_cpus() // args.workers)
+
+    def preload(self):
+        for name, value in blas_env(self.threads_per_worker).items():
+            os.environ.setdefault(name, value)
+        import torch
+        from services.StartupService import startup_service
+
+        # Single-threaded while loading so no OpenMP pool exists at fork time
+        torch.set_num_threads(1)
+        start = time.perf_counter()
+        startup_service.preload()
+        logger.info(f"Preloaded components in {time.perf_counter() - start:.1f}s", extra={"components": startup_service.report()["components"]})
+
+        # Move everything loaded so far out of the GC's reach: collections in the workers
+        # would otherwise write to these objects' headers and un-share their pages
+        gc.collect()
+        gc.freeze()
+
+    def bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.args.host, self.args.port))
+        sock.listen(self.args.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn(self, sock: socket.socket):
+        pid = os.fork()
+        if pid == 0:
+            # Non-zero if the worker crashed, so the master's log shows it
+            code = 1
+            try:
+                run_worker(sock, self.args, self.threads_per_worker)
+                code = 0
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def stop(self, *_):
+        self.stopping = True
+        self.stopped.set()
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report_memory(self):
+        while not self.stopping:
+            time.sleep(self.args.memory_report_interval)
+            workers = memory_report(list(self.workers))
+            master = memory_report([os.getpid()])
+            logger.info(
+                f"Worker memory: total PSS {sum(worker['pss_mb'] for worker in workers):.0f} MB for {len(workers)} workers",
+                extra={"master": master, "workers": workers}
+            )
+
+    def run(self):
+        self.preload()
+        sock = self.bind()
+        logger.info(f"Listening on {self.args.host}:{self.args.port} with {self.args.workers} workers x {self.threads_per_worker} torch threads")
+
+        for _ in range(self.args.workers):
+            self.spawn(sock)
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if self.args.memory_report_interval > 0:
+            threading.Thread(target=self.report_memory, name="memory-report", daemon=True).start()
+
+        exit_code = 0
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started_at = self.workers.pop(pid, None)
+            if self.stopping or started_at is None:
+                continue
+            uptime = time.monotonic() - started_at
+            if uptime >= self.args.min_uptime:
+                self.rapid_failures = 0
+                logger.error(f"Worker {pid} exited with status {status} after {uptime:.0f}s, restarting")
+                self.spawn(sock)
+                continue
+
+            # Died during startup (bad config, database down, out of memory): respawning at once
+            # would fork, preload and crash in a tight loop
+            self.rapid_failures += 1
+            if self.rapid_failures > self.args.max_rapid_restarts:
+                logger.critical(f"Worker {pid} exited with status {status} after {uptime:.1f}s; {self.rapid_failures} rapid failures in a row, giving up")
+                self.stop()
+                exit_code = 1
+                continue
+            delay = min(self.args.restart_backoff_max, self.args.restart_backoff * 2 ** (self.rapid_failures - 1))
+            logger.error(f"Worker {pid} exited with status {status} after {uptime:.1f}s, restarting in {delay:.1f}s ({self.rapid_failures}/{self.args.max_rapid_restarts})")
+            if not self.stopped.wait(delay):
+                self.spawn(sock)
+        logger.info("All workers stopped")
+        return exit_code
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Preload models once and fork uvicorn workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="torch threads per worker (default: available CPUs / workers)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--min-uptime", type=float, default=10, help="A worker dying sooner than this after its start counts as a rapid failure")
+    parser.add_argument("--restart-backoff", type=float, default=1, help="Seconds before respawning after the first rapid failure (doubles each time)")
+    parser.add_argument("--restart-backoff-max", type=float, default=60)
+    parser.add_argument("--max-rapid-restarts", type=int, default=5, help="Stop the server after this many rapid failures in a row")
+    parser.add_argument("--memory-report-interval", type=float, default=60, help="Seconds between per-worker RSS/PSS logs (0 = off)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from config.rag_config import RagConfig
+    if RagConfig.USE_INFERENCE_WORKERS:
+        # Pools started in the master would be shared by every forked worker's pipes
+        raise SystemExit("serve.py preloads models in-process; disable USE_INFERENCE_WORKERS or run uvicorn directly")
+    raise SystemExit(Master(parse_args()).run())
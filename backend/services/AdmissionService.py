@@ -0,0 +1,181 @@
+from contextlib import asynccontextmanager
+from collections import Counter
+from config.rag_config import RagConfig
+from utils.metrics import QUEUE_DEPTH, QUEUE_WAIT, ADMISSION_IN_FLIGHT, ADMISSION_REJECTIONS
+from utils.logger import get_logger
+from typing import Dict, Any
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+logger = get_logger(__name__)
+
+# Lower value = served first when a stage has waiters
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class AdmissionRejectedError(Exception):
+    """The request was shed instead of queued (stage queue full, wait too long or per-client limit)"""
+
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """
+    Concurrency limit with a bounded priority wait queue for one pipeline stage
+
+    A finished request hands its slot directly to the highest-priority waiter (FIFO
+    within a priority), so a lane of cheap requests can overtake queued expensive ones.
+    Runs on the event loop; not thread-safe.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait: float, max_per_client: int = None):
+        """
+        Args:
+            name: Stage name (metrics label)
+            max_concurrency: Requests allowed in the stage at once
+            max_queue: Waiting requests beyond this are rejected immediately (503)
+            max_wait: Seconds a request may wait for a slot before it is rejected (503)
+            max_per_client: Requests one client may have admitted or waiting (429), None = unlimited
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_per_client = max_per_client
+        self.in_flight = 0
+        self.waiting = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._per_client = Counter()
+        self._service_time = None  # EWMA of seconds a request holds a slot
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained (at least 1)"""
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil(service_time * (self.waiting + 1) / self.max_concurrency))
+
+    def _reject(self, reason: str, status_code: int, message: str):
+        ADMISSION_REJECTIONS.labels(stage=self.name, reason=reason).inc()
+        raise AdmissionRejectedError(message, status_code, self.retry_after())
+
+    async def _acquire(self, priority: int):
+        if self.in_flight < self.max_concurrency and self.waiting == 0:
+            self.in_flight += 1
+            return
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full", 503, f"Server busy: '{self.name}' queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.waiting += 1
+        QUEUE_DEPTH.labels(queue=f"admission_{self.name}").inc()
+        wait_start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over while we were giving up: pass it on
+                self._release()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", 503, f"Server busy: waited {self.max_wait}s for '{self.name}'")
+            raise
+        finally:
+            self.waiting -= 1
+            QUEUE_DEPTH.labels(queue=f"admission_{self.name}").dec()
+            QUEUE_WAIT.labels(queue=f"admission_{self.name}").observe(time.monotonic() - wait_start)
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # Waiters that timed out or were cancelled stay in the heap until popped here
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_NORMAL, client_id: str = None):
+        """
+        Hold a slot of this stage for the duration of the block
+
+        Args:
+            priority: PRIORITY_HIGH or PRIORITY_NORMAL
+            client_id: Client key for the per-client limit
+
+        Raises:
+            AdmissionRejectedError: The request was shed (status_code 503 or 429)
+        """
+        if self.max_per_client and client_id is not None:
+            if self._per_client[client_id] >= self.max_per_client:
+                self._reject("client_limit", 429, f"Too many concurrent requests for '{self.name}'")
+            self._per_client[client_id] += 1
+        try:
+            await self._acquire(priority)
+            ADMISSION_IN_FLIGHT.labels(stage=self.name).set(self.in_flight)
+            start = time.monotonic()
+            try:
+                yield
+            finally:
+                elapsed = time.monotonic() - start
+                self._service_time = elapsed if self._service_time is None else 0.8 * self._service_time + 0.2 * elapsed
+                self._release()
+                ADMISSION_IN_FLIGHT.labels(stage=self.name).set(self.in_flight)
+        finally:
+            if self.max_per_client and client_id is not None:
+                self._per_client[client_id] -= 1
+                if self._per_client[client_id] <= 0:
+                    del self._per_client[client_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_service_seconds": round(self._service_time, 3) if self._service_time is not None else None
+        }
+
+
+class AdmissionService:
+    """
+    Admission control for /chat/prompt
+
+    Stages:
+        image: ConvNeXt classification (image-only requests get PRIORITY_HIGH)
+        text: whole RAG requests including the wait for the LLM, with a per-client limit
+        retrieval: CPU-bound embed/search/rerank inside a text request
+
+    Image-only requests never wait behind the text lane, which is bounded by the slow,
+    rate-limited LLM.
+    """
+
+    def __init__(self):
+        self.stages = {
+            "image": StageLimiter(
+                "image", RagConfig.ADMISSION_IMAGE_CONCURRENCY, RagConfig.ADMISSION_IMAGE_QUEUE, RagConfig.ADMISSION_MAX_WAIT
+            ),
+            "text": StageLimiter(
+                "text", RagConfig.ADMISSION_TEXT_CONCURRENCY, RagConfig.ADMISSION_TEXT_QUEUE, RagConfig.ADMISSION_MAX_WAIT,
+                max_per_client=RagConfig.ADMISSION_MAX_PER_CLIENT
+            ),
+            "retrieval": StageLimiter(
+                "retrieval", RagConfig.ADMISSION_RETRIEVAL_CONCURRENCY, RagConfig.ADMISSION_RETRIEVAL_QUEUE, RagConfig.ADMISSION_MAX_WAIT
+            ),
+        }
+
+    def admit(self, stage: str, priority: int = PRIORITY_NORMAL, client_id: str = None):
+        """Async context manager holding a slot of one stage (see StageLimiter.admit)"""
+        return self.stages[stage].admit(priority, client_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: limiter.get_stats() for name, limiter in self.stages.items()}
+
+
+admission_service = AdmissionService()
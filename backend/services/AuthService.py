@@ -2,12 +2,15 @@ from fastapi.security import OAuth2PasswordBearer, APIKeyCookie
 from fastapi import HTTPException, status, Depends
 from datetime import timedelta,datetime
 from utils.AuthUtlis import AuthUtils
+from services.UserService import UserService
+from services.RefreshTokenService import refresh_token_service
 from pydantics.token import Token, AccessToken
 from config.database import db
 from dotenv import load_dotenv
-from typing import Annotated
+from typing import Annotated, Optional
 import os
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+from pymongo.errors import DuplicateKeyError
 
 load_dotenv()
 api_key_cookie = APIKeyCookie(name="refresh_token", auto_error=False)
@@ -16,24 +19,27 @@ class AuthService:
     async def get_token(email: str, password: str) -> Token:
         user = await db["users"].find_one({"email": email})
 
-        if user is None or not AuthUtils.verify_password(password, user['password']):
+        valid, new_hash = await AuthUtils.averify_and_update(password, user['password'] if user else None)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Email or Passowrd is not matching",
                 headers={"WWW-Authenticate": "Bearer"}
             )
-        
+        if new_hash is not None:
+            # Stored hash used an older work factor: upgrade it now that we know the password
+            await db["users"].update_one({"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+
+        return await AuthService.issue_tokens(user)
+    async def issue_tokens(user: dict) -> Token:
+        """New access/refresh token pair for an authenticated user (refresh token is stored)"""
+        claims = AuthUtils.user_claims(user)
         access_token_expires = int(os.getenv("ACCESS_TOKEN_EXPIRE_SECOND"))  
-        access_token = AuthUtils.create_token(data={"email": user['email']}, expires_delta=access_token_expires)
+        access_token = AuthUtils.create_token(data=claims, expires_delta=access_token_expires)
         refresh_token_expires = int(os.getenv("REFRESH_TOKEN_EXPIRE_SECOND"))  
-        refresh_token = AuthUtils.create_token(data={"email": user['email']}, expires_delta=refresh_token_expires)
-        result = await db["refresh_token"].insert_one({"user_id": user["_id"], "token": refresh_token, "create_at": datetime.utcnow(), "expires_at": datetime.utcnow() + timedelta(days=7)})
-
-        if not result.inserted_id:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail = "Unable to complete login. Please try again later."
-            )  
+        # Only a hash of the jti is stored, not the token
+        jti, _ = await refresh_token_service.issue(user["_id"], refresh_token_expires)
+        refresh_token = AuthUtils.create_token(data={**claims, "jti": jti}, expires_delta=refresh_token_expires)
 
         return Token(access_token=access_token,refresh_token=refresh_token)
     async def get_access_token(refresh_token: Annotated[str, Depends(api_key_cookie)]) -> AccessToken:
@@ -61,79 +67,85 @@ class AuthService:
         except (InvalidTokenError, Exception):
             raise credentials_exception
             
-        email = payload.get("email")
-        
-        if email is None:
-            raise credentials_exception
-        
-        user = await db["users"].find_one({"email": email})
+        legacy = payload.get("jti") is None
+        if legacy:
+            # Issued before refresh tokens had a jti: accepted once through the old stored token, then rotated
+            valid = await refresh_token_service.revoke_legacy(refresh_token)
+        else:
+            # Logged out, rotated or revoked for the user: usually answered by the in-memory filter
+            valid = await refresh_token_service.is_valid(payload)
+        if not valid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token has been revoked. Please login again.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        # Also rejects refresh tokens issued before a password change
+        user = await UserService.user_from_payload(payload)
 
         if user is None:
             raise credentials_exception
+
+        if legacy or refresh_token_service.should_rotate(payload):
+            # Close to expiry: replace the refresh token so an active session does not end
+            token = await AuthService.issue_tokens(user)
+            if not legacy:
+                await refresh_token_service.revoke(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+            return AccessToken(access_token=token.access_token, refresh_token=token.refresh_token)
     
         access_token_expires = int(os.getenv("ACCESS_TOKEN_EXPIRE_SECOND"))  
-        access_token = AuthUtils.create_token(data={"email": user['email']}, expires_delta=access_token_expires)
+        access_token = AuthUtils.create_token(data=AuthUtils.user_claims(user), expires_delta=access_token_expires)
         return AccessToken(access_token=access_token)
     async def register_user(email: str, password: str):
-        existing_user = await db["users"].find_one({"email": email})
-
-        if existing_user:
+        hashed_password = await AuthUtils.ahash_password(password)
+        try:
+            # The unique email index (SchemaService) rejects duplicates: one round trip, no race
+            result = await db["users"].insert_one({"email": email, "password": hashed_password, "role": "user", "create_at": datetime.utcnow(), "update_at": datetime.utcnow()})
+        except DuplicateKeyError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
-            
-        hashed_password = AuthUtils.hash_password(password)
-        result = await db["users"].insert_one({"email": email, "password": hashed_password, "role": "user", "create_at": datetime.utcnow(), "update_at": datetime.utcnow()})
         return result.inserted_id
-    async def verify_refresh_token(refresh_token: Annotated[str, Depends(api_key_cookie)]) -> str:
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        
+    async def revoke_refresh_token(refresh_token: Annotated[Optional[str], Depends(api_key_cookie)]) -> bool:
+        """
+        Revoke the refresh token of the session being logged out
+
+        Never raises: logout clears the cookies even for missing, expired or invalid tokens.
+
+        Returns:
+            True if a stored token was revoked
+        """
         if not refresh_token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Refresh token is missing",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
+            return False
         try:
             payload = AuthUtils.verify_token(refresh_token)
-        except ExpiredSignatureError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Refresh token has expired. Please login again.",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
         except (InvalidTokenError, Exception):
-            raise credentials_exception
-            
-        email = payload.get("email")
-        
-        if email is None:
-            raise credentials_exception
-
-        result = await db["refresh_token"].delete_many({"token": refresh_token})
+            # Expired or not ours: it cannot be used to refresh anyway
+            return False
 
-        if result.deleted_count == 0:
-            raise credentials_exception
-            
-        return refresh_token
+        if payload.get("jti") is None:
+            # Issued before refresh tokens had a jti
+            return await refresh_token_service.revoke_legacy(refresh_token)
+        return await refresh_token_service.revoke(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
     async def update_password(current_user: dict, old_password: str, new_password: str):
+        # The cached user record has no password hash
+        stored = await db["users"].find_one({"_id": current_user["_id"]}, {"password": 1})
 
-        if not AuthUtils.verify_password(old_password, current_user['password']):
+        if stored is None or not await AuthUtils.averify_password(old_password, stored['password']):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Update password is fail",
             )
         
-        hashed_new_password = AuthUtils.hash_password(new_password)
+        hashed_new_password = await AuthUtils.ahash_password(new_password)
+        # Tokens issued before password_changed_at stop working (see UserService.is_token_current)
         result = await db["users"].update_one(
-            {"email": current_user['email']},
-            {"$set": {"password": hashed_new_password}}
+            {"_id": current_user['_id']},
+            {"$set": {"password": hashed_new_password, "password_changed_at": datetime.utcnow(), "update_at": datetime.utcnow()}}
         )
+        UserService.invalidate_user(current_user["_id"])
+        await refresh_token_service.revoke_user(current_user["_id"], int(os.getenv("REFRESH_TOKEN_EXPIRE_SECOND")))
         return result.modified_count
     
\ No newline at end of file
@@ -0,0 +1,377 @@
+from config.database import db
+from config.rag_config import RagConfig
+from utils.logger import get_logger
+from rag.conversation_state import ConversationState
+from cachetools import TTLCache
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import base64
+
+logger = get_logger(__name__)
+
+CONVERSATION_COLLECTION = "conversations"
+MESSAGE_COLLECTION = "messages"
+DUPLICATE_KEY = 11000
+TITLE_CHARS = 60
+
+CONVERSATION_LIST_PROJECTION = {"title": 1, "message_count": 1, "last_message_preview": 1, "create_at": 1, "updated_at": 1}
+MESSAGE_PROJECTION = {"role": 1, "content": 1, "prediction": 1, "probability": 1, "create_at": 1}
+
+
+def now_ms() -> datetime:
+    """Current UTC time truncated to MongoDB's millisecond precision, so cursors compare exactly"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def encode_cursor(timestamp: datetime, document_id: ObjectId) -> str:
+    millis = int(timestamp.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return base64.urlsafe_b64encode(f"{millis}:{document_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for a malformed cursor"""
+    try:
+        millis, document_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        timestamp = datetime.fromtimestamp(int(millis) / 1000, timezone.utc).replace(tzinfo=None)
+        return timestamp, ObjectId(document_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_id(value: str) -> ObjectId:
+    """Raises ValueError for a malformed id"""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError) as e:
+        raise ValueError(f"Invalid conversation id: {value}") from e
+
+
+def before_cursor(field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Filter for documents strictly after `cursor` in (field desc, _id desc) order"""
+    if not cursor:
+        return {}
+    timestamp, document_id = decode_cursor(cursor)
+    return {"$or": [{field: {"$lt": timestamp}}, {field: timestamp, "_id": {"$lt": document_id}}]}
+
+
+class ConversationService:
+    """
+    Chat history: conversations (one summary document each) and append-only messages
+
+    Turns are buffered in memory and written by a background task with one insert_many
+    for the messages and one upsert per touched conversation, every
+    CHAT_HISTORY_FLUSH_INTERVAL seconds or as soon as CHAT_HISTORY_BATCH_SIZE operations
+    are pending, so /chat/prompt never waits for MongoDB. Ids are generated client-side,
+    so a new conversation's id is known before it is written. Reads of a user with
+    unwritten turns flush first (read-your-writes).
+
+    Pagination is keyset-based on (timestamp, _id), newest first, served by the
+    (user_id, updated_at) and (user_id, conversation_id, create_at) indexes.
+    """
+
+    def __init__(self):
+        self._messages: List[Dict[str, Any]] = []
+        self._conversations: Dict[ObjectId, Dict[str, Any]] = {}
+        self._pending_users = set()
+        # Condensed state per conversation (owner, state): no database read on most turns
+        self._states = TTLCache(maxsize=RagConfig.CONVERSATION_STATE_CACHE_SIZE, ttl=RagConfig.CONVERSATION_STATE_TTL)
+        # Owner per conversation id, so continuing a conversation rarely needs the ownership read
+        self._owners = TTLCache(maxsize=RagConfig.CONVERSATION_STATE_CACHE_SIZE, ttl=RagConfig.CONVERSATION_STATE_TTL)
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher = None
+
+    def new_conversation_id(self) -> str:
+        return str(ObjectId())
+
+    async def is_owner(self, user_id: ObjectId, conversation_id: str) -> bool:
+        """
+        Whether a client-supplied conversation id is one of the user's conversations (written or buffered)
+
+        Checked before a turn is recorded under that id, so messages are never written into
+        another user's conversation. Raises ValueError for a malformed id.
+        """
+        conversation = parse_id(conversation_id)
+        owner = self._owners.get(conversation)
+        if owner is None:
+            pending = self._conversations.get(conversation)
+            if pending is not None:
+                owner = pending["user_id"]
+            else:
+                document = await db[CONVERSATION_COLLECTION].find_one({"_id": conversation}, {"user_id": 1})
+                if document is None:
+                    return False
+                owner = document["user_id"]
+            self._owners[conversation] = owner
+        return owner == user_id
+
+    async def get_state(self, user_id: ObjectId, conversation_id: Optional[str]) -> ConversationState:
+        """
+        Condensed state of a conversation, from the cache or (once) from its document
+
+        Args:
+            user_id: Owner's _id
+            conversation_id: Conversation id, None for a new conversation
+
+        Returns:
+            A working copy of the state for this request (of an empty state for new
+            conversations or other users' ids); record_turn merges it back
+        """
+        if conversation_id is None:
+            return ConversationState().copy()
+        cached = self._states.get(conversation_id)
+        if cached is not None:
+            owner, state = cached
+            return state.copy() if owner == user_id else ConversationState().copy()
+        conversation = parse_id(conversation_id)
+        pending = self._conversations.get(conversation)
+        if pending is not None and pending["user_id"] == user_id and pending.get("state") is not None:
+            state = ConversationState.from_dict(pending["state"])
+        else:
+            try:
+                document = await db[CONVERSATION_COLLECTION].find_one({"_id": conversation, "user_id": user_id}, {"state": 1})
+            except Exception as e:
+                # Answer without the conversation context rather than fail the request
+                logger.warning(f"Could not load conversation state {conversation_id}: {e}")
+                return ConversationState().copy()
+            state = ConversationState.from_dict(document.get("state") if document else None)
+        # A concurrent request may have loaded (and already updated) it while this one waited
+        cached = self._states.get(conversation_id)
+        if cached is not None and cached[0] == user_id:
+            return cached[1].copy()
+        self._states[conversation_id] = (user_id, state)
+        return state.copy()
+
+    def record_turn(self, user_id: ObjectId, conversation_id: str, question: Optional[str], answer: str,
+                    prediction: str = None, probability: float = None, asked_at: datetime = None,
+                    state: ConversationState = None):
+        """
+        Queue one question/answer pair for writing (returns immediately)
+
+        Args:
+            user_id: Owner's _id
+            conversation_id: New conversation id (new_conversation_id) or one of the user's (is_owner)
+            question: The user's message ("" for image-only requests)
+            answer: The assistant's answer
+            prediction: Snake class predicted from the uploaded image, if any
+            probability: Probability of the prediction
+            asked_at: When the question arrived (default: now)
+            state: This request's working copy of the conversation state (get_state); its changes are
+                merged into the shared state, which is cached and stored with the conversation
+        """
+        conversation = parse_id(conversation_id)
+        answered_at = now_ms()
+        asked_at = asked_at.replace(microsecond=asked_at.microsecond // 1000 * 1000) if asked_at else answered_at
+        image = {"prediction": prediction, "probability": probability} if prediction is not None else {}
+        # ObjectIds are created in order, so they break timestamp ties between the two messages
+        self._messages.append({"_id": ObjectId(), "conversation_id": conversation, "user_id": user_id, "role": "user", "content": question or "", **image, "create_at": asked_at})
+        self._messages.append({"_id": ObjectId(), "conversation_id": conversation, "user_id": user_id, "role": "assistant", "content": answer, "create_at": answered_at})
+
+        pending = self._conversations.get(conversation)
+        if pending is None:
+            title = (question or "").strip()[:TITLE_CHARS] or (f"Ảnh: {prediction}" if prediction else "Cuộc trò chuyện mới")
+            pending = self._conversations[conversation] = {"user_id": user_id, "title": title, "create_at": asked_at, "count": 0}
+        pending["count"] += 2
+        self._owners[conversation] = user_id
+        pending["updated_at"] = answered_at
+        pending["preview"] = answer[:RagConfig.CHAT_HISTORY_PREVIEW_CHARS]
+        if state is not None:
+            # No await between here and the merge: concurrent turns of a conversation are applied one after the other
+            cached = self._states.get(conversation_id)
+            shared = state.merge_into(cached[1] if cached is not None and cached[0] == user_id else None)
+            pending["state"] = shared.to_dict()
+            self._states[conversation_id] = (user_id, shared)
+        self._pending_users.add(user_id)
+
+        if len(self._messages) > RagConfig.CHAT_HISTORY_MAX_PENDING:
+            dropped = len(self._messages) - RagConfig.CHAT_HISTORY_MAX_PENDING
+            self._drop_oldest(dropped)
+            logger.warning(f"Chat history buffer full: dropped {dropped} unwritten messages")
+        if len(self._messages) + len(self._conversations) >= RagConfig.CHAT_HISTORY_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _drop_oldest(self, count: int):
+        """Drop the oldest unwritten messages and take them out of their conversation's message_count"""
+        for message in self._messages[:count]:
+            pending = self._conversations.get(message["conversation_id"])
+            if pending is None:
+                continue
+            pending["count"] -= 1
+            if pending["count"] <= 0:
+                # Nothing of this conversation is left to write
+                del self._conversations[message["conversation_id"]]
+        del self._messages[:count]
+
+    async def flush(self):
+        """Write buffered messages and conversation updates in bulk"""
+        async with self._flush_lock:
+            messages, conversations = self._messages, self._conversations
+            if not messages and not conversations:
+                return
+            self._messages, self._conversations, self._pending_users = [], {}, set()
+
+            try:
+                if messages:
+                    try:
+                        await db[MESSAGE_COLLECTION].insert_many(messages, ordered=False)
+                    except BulkWriteError as e:
+                        # Messages written by an earlier, partly failed flush are duplicates: fine
+                        if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                            raise
+                    messages = []
+                operations = [
+                    UpdateOne(
+                        {"_id": conversation_id, "user_id": pending["user_id"]},
+                        {
+                            "$setOnInsert": {"title": pending["title"], "create_at": pending["create_at"]},
+                            "$set": {
+                                "updated_at": pending["updated_at"],
+                                "last_message_preview": pending["preview"],
+                                **({"state": pending["state"]} if pending.get("state") is not None else {})
+                            },
+                            "$inc": {"message_count": pending["count"]}
+                        },
+                        upsert=True
+                    )
+                    for conversation_id, pending in conversations.items()
+                ]
+                if operations:
+                    try:
+                        await db[CONVERSATION_COLLECTION].bulk_write(operations, ordered=False)
+                    except BulkWriteError as e:
+                        # Duplicate key: the id belongs to another user's conversation (the router's is_owner check
+                        # makes this a race between two users only); the upsert is dropped. Only other failures are retried.
+                        ids = list(conversations)
+                        failed = {ids[error["index"]] for error in e.details.get("writeErrors", []) if error["code"] != DUPLICATE_KEY}
+                        conversations = {conversation_id: conversations[conversation_id] for conversation_id in failed}
+                        if conversations:
+                            raise
+            except Exception as e:
+                logger.warning(f"Chat history flush failed, retrying next interval: {e}")
+                self._requeue(messages, conversations)
+
+    def _requeue(self, messages: List[Dict[str, Any]], conversations: Dict[ObjectId, Dict[str, Any]]):
+        self._messages[:0] = messages
+        for conversation_id, pending in conversations.items():
+            newer = self._conversations.get(conversation_id)
+            if newer is not None:
+                pending["count"] += newer["count"]
+                pending.update({"updated_at": newer["updated_at"], "preview": newer["preview"], "state": newer.get("state") or pending.get("state")})
+            self._conversations[conversation_id] = pending
+            self._pending_users.add(pending["user_id"])
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=RagConfig.CHAT_HISTORY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """Start the background writer (call from the app lifespan)"""
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background writer and write what is buffered"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    async def _read_your_writes(self, user_id: ObjectId):
+        if user_id in self._pending_users:
+            await self.flush()
+
+    async def list_conversations(self, user_id: ObjectId, limit: int = None, cursor: str = None) -> Dict[str, Any]:
+        """
+        One page of a user's conversations, most recently updated first (no messages loaded)
+
+        Args:
+            user_id: Owner's _id
+            limit: Page size (default CHAT_HISTORY_PAGE_SIZE, at most 100)
+            cursor: next_cursor of the previous page
+
+        Returns:
+            dict with "conversations" and "next_cursor" (None on the last page)
+        """
+        limit = min(limit or RagConfig.CHAT_HISTORY_PAGE_SIZE, 100)
+        await self._read_your_writes(user_id)
+        query = {"user_id": user_id, **before_cursor("updated_at", cursor)}
+        documents = await db[CONVERSATION_COLLECTION].find(query, CONVERSATION_LIST_PROJECTION) \
+            .sort([("updated_at", -1), ("_id", -1)]).limit(limit + 1).to_list(limit + 1)
+
+        next_cursor = encode_cursor(documents[limit - 1]["updated_at"], documents[limit - 1]["_id"]) if len(documents) > limit else None
+        return {
+            "conversations": [
+                {
+                    "id": str(document["_id"]),
+                    "title": document.get("title", ""),
+                    "message_count": document.get("message_count", 0),
+                    "last_message_preview": document.get("last_message_preview"),
+                    "create_at": document["create_at"],
+                    "updated_at": document["updated_at"]
+                }
+                for document in documents[:limit]
+            ],
+            "next_cursor": next_cursor
+        }
+
+    async def list_messages(self, user_id: ObjectId, conversation_id: str, limit: int = None, cursor: str = None) -> Dict[str, Any]:
+        """
+        One page of a conversation's messages: the newest page first, each page oldest first
+
+        Args:
+            user_id: Owner's _id (other users' conversations return no messages)
+            conversation_id: Conversation id
+            limit: Page size (default CHAT_HISTORY_PAGE_SIZE, at most 100)
+            cursor: next_cursor of the previous page (older messages)
+
+        Returns:
+            dict with "conversation_id", "messages" and "next_cursor" (None when there are no older messages)
+        """
+        limit = min(limit or RagConfig.CHAT_HISTORY_PAGE_SIZE, 100)
+        conversation = parse_id(conversation_id)
+        await self._read_your_writes(user_id)
+        query = {"user_id": user_id, "conversation_id": conversation, **before_cursor("create_at", cursor)}
+        documents = await db[MESSAGE_COLLECTION].find(query, MESSAGE_PROJECTION) \
+            .sort([("create_at", -1), ("_id", -1)]).limit(limit + 1).to_list(limit + 1)
+
+        next_cursor = encode_cursor(documents[limit - 1]["create_at"], documents[limit - 1]["_id"]) if len(documents) > limit else None
+        return {
+            "conversation_id": conversation_id,
+            "messages": [
+                {
+                    "id": str(document["_id"]),
+                    "role": document["role"],
+                    "content": document.get("content", ""),
+                    "prediction": document.get("prediction"),
+                    "probability": document.get("probability"),
+                    "create_at": document["create_at"]
+                }
+                for document in reversed(documents[:limit])
+            ],
+            "next_cursor": next_cursor
+        }
+
+    async def delete_conversation(self, user_id: ObjectId, conversation_id: str) -> bool:
+        """Delete a conversation and its messages; False if the user has no such conversation"""
+        conversation = parse_id(conversation_id)
+        await self._read_your_writes(user_id)
+        result = await db[CONVERSATION_COLLECTION].delete_one({"_id": conversation, "user_id": user_id})
+        self._states.pop(conversation_id, None)
+        self._owners.pop(conversation, None)
+        if result.deleted_count:
+            await db[MESSAGE_COLLECTION].delete_many({"user_id": user_id, "conversation_id": conversation})
+        return result.deleted_count > 0
+
+
+conversation_service = ConversationService()
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import os
 import torch
 import torch.nn as nn
@@ -6,9 +8,40 @@ from torchvision.models import convnext_tiny
 from PIL import Image
 from io import BytesIO
 import gdown  
+from utils.metrics import stage_timer
+from utils.cpu_budget import cpu_budget
+from utils.singleflight import SingleFlight
+from config.rag_config import RagConfig
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def build_transform() -> transforms.Compose:
+    """Resize + ImageNet normalization used by the ConvNeXt classifier"""
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225]
+        )
+    ])
+
+
+def preprocess_image(file_bytes: bytes, transform: transforms.Compose) -> torch.Tensor:
+    """Decode image bytes into a (1, 3, 224, 224) batch tensor"""
+    img = Image.open(BytesIO(file_bytes)).convert("RGB")
+    return transform(img).unsqueeze(0)
+
 
 class ImageService:
-    def __init__(self):
+    def __init__(self, model=None):
+        """
+        Args:
+            model: Already loaded classifier, e.g. a RemoteImageModel running in an inference
+                worker process (default: download/load ConvNeXt Tiny in this process)
+        """
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.num_classes = 124
 
@@ -16,13 +49,6 @@ class ImageService:
         self.model_path = os.path.join(self.model_dir, "convnext_tiny_best.pth")
         self.class_names_path = os.path.join(os.getcwd(), "classes.txt")
         self.model_url = os.getenv("MODEL_URL")
-        # ====== Create storge save model ======
-        os.makedirs(self.model_dir, exist_ok=True)
-
-        if not os.path.exists(self.model_path):
-            print("Đang tải model từ Google Drive...")
-            gdown.download(self.model_url, self.model_path, quiet=False)
-            print("Tải model thành công!")
 
         # ====== Load class names ======
         if not os.path.exists(self.class_names_path):
@@ -31,8 +57,28 @@ class ImageService:
         with open(self.class_names_path, "r") as f:
             self.class_names = [line.strip() for line in f]
 
+        # ======Transform======
+        self.transform = build_transform()
+
+        # Concurrent uploads of the same image share one inference
+        self._inflight = SingleFlight("image")
+
+        if model is not None:
+            # Inputs are sent to the worker from CPU memory
+            self.device = torch.device("cpu")
+            self.model = model
+            return
+
+        # ====== Create storge save model ======
+        os.makedirs(self.model_dir, exist_ok=True)
+
+        if not os.path.exists(self.model_path):
+            logger.info("Đang tải model từ Google Drive...")
+            gdown.download(self.model_url, self.model_path, quiet=False)
+            logger.info("Tải model thành công!")
+
         # ====== Load model ConvNeXt Tiny ======
-        print("Đang khởi tạo mô hình ConvNeXt Tiny...")
+        logger.info("Đang khởi tạo mô hình ConvNeXt Tiny...")
         self.model = convnext_tiny(weights=None)
         self.model.classifier[2] = nn.Linear(
             self.model.classifier[2].in_features, self.num_classes
@@ -44,27 +90,33 @@ class ImageService:
 
         self.model = self.model.to(self.device)
         self.model.eval()
-        print("Model đã sẵn sàng để sử dụng!")
+        logger.info("Model đã sẵn sàng để sử dụng!")
 
-        # ======Transform======
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
-            )
-        ])
+    def warm_up(self):
+        """Run one inference on a blank image so the first request does not pay one-off allocation costs"""
+        with torch.no_grad(), cpu_budget.limit("image"):
+            self.model(torch.zeros(1, 3, 224, 224, device=self.device))
+
+    def _predict_probs(self, img_tensor: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad(), cpu_budget.limit("image"):
+            return torch.softmax(self.model(img_tensor), dim=1)
 
     async def detect_image(self, file_bytes: bytes):
         """Nhận bytes ảnh, dự đoán class, trả về kết quả"""
+        if not RagConfig.USE_REQUEST_COALESCING:
+            return await self._detect_image(file_bytes)
+        result, shared = await self._inflight.do(hashlib.sha256(file_bytes).digest(), lambda: self._detect_image(file_bytes))
+        return {**result, "coalesced": True} if shared else result
+
+    async def _detect_image(self, file_bytes: bytes):
         try:
-            img = Image.open(BytesIO(file_bytes)).convert("RGB")
-            img_tensor = self.transform(img).unsqueeze(0).to(self.device)
+            timings = {}
+            with stage_timer("image_preprocess", timings, backend=self.device.type, model="convnext_tiny"):
+                img_tensor = preprocess_image(file_bytes, self.transform).to(self.device)
 
-            with torch.no_grad():
-                outputs = self.model(img_tensor)
-                probs = torch.softmax(outputs, dim=1)
+            with stage_timer("image_inference", timings, backend=self.device.type, model="convnext_tiny"):
+                # Off the event loop: the forward pass (or the wait for an inference worker) blocks
+                probs = await asyncio.to_thread(self._predict_probs, img_tensor)
                 pred_idx = torch.argmax(probs, dim=1).item()
 
             pred_class = self.class_names[pred_idx]
@@ -72,7 +124,8 @@ class ImageService:
 
             return {
                 "predicted_class": pred_class,
-                "probability": pred_prob
+                "probability": pred_prob,
+                "timings": timings
             }
 
         except Exception as e:
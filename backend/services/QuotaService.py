@@ -0,0 +1,308 @@
+from config.database import db
+from config.rag_config import RagConfig
+from utils.metrics import ADMISSION_REJECTIONS
+from utils.logger import get_logger
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
+import asyncio
+import math
+import time
+
+logger = get_logger(__name__)
+
+QUOTA_COLLECTION = "usage_quotas"
+# One document per key and day, removed by a TTL index after QUOTA_DAILY_RETENTION_DAYS
+QUOTA_DAILY_COLLECTION = "usage_quotas_daily"
+USAGE_FIELDS = ("requests", "text_requests", "image_requests", "rejected")
+
+
+class QuotaExceededError(Exception):
+    """The user or IP has no tokens left; retry_after is when the next request is allowed"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaBucket:
+    """Token bucket and not-yet-flushed usage counters of one user or IP"""
+
+    def __init__(self, key: str, rate: float, capacity: float, tokens: float = None, updated_at: float = None):
+        """
+        Args:
+            key: "user:<id>" or "ip:<address>"
+            rate: Tokens per second
+            capacity: Burst size
+            tokens: Persisted token count (default: full bucket)
+            updated_at: Wall-clock time of the persisted token count
+        """
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity if tokens is None else min(tokens, capacity)
+        # Wall clock (not monotonic) so the refill continues across restarts
+        self.updated_at = updated_at or time.time()
+        self.pending = {}
+        self.dirty = False
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_consume(self, cost: float) -> float:
+        """
+        Take `cost` tokens if available
+
+        Returns:
+            0 if consumed, otherwise seconds until enough tokens are available
+        """
+        self._refill(time.time())
+        if self.tokens >= cost:
+            self.tokens -= cost
+            self.dirty = True
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def count(self, field: str, amount: int = 1):
+        self.pending[field] = self.pending.get(field, 0) + amount
+        self.dirty = True
+
+    def is_idle(self) -> bool:
+        """Full and flushed: safe to drop from memory (a reload restores the same state)"""
+        self._refill(time.time())
+        return not self.dirty and self.tokens >= self.capacity
+
+
+class QuotaService:
+    """
+    Per-user and per-IP token-bucket rate limits for /chat/prompt
+
+    Buckets live in memory; bucket state and usage counters are written to MongoDB in
+    periodic bulk writes ($inc for counters, $set for the bucket), not once per request.
+    Per-day counters go to their own documents (QUOTA_DAILY_COLLECTION) that expire, so
+    the bucket document does not grow with the number of days.
+    A bucket that is not in memory is restored from MongoDB on first use, so limits
+    survive restarts. With several worker processes each enforces its own buckets; the
+    usage counters add up correctly.
+    """
+
+    def __init__(self):
+        self.limits = {
+            "user": (RagConfig.QUOTA_USER_PER_MINUTE / 60, RagConfig.QUOTA_USER_BURST),
+            "ip": (RagConfig.QUOTA_IP_PER_MINUTE / 60, RagConfig.QUOTA_IP_BURST),
+        }
+        self._buckets: Dict[str, QuotaBucket] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Per-day increments whose write failed after the totals were written
+        self._daily_backlog: List[UpdateOne] = []
+        self._flusher = None
+
+    async def _bucket(self, key: str) -> QuotaBucket:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            return bucket
+        if key in self._loading:
+            return await self._loading[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            rate, capacity = self.limits[key.split(":", 1)[0]]
+            document = None
+            try:
+                document = await db[QUOTA_COLLECTION].find_one({"_id": key}, {"tokens": 1, "updated_at": 1})
+            except Exception as e:
+                # Fail open: a database hiccup must not block chat, the bucket just starts full
+                logger.warning(f"Could not load quota for {key}: {e}")
+            bucket = QuotaBucket(
+                key, rate, capacity,
+                tokens=document.get("tokens") if document else None,
+                updated_at=document["updated_at"].replace(tzinfo=timezone.utc).timestamp() if document and document.get("updated_at") else None
+            )
+            self._buckets[key] = bucket
+            future.set_result(bucket)
+            return bucket
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._loading[key]
+
+    @staticmethod
+    def keys_for(user: dict = None, ip: str = None) -> List[str]:
+        """Bucket keys a request is charged to: the user (if logged in) and the client IP"""
+        keys = []
+        if user is not None:
+            keys.append(f"user:{user['_id']}")
+        if ip:
+            keys.append(f"ip:{ip}")
+        return keys
+
+    async def consume(self, user: dict = None, ip: str = None, kind: str = "text"):
+        """
+        Charge one /chat/prompt request to the user's and the IP's buckets
+
+        Args:
+            user: Authenticated user document, None for anonymous requests
+            ip: Client IP
+            kind: "text" (uses the LLM, QUOTA_TEXT_COST) or "image" (QUOTA_IMAGE_COST)
+
+        Raises:
+            QuotaExceededError: A bucket is empty (nothing is charged in that case)
+        """
+        if not RagConfig.USE_QUOTA:
+            return
+        cost = RagConfig.QUOTA_TEXT_COST if kind == "text" else RagConfig.QUOTA_IMAGE_COST
+        buckets = [await self._bucket(key) for key in self.keys_for(user, ip)]
+        # A flush during the loads may have dropped an idle bucket: put it back
+        buckets = [self._buckets.setdefault(bucket.key, bucket) for bucket in buckets]
+
+        waits = [bucket.try_consume(cost) for bucket in buckets]
+        retry_after = max(waits, default=0.0)
+        if retry_after > 0:
+            # Refund the buckets that did have tokens, so a rejected request costs nothing
+            for bucket, wait in zip(buckets, waits):
+                if wait == 0:
+                    bucket.tokens += cost
+            for bucket in buckets:
+                bucket.count("rejected")
+            limited = [bucket.key.split(":", 1)[0] for bucket, wait in zip(buckets, waits) if wait > 0]
+            ADMISSION_REJECTIONS.labels(stage="quota", reason=f"{limited[0]}_rate").inc()
+            raise QuotaExceededError(f"Rate limit exceeded ({', '.join(limited)})", retry_after=math.ceil(retry_after))
+
+        for bucket in buckets:
+            bucket.count("requests")
+            bucket.count(f"{kind}_requests")
+
+    @staticmethod
+    def _daily_update(key: str, day: datetime, pending: Dict[str, int]) -> UpdateOne:
+        """Upsert of one key's counters for one UTC day, expiring after the retention window"""
+        name = day.strftime("%Y-%m-%d")
+        return UpdateOne(
+            {"_id": f"{key}|{name}"},
+            {
+                "$set": {
+                    "key": key,
+                    "day": name,
+                    "expires_at": day.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=RagConfig.QUOTA_DAILY_RETENTION_DAYS)
+                },
+                "$inc": {f"counters.{field}": amount for field, amount in pending.items()}
+            },
+            upsert=True
+        )
+
+    async def flush(self):
+        """Write dirty buckets and usage totals in one bulk write, then the per-day counters in another"""
+        operations = []
+        daily = []
+        flushed = []
+        now = datetime.now(timezone.utc)
+        for bucket in list(self._buckets.values()):
+            if not bucket.dirty:
+                continue
+            increments = {f"usage.{field}": amount for field, amount in bucket.pending.items()}
+            update = {
+                "$set": {
+                    "tokens": bucket.tokens,
+                    "updated_at": datetime.fromtimestamp(bucket.updated_at, timezone.utc),
+                    "kind": bucket.key.split(":", 1)[0],
+                    "subject": bucket.key.split(":", 1)[1]
+                },
+                # Per-day counters used to be kept in the bucket document
+                "$unset": {"daily": ""}
+            }
+            if increments:
+                update["$inc"] = increments
+                daily.append(self._daily_update(bucket.key, now, bucket.pending))
+            operations.append(UpdateOne({"_id": bucket.key}, update, upsert=True))
+            flushed.append((bucket, dict(bucket.pending)))
+            bucket.pending = {}
+            bucket.dirty = False
+
+        if operations:
+            try:
+                await db[QUOTA_COLLECTION].bulk_write(operations, ordered=False)
+            except Exception as e:
+                logger.warning(f"Quota flush failed, retrying next interval: {e}")
+                # Put the deltas back so the next flush retries them
+                for bucket, pending in flushed:
+                    for field, amount in pending.items():
+                        bucket.count(field, amount)
+                    bucket.dirty = True
+                return
+
+        daily = self._daily_backlog + daily
+        self._daily_backlog = []
+        if daily:
+            try:
+                await db[QUOTA_DAILY_COLLECTION].bulk_write(daily, ordered=False)
+            except Exception as e:
+                # The totals are written: only the per-day increments are retried
+                logger.warning(f"Daily quota flush failed, retrying next interval: {e}")
+                self._daily_backlog = daily
+
+        # Keep memory bounded: drop buckets that are full and fully persisted
+        for key, bucket in list(self._buckets.items()):
+            if bucket.is_idle():
+                del self._buckets[key]
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(RagConfig.QUOTA_FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flush (call from the app lifespan)"""
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic flush and write what is pending"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    async def get_usage(self, key: str) -> Dict[str, Any]:
+        """
+        Usage totals, per-day counters (last QUOTA_DAILY_RETENTION_DAYS days) and remaining tokens of one bucket key
+
+        Args:
+            key: "user:<id>" or "ip:<address>"
+
+        Returns:
+            Persisted usage plus deltas not flushed yet
+        """
+        document = await db[QUOTA_COLLECTION].find_one({"_id": key}) or {}
+        usage = {field: document.get("usage", {}).get(field, 0) for field in USAGE_FIELDS}
+        cursor = db[QUOTA_DAILY_COLLECTION].find({"key": key}).sort("day", -1).limit(RagConfig.QUOTA_DAILY_RETENTION_DAYS)
+        daily = {day["day"]: day.get("counters", {}) async for day in cursor}
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            for field, amount in bucket.pending.items():
+                usage[field] = usage.get(field, 0) + amount
+                daily.setdefault(today, {})
+                daily[today][field] = daily[today].get(field, 0) + amount
+            bucket._refill(time.time())
+        rate, capacity = self.limits[key.split(":", 1)[0]]
+        return {
+            "key": key,
+            "usage": usage,
+            "daily": daily,
+            "tokens_remaining": round(bucket.tokens, 2) if bucket is not None else document.get("tokens", capacity),
+            "limit_per_minute": round(rate * 60, 2),
+            "burst": capacity
+        }
+
+    async def top_usage(self, kind: str = "user", limit: int = 50) -> List[Dict[str, Any]]:
+        """Persisted usage of the heaviest users (or IPs), most requests first"""
+        cursor = db[QUOTA_COLLECTION].find({"kind": kind}, {"daily": 0}).sort("usage.requests", -1).limit(limit)
+        return [
+            {"key": document["_id"], "subject": document.get("subject"), "usage": document.get("usage", {}), "updated_at": document.get("updated_at")}
+            async for document in cursor
+        ]
+
+
+quota_service = QuotaService()
@@ -3,47 +3,100 @@ from rag.embeddings import EmbeddingGenerator
 from rag.vector_store import FAISSVectorStore
 from rag.qdrant_vector_store import QdrantVectorStore
 from rag.llm import GeminiLLM
+from rag.llm_gateway import LLMGateway
 from rag.document_processor import DocumentProcessor
 from rag.reranker import CrossEncoderReranker
+from rag.context_assembler import ContextAssembler
 from config.rag_config import RagConfig
+from utils.metrics import stage_timer, QUEUE_DEPTH, RERANK_DECISIONS
+from utils.logger import get_logger
+from utils.profiling import profile_thread
+from services.AdmissionService import admission_service
+from utils.deadline import Deadline, LatencyEstimator
+from utils.singleflight import SingleFlight
+from rag.conversation_state import ConversationState, chunk_entity
+from rag.llm_gateway import LLMDeadlineExceededError
+import asyncio
+import time
+import unicodedata
+import warnings
+
+logger = get_logger(__name__)
 
 class RagService:
     """Main RAG Pipeline orchestrator"""
     
-    def __init__(self):
-        """Initialize all components of the RAG pipeline"""
-        print("Initializing RAG Pipeline...")
+    def __init__(
+        self,
+        llm=None,
+        vector_store=None,
+        llm_gateway: LLMGateway = None,
+        embedding_generator: EmbeddingGenerator = None,
+        reranker: CrossEncoderReranker = None
+    ):
+        """
+        Initialize all components of the RAG pipeline
+        
+        Components that are passed in are used as-is (loaded elsewhere, e.g. in parallel
+        by StartupService, or stubs for benchmarks); the others are created here.
+        
+        Args:
+            llm: LLM to use instead of GeminiLLM (e.g. a local stub for benchmarks)
+            vector_store: Vector store to use instead of the one selected by RagConfig.USE_QDRANT
+            llm_gateway: Gateway to use instead of a default LLMGateway around llm
+            embedding_generator: Already loaded embedding model
+            reranker: Already loaded re-ranker (ignored if RagConfig.USE_RERANKING is off)
+        """
+        logger.info("Initializing RAG Pipeline...")
         
         # Initialize components
-        self.embedding_generator = EmbeddingGenerator()
+        self.embedding_generator = embedding_generator if embedding_generator is not None else EmbeddingGenerator()
         
         # Choose vector store based on RagConfig
-        if RagConfig.USE_QDRANT:
-            print("Using Qdrant Cloud as vector store...")
+        if vector_store is not None:
+            self.vector_store = vector_store
+            self.vector_backend = "qdrant" if isinstance(vector_store, QdrantVectorStore) else "faiss"
+        elif RagConfig.USE_QDRANT:
+            logger.info("Using Qdrant Cloud as vector store...")
             self.vector_store = QdrantVectorStore()
+            self.vector_backend = "qdrant"
         else:
-            print("Using FAISS as vector store...")
+            logger.info("Using FAISS as vector store...")
             self.vector_store = FAISSVectorStore()
+            self.vector_backend = "faiss"
         
-        self.llm = GeminiLLM()
+        self.llm = llm if llm is not None else GeminiLLM()
+        self.llm_gateway = llm_gateway if llm_gateway is not None else LLMGateway(self.llm)
+        QUEUE_DEPTH.labels(queue="llm").set_function(lambda: self.llm_gateway.queue_depth)
         self.document_processor = DocumentProcessor()
+        self.context_assembler = ContextAssembler()
         
         # Initialize re-ranker if enabled
         self.reranker = None
-        if RagConfig.USE_RERANKING:
+        if RagConfig.USE_RERANKING and reranker is not None:
+            self.reranker = reranker
+        elif RagConfig.USE_RERANKING:
             try:
-                print("Initializing cross-encoder re-ranker...")
-                self.reranker = CrossEncoderReranker(RagConfig.CROSS_ENCODER_MODEL)
-                print("Re-ranker initialized successfully!")
+                logger.info("Initializing cross-encoder re-ranker...")
+                self.reranker = CrossEncoderReranker(
+                    RagConfig.CROSS_ENCODER_MODEL,
+                    first_stage_model_name=RagConfig.CASCADE_FIRST_STAGE_MODEL if RagConfig.USE_CASCADE_RERANK else None
+                )
+                logger.info("Re-ranker initialized successfully!")
             except Exception as e:
-                print(f"Warning: Failed to initialize re-ranker: {e}")
-                print("Continuing without re-ranking...")
+                logger.warning(f"Failed to initialize re-ranker, continuing without re-ranking: {e}")
                 RagConfig.USE_RERANKING = False
         
         # Pipeline state
         self.is_indexed = False
         
-        print("RAG Pipeline initialized successfully!")
+        # Recent stage costs, used to plan what still fits in a request deadline
+        self.latency = LatencyEstimator({"rerank_pair": RagConfig.DEADLINE_RERANK_PAIR_ESTIMATE})
+        
+        # Concurrent identical questions share one pipeline run (and one Gemini call)
+        self._inflight = SingleFlight("rag")
+        
+        logger.info("RAG Pipeline initialized successfully!")
     
     def ingest_documents(self, documents: List[str]) -> Dict[str, Any]:
         """
@@ -55,26 +108,26 @@ class RagService:
         Returns:
             Dictionary with ingestion statistics
         """
-        print(f"Starting document ingestion for {len(documents)} documents...")
+        logger.info(f"Starting document ingestion for {len(documents)} documents...")
         
         all_chunks = []
         total_chunks = 0
         
         # Process each document
         for i, document in enumerate(documents):
-            print(f"Processing document {i+1}/{len(documents)}...")
+            logger.info(f"Processing document {i+1}/{len(documents)}...")
             chunks = self.document_processor.process_document(document)
             all_chunks.extend(chunks)
             total_chunks += len(chunks)
         
-        print(f"Total chunks created: {total_chunks}")
+        logger.info(f"Total chunks created: {total_chunks}")
         
         # Generate embeddings for all chunks
-        print("Generating embeddings...")
+        logger.info("Generating embeddings...")
         embeddings = self.embedding_generator.generate_embeddings(all_chunks)
         
         # Add to vector store
-        print("Adding embeddings to vector store...")
+        logger.info("Adding embeddings to vector store...")
         self.vector_store.add_embeddings(embeddings, all_chunks)
         
         # Save the index
@@ -89,7 +142,7 @@ class RagService:
             "vector_store_stats": self.vector_store.get_stats()
         }
         
-        print("Document ingestion completed!")
+        logger.info("Document ingestion completed!")
         return stats
     
     def ingest_documents_with_metadata(self,  documents: List[Dict],  name_field: str = "name_vn", metadata_fields: List[str] = None) -> Dict[str, Any]:
@@ -104,7 +157,7 @@ class RagService:
         Returns:
             Dictionary with ingestion statistics
         """
-        print(f"Starting metadata-level document ingestion for {len(documents)} entities...")
+        logger.info(f"Starting metadata-level document ingestion for {len(documents)} entities...")
         
         # Process all documents with metadata context
         all_chunks = self.document_processor.process_document_with_metadata(
@@ -114,14 +167,14 @@ class RagService:
         )
         
         total_chunks = len(all_chunks)
-        print(f"Total chunks created with metadata context: {total_chunks}")
+        logger.info(f"Total chunks created with metadata context: {total_chunks}")
         
         # Generate embeddings for all chunks
-        print("Generating embeddings...")
+        logger.info("Generating embeddings...")
         embeddings = self.embedding_generator.generate_embeddings(all_chunks)
         
         # Add to vector store
-        print("Adding embeddings to vector store...")
+        logger.info("Adding embeddings to vector store...")
         self.vector_store.add_embeddings(embeddings, all_chunks)
         
         # Save the index
@@ -137,7 +190,7 @@ class RagService:
             "metadata_fields": metadata_fields
         }
         
-        print("Metadata-level document ingestion completed!")
+        logger.info("Metadata-level document ingestion completed!")
         return stats
     
     def load_existing_index(self) -> bool:
@@ -147,26 +200,186 @@ class RagService:
         Returns:
             True if index loaded successfully, False otherwise
         """
-        print("Attempting to load existing index...")
+        logger.info("Attempting to load existing index...")
         success = self.vector_store.load_index()
         if success:
             self.is_indexed = True
-            print("Existing index loaded successfully!")
+            logger.info("Existing index loaded successfully!")
         else:
-            print("No existing index found.")
+            logger.warning("No existing index found.")
         return success
     
-    def query(self, question: str, top_k: int = RagConfig.TOP_K_RESULTS) -> Dict[str, Any]:
+    def query(self, question: str, top_k: int = RagConfig.TOP_K_RESULTS, deadline: Deadline = None, conversation: ConversationState = None) -> Dict[str, Any]:
         """
-        Query the RAG pipeline with optional re-ranking
+        Deprecated synchronous entry point, kept for scripts: runs aquery in its own event loop
+        
+        The LLM call now goes through the LLMGateway, so failures raise LLMGatewayError
+        instead of coming back as answer text. Cannot be called from a running event loop;
+        use aquery there.
         
         Args:
             question: User's question
             top_k: Number of top similar chunks to retrieve (overridden if re-ranking is enabled)
+            deadline: Latency budget; stages degrade when it runs low (None = no deadline)
+            conversation: Condensed state of the conversation (updated in place)
             
         Returns:
             Dictionary containing the response and metadata
         """
+        warnings.warn("RagService.query is deprecated, use aquery", DeprecationWarning, stacklevel=2)
+        return asyncio.run(self.aquery(question, top_k, deadline=deadline, conversation=conversation))
+    
+    @staticmethod
+    def _conversation_queries(question: str, conversation: ConversationState = None):
+        """(query to retrieve with, question for the LLM prompt): the follow-up's focus is added if needed"""
+        if conversation is None or not RagConfig.USE_CONVERSATION_STATE:
+            return question, question
+        return conversation.retrieval_query(question), conversation.prompt_question(question)
+    
+    @staticmethod
+    def _fold_turn(result: Dict[str, Any], question: str, search_query: str, conversation: ConversationState = None) -> Dict[str, Any]:
+        """Record what was searched and discussed, and fold this turn into the request's copy of the conversation state"""
+        if "error" in result:
+            return result
+        result["retrieval_query"] = search_query
+        result["entities"] = list(dict.fromkeys(name for name in map(chunk_entity, result["context"]) if name))
+        if conversation is not None and RagConfig.USE_CONVERSATION_STATE:
+            conversation.update(question, result["context"])
+        return result
+    
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Coalescing key: Unicode NFC, case-folded, whitespace collapsed, trailing punctuation dropped"""
+        text = " ".join(unicodedata.normalize("NFC", question).casefold().split())
+        return text.rstrip(" ?!.…")
+    
+    async def aquery(
+        self,
+        question: str,
+        top_k: int = RagConfig.TOP_K_RESULTS,
+        client_id: str = "anonymous",
+        deadline: Deadline = None,
+        conversation: ConversationState = None
+    ) -> Dict[str, Any]:
+        """
+        Query the RAG pipeline without blocking the event loop
+        
+        Retrieval runs in a worker thread; the LLM call goes through the rate-limited
+        LLMGateway, which raises LLMGatewayError instead of returning failure text.
+        
+        With a deadline, stages degrade instead of overrunning it (re-ranking shrinks or is
+        skipped, fewer/shorter context sections, retrieved passages without LLM synthesis);
+        the steps taken are listed in the result's "degradations".
+        
+        Concurrent calls with the same normalized question share one execution (the first
+        caller's client_id and deadline apply); joined results carry "coalesced": True.
+        
+        With a conversation state, a follow-up question that names no snake is retrieved
+        together with the conversation's focus (one short query, not the history) and the
+        state is updated with the turn.
+        
+        Args:
+            question: User's question
+            top_k: Number of top similar chunks to retrieve (overridden if re-ranking is enabled)
+            client_id: Key for fair queueing in the LLM gateway
+            deadline: Latency budget of the request (None = no deadline)
+            conversation: Condensed state of the conversation (updated in place)
+            
+        Returns:
+            Dictionary containing the response and metadata
+        """
+        search_query, prompt_question = self._conversation_queries(question, conversation)
+        if not RagConfig.USE_REQUEST_COALESCING:
+            result = await self._aquery(search_query, prompt_question, top_k, client_id, deadline)
+            return self._fold_turn(result, question, search_query, conversation)
+        
+        result, shared = await self._inflight.do(
+            (self.normalize_question(search_query), self.normalize_question(prompt_question), top_k),
+            lambda: self._aquery(search_query, prompt_question, top_k, client_id, deadline)
+        )
+        # Copy: the shared result must not be changed by one caller's bookkeeping
+        result = self._fold_turn(dict(result), question, search_query, conversation)
+        return {**result, "coalesced": True} if shared else result
+    
+    async def _aquery(self, search_query: str, prompt_question: str, top_k: int, client_id: str, deadline: Deadline) -> Dict[str, Any]:
+        """One execution of the async pipeline (see aquery)"""
+        start = time.perf_counter()
+        timings = {}
+        degradations = []
+        # Bounded CPU-bound stage: sheds load (AdmissionRejectedError) instead of queueing threads without limit
+        async with admission_service.admit("retrieval"):
+            retrieval = await asyncio.to_thread(profile_thread("retrieval", self._retrieve), search_query, top_k, timings, deadline, degradations)
+        if "error" in retrieval:
+            return retrieval
+        
+        if deadline is not None and deadline.remaining() < self.llm_gateway.estimated_latency():
+            # The LLM would answer after the deadline: the passages are still a useful answer
+            degradations.append("passages_only")
+            return self._build_result(self._passages_response(retrieval), retrieval, timings, start, degradations, deadline)
+        
+        prompt = self.llm.build_prompt(prompt_question, retrieval["context_sections"])
+        try:
+            with stage_timer("llm", timings, backend="gemini", model=RagConfig.LLM_MODEL):
+                response = await self.llm_gateway.generate(prompt, client_id=client_id, deadline=deadline.at if deadline is not None else None)
+        except LLMDeadlineExceededError:
+            if deadline is None:
+                raise
+            degradations.append("passages_only")
+            response = self._passages_response(retrieval)
+        
+        return self._build_result(response, retrieval, timings, start, degradations, deadline)
+    
+    def _passages_response(self, retrieval: Dict[str, Any]) -> str:
+        """Answer made of the retrieved context sections, used when there is no time for the LLM"""
+        sections = "\n\n".join(f"- {section}" for section in retrieval["context_sections"])
+        return f"Hệ thống đang bận nên chưa thể tổng hợp câu trả lời. Thông tin liên quan tìm được:\n\n{sections}"
+    
+    def _build_result(
+        self,
+        response: str,
+        retrieval: Dict[str, Any],
+        timings: Dict[str, float],
+        start: float,
+        degradations: List[str] = None,
+        deadline: Deadline = None
+    ) -> Dict[str, Any]:
+        """Combine the LLM response with retrieval metadata, the per-stage timing breakdown and the degradations taken"""
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+        return {
+            "response": response,
+            "context": retrieval["final_texts"],
+            "similarity_scores": retrieval["final_scores"],
+            "num_context_chunks": len(retrieval["final_texts"]),
+            "rerank_info": retrieval["rerank_info"],
+            "context_info": retrieval["context_info"],
+            "timings": timings,
+            "degradations": degradations or [],
+            "deadline": deadline.to_dict() if deadline is not None else None
+        }
+    
+    def _retrieve(
+        self,
+        question: str,
+        top_k: int,
+        timings: Dict[str, float] = None,
+        deadline: Deadline = None,
+        degradations: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Run embedding, vector search, re-ranking and context assembly
+        
+        Args:
+            question: User's question
+            top_k: Number of top similar chunks to retrieve (overridden if re-ranking is enabled)
+            timings: Optional dict receiving per-stage durations in ms
+            deadline: Latency budget; re-ranking and context shrink when it runs low
+            degradations: Optional list receiving the degradation steps taken
+            
+        Returns:
+            Retrieval results, or an error result dictionary containing "error"
+        """
+        if degradations is None:
+            degradations = []
         if not self.is_indexed:
             return {
                 "response": "Error: No documents have been indexed yet. Please ingest documents first.",
@@ -175,18 +388,20 @@ class RagService:
                 "error": "No index available"
             }
         
-        print(f"Processing query: {question}")
+        logger.debug("Processing query", extra={"question_length": len(question)})
         
         # Generate embedding for the query
-        print("Generating query embedding...")
-        query_embedding = self.embedding_generator.generate_single_embedding(question)
+        logger.debug("Generating query embedding...")
+        with stage_timer("embed", timings, backend=self.embedding_generator.device, model=RagConfig.EMBEDDING_MODEL):
+            query_embedding = self.embedding_generator.generate_single_embedding(question)
         
         # Determine how many candidates to retrieve
         retrieval_k = RagConfig.RERANK_TOP_K if RagConfig.USE_RERANKING else top_k
         
         # Search for similar chunks
-        print(f"Searching for relevant context (retrieving top {retrieval_k})...")
-        similar_texts, similarity_scores = self.vector_store.search(query_embedding, retrieval_k)
+        logger.debug("Searching for relevant context (retrieving top %d)...", retrieval_k)
+        with stage_timer("vector_search", timings, backend=self.vector_backend):
+            similar_texts, similarity_scores = self.vector_store.search(query_embedding, retrieval_k)
         
         if not similar_texts:
             return {
@@ -196,41 +411,84 @@ class RagService:
                 "error": "No relevant context found"
             }
         
-        print(f"Found {len(similar_texts)} relevant chunks from vector search")
+        logger.debug("Found %d relevant chunks from vector search", len(similar_texts))
         
         # Apply re-ranking if enabled
         final_texts = similar_texts
         final_scores = similarity_scores
         rerank_info = {}
         
-        if RagConfig.USE_RERANKING and self.reranker is not None:
-            print("Applying cross-encoder re-ranking...")
+        # Adaptive mode: skip or shrink re-ranking when dense scores already separate clearly
+        rerank_candidates = len(similar_texts)
+        if RagConfig.USE_RERANKING and self.reranker is not None and RagConfig.USE_ADAPTIVE_RERANK:
+            rerank_candidates = self.reranker.adaptive_candidate_count(similarity_scores, RagConfig.FINAL_TOP_K)
+        
+        # Deadline: only re-rank as many pairs as fit in the time left after the expected LLM call
+        skip_reason = "adaptive"
+        if RagConfig.USE_RERANKING and self.reranker is not None and rerank_candidates > 0 and deadline is not None:
+            available = deadline.remaining() - self.llm_gateway.estimated_latency()
+            affordable = int(available / max(self.latency.estimate("rerank_pair"), 1e-4)) if available > 0 else 0
+            if affordable < rerank_candidates:
+                if affordable > RagConfig.FINAL_TOP_K:
+                    rerank_candidates = affordable
+                    degradations.append("rerank_shrunk")
+                else:
+                    rerank_candidates = 0
+                    skip_reason = "deadline"
+                    degradations.append("rerank_skipped")
+        
+        if RagConfig.USE_RERANKING and self.reranker is not None and rerank_candidates > 0:
+            logger.debug("Applying cross-encoder re-ranking on %d/%d candidates...", rerank_candidates, len(similar_texts))
+            RERANK_DECISIONS.labels(decision="full" if rerank_candidates == len(similar_texts) else "pruned").inc()
+            rerank_timings = {}
             
-            # Combine original results
-            passages_with_scores = list(zip(similar_texts, similarity_scores))
+            # Combine original results (vector search returns candidates sorted by dense score)
+            passages_with_scores = list(zip(similar_texts, similarity_scores))[:rerank_candidates]
             
             # Re-rank with combined scoring
-            reranked_results = self.reranker.rerank_with_original_scores(
-                question, 
-                passages_with_scores, 
-                alpha=RagConfig.RERANK_ALPHA,
-                top_k=RagConfig.FINAL_TOP_K
-            )
+            with stage_timer("rerank", rerank_timings, backend="cascade" if self.reranker.is_cascade else "cross-encoder", model=self.reranker.model_name):
+                reranked_results = self.reranker.rerank_with_original_scores(
+                    question, 
+                    passages_with_scores, 
+                    alpha=RagConfig.RERANK_ALPHA,
+                    top_k=RagConfig.FINAL_TOP_K
+                )
+            if timings is not None:
+                timings.update(rerank_timings)
+            # Per-pair cost of model work only: cached scores cost next to nothing
+            if reranked_results.scored_pairs > 0:
+                self.latency.observe("rerank_pair", rerank_timings["rerank"] / 1000 / reranked_results.scored_pairs)
             
             # Extract re-ranked results
-            final_texts = [item[0] for item in reranked_results]
-            final_scores = [item[1] for item in reranked_results]  # Combined scores
+            final_texts = reranked_results.texts
+            final_scores = reranked_results.combined_scores.tolist()  # Combined scores
             
             rerank_info = {
                 "reranking_used": True,
+                "rerank_skipped": False,
                 "original_retrieval_count": len(similar_texts),
+                "reranked_count": rerank_candidates,
+                "cascade_used": self.reranker.is_cascade,
+                "fusion_strategy": RagConfig.FUSION_STRATEGY,
                 "final_count_after_rerank": len(final_texts),
-                "cross_encoder_scores": [item[2] for item in reranked_results],
-                "original_scores": [item[3] for item in reranked_results],
-                "combined_scores": final_scores
+                **reranked_results.to_dict(),
+                "rerank_time_ms": rerank_timings["rerank"]
             }
             
-            print(f"Re-ranking completed. Final {len(final_texts)} passages selected.")
+            logger.debug("Re-ranking completed. Final %d passages selected.", len(final_texts))
+        elif RagConfig.USE_RERANKING and self.reranker is not None:
+            # Dense score gap at the cut-off is large enough (or no time left): keep dense ordering
+            RERANK_DECISIONS.labels(decision="skipped" if skip_reason == "adaptive" else "skipped_deadline").inc()
+            final_texts = final_texts[:RagConfig.FINAL_TOP_K]
+            final_scores = final_scores[:RagConfig.FINAL_TOP_K]
+            rerank_info = {
+                "reranking_used": False,
+                "rerank_skipped": True,
+                "skip_reason": skip_reason,
+                "original_retrieval_count": len(similar_texts),
+                "rerank_time_ms": 0.0
+            }
+            logger.debug("Skipping re-ranking (%s).", skip_reason)
         else:
             # Use original results, but limit to final_top_k
             final_k = RagConfig.FINAL_TOP_K if RagConfig.USE_RERANKING else top_k
@@ -238,20 +496,54 @@ class RagService:
             final_scores = final_scores[:final_k]
             rerank_info = {"reranking_used": False}
         
-        # Generate response using LLM
-        print("Generating response...")
-        response = self.llm.generate_response(question, final_texts)
-        
-        result = {
-            "response": response,
-            "context": final_texts,
-            "similarity_scores": final_scores,
-            "num_context_chunks": len(final_texts),
-            "rerank_info": rerank_info
+        # Little time left for the LLM: fewer passages and a shorter prompt
+        token_budget = None
+        if deadline is not None and deadline.remaining() < RagConfig.DEADLINE_LLM_HEADROOM * self.llm_gateway.estimated_latency():
+            if len(final_texts) > RagConfig.DEGRADED_FINAL_TOP_K:
+                final_texts = final_texts[:RagConfig.DEGRADED_FINAL_TOP_K]
+                final_scores = final_scores[:RagConfig.DEGRADED_FINAL_TOP_K]
+                degradations.append("final_top_k_reduced")
+            if RagConfig.USE_CONTEXT_ASSEMBLY:
+                token_budget = min(RagConfig.DEGRADED_CONTEXT_TOKEN_BUDGET, self.context_assembler.token_budget)
+                degradations.append("short_prompt")
+        
+        # Merge overlapping chunks and pack them into the prompt token budget
+        context_sections = final_texts
+        context_info = {"context_assembly_used": False}
+        if RagConfig.USE_CONTEXT_ASSEMBLY:
+            with stage_timer("context_assembly", timings):
+                context_sections, context_info = self.context_assembler.assemble(final_texts, token_budget=token_budget)
+            context_info["context_assembly_used"] = True
+        
+        return {
+            "final_texts": final_texts,
+            "final_scores": final_scores,
+            "rerank_info": rerank_info,
+            "context_sections": context_sections,
+            "context_info": context_info
         }
+    
+    def warm_up(self, question: str = RagConfig.WARMUP_QUERY) -> Dict[str, float]:
+        """
+        Run one retrieval so the first user request does not pay one-off allocation costs
         
-        print("Query processed successfully!")
-        return result
+        Args:
+            question: Warm-up question
+            
+        Returns:
+            Per-stage durations in ms
+        """
+        timings = {}
+        if self.is_indexed:
+            self._retrieve(question, RagConfig.TOP_K_RESULTS, timings)
+        else:
+            self.embedding_generator.generate_single_embedding(question)
+        if self.reranker is not None:
+            # Skip the score cache so the model itself runs
+            self.reranker.model.predict([(question, question)])
+            if self.reranker.is_cascade:
+                self.reranker.first_stage_model.predict([(question, question)])
+        return timings
     
     def get_pipeline_stats(self) -> Dict[str, Any]:
         """
@@ -268,7 +560,12 @@ class RagService:
                 "rerank_top_k": RagConfig.RERANK_TOP_K,
                 "final_top_k": RagConfig.FINAL_TOP_K,
                 "rerank_alpha": RagConfig.RERANK_ALPHA,
-                "reranker_loaded": self.reranker is not None
+                "fusion_strategy": RagConfig.FUSION_STRATEGY,
+                "score_normalization": RagConfig.SCORE_NORMALIZATION,
+                "adaptive_rerank": RagConfig.USE_ADAPTIVE_RERANK,
+                "cascade_rerank": self.reranker is not None and self.reranker.is_cascade,
+                "reranker_loaded": self.reranker is not None,
+                "reranker_info": self.reranker.get_model_info() if self.reranker is not None else {}
             }
         else:
             rerank_info = {"reranking_enabled": False}
@@ -282,6 +579,8 @@ class RagService:
                 "chunk_overlap": RagConfig.CHUNK_OVERLAP,
                 "top_k_results": RagConfig.TOP_K_RESULTS,
                 "llm_model": RagConfig.LLM_MODEL,
+                "llm_gateway": self.llm_gateway.get_stats(),
+                "context_token_budget": RagConfig.CONTEXT_TOKEN_BUDGET if RagConfig.USE_CONTEXT_ASSEMBLY else None,
                 "embedding_model": RagConfig.EMBEDDING_MODEL
             }
         }
@@ -289,10 +588,11 @@ class RagService:
     
     def reset_pipeline(self):
         """Reset the pipeline by clearing the vector store"""
-        print("Resetting pipeline...")
+        logger.info("Resetting pipeline...")
         self.vector_store = FAISSVectorStore()
+        self.vector_backend = "faiss"
         self.is_indexed = False
-        print("Pipeline reset completed!")
+        logger.info("Pipeline reset completed!")
     
     def test_components(self) -> Dict[str, bool]:
         """
@@ -301,7 +601,7 @@ class RagService:
         Returns:
             Dictionary with test results for each component
         """
-        print("Testing pipeline components...")
+        logger.info("Testing pipeline components...")
         
         results = {}
         
@@ -309,37 +609,37 @@ class RagService:
         try:
             test_embedding = self.embedding_generator.generate_single_embedding("Test text")
             results["embedding_generator"] = len(test_embedding) == RagConfig.VECTOR_DIMENSION
-            print("✓ Embedding generator test passed")
+            logger.info("Embedding generator test passed")
         except Exception as e:
             results["embedding_generator"] = False
-            print(f"✗ Embedding generator test failed: {e}")
+            logger.error(f"Embedding generator test failed: {e}")
         
         # Test LLM
         try:
             test_response = self.llm.generate_simple_response("Hello, how are you?")
             results["llm"] = len(test_response) > 0
-            print("✓ LLM test passed")
+            logger.info("LLM test passed")
         except Exception as e:
             results["llm"] = False
-            print(f"✗ LLM test failed: {e}")
+            logger.error(f"LLM test failed: {e}")
         
         # Test document processor
         try:
             test_chunks = self.document_processor.process_document("This is a test document. It has multiple sentences. Each sentence should be processed correctly.")
             results["document_processor"] = len(test_chunks) > 0
-            print("✓ Document processor test passed")
+            logger.info("Document processor test passed")
         except Exception as e:
             results["document_processor"] = False
-            print(f"✗ Document processor test failed: {e}")
+            logger.error(f"Document processor test failed: {e}")
         
         # Test vector store
         try:
             self.vector_store.create_index()
             results["vector_store"] = self.vector_store.index is not None
-            print("✓ Vector store test passed")
+            logger.info("Vector store test passed")
         except Exception as e:
             results["vector_store"] = False
-            print(f"✗ Vector store test failed: {e}")
+            logger.error(f"Vector store test failed: {e}")
         
-        print("Component testing completed!")
+        logger.info("Component testing completed!")
         return results
\ No newline at end of file
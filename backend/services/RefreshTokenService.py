@@ -0,0 +1,217 @@
+from config.database import db
+from utils.bloom import BloomFilter
+from utils.metrics import record_cache
+from utils.logger import get_logger
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from typing import Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import uuid
+
+load_dotenv()
+logger = get_logger(__name__)
+
+TOKEN_COLLECTION = "refresh_token"
+REVOCATION_COLLECTION = "refresh_token_revocations"
+
+# Refresh tokens with less than this lifetime left are replaced on /auth/refresh-token
+REFRESH_TOKEN_ROTATE_SECOND = int(os.getenv("REFRESH_TOKEN_ROTATE_SECOND", "86400"))
+# How often revocations made by other worker processes are pulled into the local filter
+REFRESH_REVOCATION_SYNC_SECOND = float(os.getenv("REFRESH_REVOCATION_SYNC_SECOND", "30"))
+REFRESH_BLOOM_CAPACITY = int(os.getenv("REFRESH_BLOOM_CAPACITY", "100000"))
+# Full rebuilds drop revocations of tokens that have expired anyway
+REFRESH_BLOOM_REBUILD_SECOND = float(os.getenv("REFRESH_BLOOM_REBUILD_SECOND", "3600"))
+
+
+def token_key(jti: str) -> bytes:
+    """Stored id of a refresh token: 16 bytes of SHA-256(jti), never the token itself"""
+    return hashlib.sha256(jti.encode("utf-8")).digest()[:16]
+
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+class RefreshTokenService:
+    """
+    Refresh-token store keyed by a short hash of the token's jti
+
+    One document per live token ({_id: token_key(jti), user_id, expires_at}); it is deleted
+    on logout, rotation or per-user revocation (one delete_many on the user_id index) and
+    by the TTL index at expiry. A token is valid while its document exists.
+
+    Revocations are also recorded in a small collection and mirrored into an in-memory
+    Bloom filter. A refresh whose jti and user are not in the filter was never revoked and
+    skips the database; only possible matches are checked against the store. Revocations
+    made by another worker process reach this one within REFRESH_REVOCATION_SYNC_SECOND.
+    """
+
+    def __init__(self):
+        self.bloom = BloomFilter(REFRESH_BLOOM_CAPACITY)
+        self.synced_at: Optional[datetime] = None
+        self.rebuilt_at: Optional[datetime] = None
+        self.fast_path = 0
+        self.checked = 0
+        self._rebuild_local = None
+        self._syncer = None
+
+    async def issue(self, user_id, expires_in: int) -> Tuple[str, datetime]:
+        """
+        Register a new refresh token
+
+        Args:
+            user_id: Owner's _id
+            expires_in: Token lifetime in seconds
+
+        Returns:
+            tuple of (jti to put in the token, expiry)
+        """
+        jti = uuid.uuid4().hex
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=expires_in)
+        await db[TOKEN_COLLECTION].insert_one({"_id": token_key(jti), "user_id": user_id, "create_at": now, "expires_at": expires_at})
+        return jti, expires_at
+
+    async def is_valid(self, payload: dict) -> bool:
+        """
+        Whether a verified refresh token was not revoked
+
+        Args:
+            payload: Decoded refresh token claims (jti, uid)
+        """
+        jti = payload.get("jti")
+        if jti is None:
+            # Issued before the store was keyed by jti: see revoke_legacy
+            return False
+        key = token_key(jti)
+        # Before the first sync the filter does not know older revocations yet
+        if self.synced_at is not None and key not in self.bloom and user_key(payload.get("uid")) not in self.bloom:
+            self.fast_path += 1
+            record_cache("refresh_revocation_bloom", 1, 0)
+            return True
+        self.checked += 1
+        record_cache("refresh_revocation_bloom", 0, 1)
+        return await db[TOKEN_COLLECTION].find_one({"_id": key}, {"_id": 1}) is not None
+
+    async def _record_revocations(self, keys, expires_at: datetime):
+        now = datetime.utcnow()
+        for key in keys:
+            self.bloom.add(key)
+            if self._rebuild_local is not None:
+                self._rebuild_local.append(key)
+        await db[REVOCATION_COLLECTION].bulk_write([
+            UpdateOne({"_id": key}, {"$set": {"revoked_at": now, "expires_at": expires_at}}, upsert=True)
+            for key in keys
+        ], ordered=False)
+
+    async def revoke(self, jti: str, expires_at: datetime) -> bool:
+        """
+        Revoke one refresh token (logout, rotation)
+
+        Args:
+            jti: The token's jti claim
+            expires_at: The token's expiry (how long the revocation must be remembered)
+
+        Returns:
+            False if it was not in the store (already revoked or expired)
+        """
+        key = token_key(jti)
+        result = await db[TOKEN_COLLECTION].delete_one({"_id": key})
+        if result.deleted_count:
+            await self._record_revocations([key], expires_at)
+        return result.deleted_count > 0
+
+    async def revoke_user(self, user_id, max_lifetime: int) -> int:
+        """
+        Revoke every refresh token of a user (password change, admin action)
+
+        Args:
+            user_id: Owner's _id
+            max_lifetime: Refresh token lifetime in seconds (how long the revocation must be remembered)
+
+        Returns:
+            Number of tokens revoked
+        """
+        result = await db[TOKEN_COLLECTION].delete_many({"user_id": user_id})
+        await self._record_revocations([user_key(user_id)], datetime.utcnow() + timedelta(seconds=max_lifetime))
+        return result.deleted_count
+
+    async def revoke_legacy(self, token: str) -> bool:
+        """
+        Consume a refresh token issued before tokens had a jti
+
+        The old store kept the full token string ({user_id, token, expires_at}). The document
+        is deleted, so such a token is accepted once (exchanged for a jti token) or logged out.
+
+        Args:
+            token: The encoded refresh token
+
+        Returns:
+            False if it was not in the store (already used, revoked or expired)
+        """
+        result = await db[TOKEN_COLLECTION].delete_many({"token": token})
+        return result.deleted_count > 0
+
+    def should_rotate(self, payload: dict) -> bool:
+        """True when the token has less than REFRESH_TOKEN_ROTATE_SECOND left"""
+        return payload.get("exp", 0) - datetime.utcnow().timestamp() < REFRESH_TOKEN_ROTATE_SECOND
+
+    async def sync(self):
+        """Pull revocations recorded since the last sync into the filter; rebuild it periodically"""
+        now = datetime.utcnow()
+        rebuild = (
+            self.rebuilt_at is None or self.bloom.is_full()
+            or (now - self.rebuilt_at).total_seconds() >= REFRESH_BLOOM_REBUILD_SECOND
+        )
+        query = {"expires_at": {"$gt": now}}
+        if not rebuild:
+            # Overlap so writes that committed around the last sync are not missed
+            query["revoked_at"] = {"$gte": self.synced_at - timedelta(seconds=REFRESH_REVOCATION_SYNC_SECOND)}
+        bloom = self.bloom
+        if rebuild:
+            bloom = BloomFilter(REFRESH_BLOOM_CAPACITY)
+            self._rebuild_local = []
+        try:
+            async for document in db[REVOCATION_COLLECTION].find(query, {"_id": 1}):
+                bloom.add(document["_id"])
+            if rebuild:
+                # Keep what was revoked locally while the rebuild was reading
+                for key in self._rebuild_local:
+                    bloom.add(key)
+                self.bloom, self.rebuilt_at = bloom, now
+        finally:
+            self._rebuild_local = None
+        self.synced_at = now
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Refresh token revocation sync failed: {e}")
+            await asyncio.sleep(REFRESH_REVOCATION_SYNC_SECOND)
+
+    def start(self):
+        """Start the revocation sync (call from the app lifespan)"""
+        if self._syncer is None:
+            self._syncer = asyncio.get_running_loop().create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._syncer is not None:
+            self._syncer.cancel()
+            self._syncer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "bloom_keys": self.bloom.count,
+            "bloom_capacity": self.bloom.capacity,
+            "fast_path": self.fast_path,
+            "checked": self.checked,
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None
+        }
+
+
+refresh_token_service = RefreshTokenService()
@@ -0,0 +1,128 @@
+from config.database import db
+from utils.logger import get_logger
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import Dict, Any, List, Tuple
+import asyncio
+import time
+
+logger = get_logger(__name__)
+
+# Declared indexes per collection; created at startup if missing (create_indexes is a no-op for existing ones).
+# Other indexes on these collections (except _id_) are dropped, so a removed declaration is cleaned up
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # Login, register and token fallback look users up by email; unique also closes the register race
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "refresh_token": [
+        # Looked up by _id (hash of the jti); per-user revocation deletes by user_id
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # MongoDB deletes a refresh token once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "refresh_token_revocations": [
+        # Incremental sync of the revocation Bloom filter
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "conversations": [
+        # Conversation list of a user, most recently updated first (keyset pagination on updated_at, _id)
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)], name="user_updated"),
+    ],
+    "messages": [
+        # Messages of one conversation in time order (keyset pagination on create_at, _id)
+        IndexModel([("user_id", ASCENDING), ("conversation_id", ASCENDING), ("create_at", DESCENDING), ("_id", DESCENDING)], name="user_conversation_time"),
+    ],
+    "usage_quotas": [
+        # GET /admin/usage: heaviest users or IPs
+        IndexModel([("kind", ASCENDING), ("usage.requests", DESCENDING)], name="kind_requests"),
+    ],
+    "usage_quotas_daily": [
+        # GET /user/usage and /admin/usage/{kind}/{subject}: latest days of one user or IP
+        IndexModel([("key", ASCENDING), ("day", DESCENDING)], name="key_day"),
+        # MongoDB deletes a day once it is older than QUOTA_DAILY_RETENTION_DAYS
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+# Indexes that serve documents of an older format: declared only while such documents exist, so the
+# index is dropped at the first startup after the last of them is gone
+LEGACY_INDEXES: Dict[str, List[Tuple[IndexModel, Dict[str, Any]]]] = {
+    "refresh_token": [
+        # Refresh tokens issued before the jti (full token string stored); expires_at_ttl deletes them
+        (IndexModel([("token", ASCENDING)], name="token"), {"token": {"$exists": True}}),
+    ],
+}
+
+
+class SchemaService:
+    """
+    Creates the declared MongoDB indexes in the background at startup and drops the
+    indexes of those collections that are no longer declared
+
+    Failures (database unreachable, duplicate emails blocking the unique index, an
+    existing index with other options) are logged and reported by /health/ready, they
+    do not stop the app.
+    """
+
+    def __init__(
+        self,
+        indexes: Dict[str, List[IndexModel]] = INDEXES,
+        legacy_indexes: Dict[str, List[Tuple[IndexModel, Dict[str, Any]]]] = LEGACY_INDEXES,
+        drop_undeclared: bool = True
+    ):
+        self.indexes = indexes
+        self.legacy_indexes = legacy_indexes
+        self.drop_undeclared = drop_undeclared
+        self.status = "pending"
+        self.collections: Dict[str, Any] = {}
+        self.seconds = None
+        self._task = None
+
+    async def _declared(self, collection: str) -> List[IndexModel]:
+        """Indexes of a collection, including legacy ones whose documents still exist"""
+        models = list(self.indexes.get(collection, []))
+        for model, legacy_filter in self.legacy_indexes.get(collection, []):
+            if await db[collection].find_one(legacy_filter, {"_id": 1}) is not None:
+                models.append(model)
+        return models
+
+    async def _drop_undeclared(self, collection: str, names: List[str]) -> List[str]:
+        """Drop indexes that are not declared (never _id_); returns their names"""
+        existing = await db[collection].index_information()
+        dropped = [name for name in existing if name != "_id_" and name not in names]
+        for name in dropped:
+            await db[collection].drop_index(name)
+            logger.info(f"Dropped undeclared index '{name}' on '{collection}'")
+        return dropped
+
+    async def ensure_indexes(self):
+        start = time.perf_counter()
+        failed = False
+        for collection in dict.fromkeys([*self.indexes, *self.legacy_indexes]):
+            try:
+                models = await self._declared(collection)
+                names = await db[collection].create_indexes(models) if models else []
+                dropped = await self._drop_undeclared(collection, names) if self.drop_undeclared else []
+                self.collections[collection] = {"status": "ready", "indexes": names, "dropped": dropped}
+            except Exception as e:
+                # OperationFailure here is usually duplicate keys or an index with other options (code 85/86)
+                failed = True
+                self.collections[collection] = {"status": "failed", "error": str(e)}
+                logger.error(f"Could not create indexes on '{collection}': {e}")
+        self.seconds = round(time.perf_counter() - start, 3)
+        self.status = "failed" if failed else "ready"
+        logger.info(f"MongoDB indexes {self.status} in {self.seconds}s")
+
+    def start(self):
+        """Create the indexes in the background (call from the app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.ensure_indexes())
+        return self._task
+
+    def report(self) -> Dict[str, Any]:
+        return {"status": self.status, "seconds": self.seconds, "collections": self.collections}
+
+
+schema_service = SchemaService()
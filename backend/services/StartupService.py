@@ -0,0 +1,276 @@
+from fastapi import HTTPException, status
+from config.rag_config import RagConfig
+from utils.metrics import COMPONENT_STARTUP, COLD_START
+from utils.logger import get_logger
+from utils.cpu_budget import cpu_budget
+from services.AdmissionService import admission_service
+from typing import Callable, Dict, Any
+import asyncio
+import os
+import psutil
+import time
+
+logger = get_logger(__name__)
+
+
+class ComponentState:
+    """Load state of one startup component"""
+
+    def __init__(self, name: str, required: bool = True):
+        self.name = name
+        self.required = required
+        self.status = "pending"  # pending | loading | warming_up | ready | failed | disabled
+        self.instance = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error
+        }
+
+
+class StartupService:
+    """
+    Loads the independent models in parallel worker threads, warms them up and tracks
+    per-component readiness for the health endpoints
+
+    Load graph: image, embeddings, reranker, vector_store and llm load concurrently;
+    rag is assembled from them once they are done, then rag and image are warmed up.
+    """
+
+    def __init__(self):
+        self.components = {
+            "image": ComponentState("image"),
+            "embeddings": ComponentState("embeddings"),
+            # The service runs without re-ranking if the cross-encoder fails to load
+            "reranker": ComponentState("reranker", required=False),
+            "vector_store": ComponentState("vector_store"),
+            "llm": ComponentState("llm"),
+            "rag": ComponentState("rag"),
+        }
+        self.started_at = time.time()
+        self.process_started_at = psutil.Process().create_time()
+        self.cold_start_seconds = None
+        self.index_loaded = False
+        self.preloaded = False
+        self.pools = {}
+        self._task = None
+
+    def start(self):
+        """Start loading in the background (call from the app lifespan); only warms up if preloaded"""
+        if self._task is None:
+            work = self.warm_up_components() if self.preloaded else self.load_all()
+            self._task = asyncio.get_running_loop().create_task(work)
+        return self._task
+
+    def preload(self):
+        """
+        Load all components synchronously without warming up (serve.py master process)
+
+        Warm-up runs in each forked worker instead: it starts torch/OpenMP thread pools,
+        which must not exist before fork.
+        """
+        asyncio.run(self.load_components())
+        self.preloaded = True
+
+    def after_fork(self):
+        """Give a forked worker its own network clients; the loaded weights stay shared"""
+        for state in self.components.values():
+            if state.status == "ready" and hasattr(state.instance, "reconnect"):
+                state.instance.reconnect()
+        self._task = None
+
+    async def shutdown(self):
+        """Stop the inference worker processes (call from the app lifespan)"""
+        for pool in self.pools.values():
+            await asyncio.to_thread(pool.close)
+        self.pools = {}
+
+    def _start_pool(self, kind: str, size: int, **options):
+        from rag.inference_workers import InferencePool
+        pool = InferencePool(kind, size, **options).start()
+        self.pools[kind] = pool
+        return pool
+
+    async def _load(self, name: str, factory: Callable):
+        """Run a blocking constructor in a worker thread and record its state"""
+        state = self.components[name]
+        state.status = "loading"
+        start = time.perf_counter()
+        try:
+            state.instance = await asyncio.to_thread(factory)
+            state.status = "ready"
+        except Exception as e:
+            state.status = "failed"
+            state.error = str(e)
+            logger.exception(f"Failed to load component '{name}': {e}")
+        state.load_seconds = round(time.perf_counter() - start, 3)
+        COMPONENT_STARTUP.labels(component=name, phase="load").set(state.load_seconds)
+
+    async def _warm_up(self, name: str):
+        state = self.components[name]
+        if state.status != "ready" or not RagConfig.WARMUP_ON_STARTUP:
+            return
+        state.status = "warming_up"
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(state.instance.warm_up)
+        except Exception as e:
+            # A failed warm-up only costs latency on the first request
+            logger.warning(f"Warm-up of '{name}' failed: {e}")
+        state.warmup_seconds = round(time.perf_counter() - start, 3)
+        COMPONENT_STARTUP.labels(component=name, phase="warmup").set(state.warmup_seconds)
+        state.status = "ready"
+
+    async def load_all(self):
+        """Load every component, assemble the RAG pipeline and warm up"""
+        if cpu_budget.enabled:
+            cpu_budget.apply_process()
+        await self.load_components()
+        await self.warm_up_components()
+
+    async def load_components(self):
+        """Load every component and assemble the RAG pipeline"""
+        # Imported here so importing the app stays cheap (torch, sentence-transformers, ...)
+        from services.ImageService import ImageService
+        from services.RagService import RagService
+        from rag.embeddings import EmbeddingGenerator
+        from rag.reranker import CrossEncoderReranker
+        from rag.vector_store import FAISSVectorStore
+        from rag.qdrant_vector_store import QdrantVectorStore
+        from rag.llm import GeminiLLM
+
+        logger.info("Loading components in parallel...")
+
+        def load_vector_store():
+            vector_store = QdrantVectorStore() if RagConfig.USE_QDRANT else FAISSVectorStore()
+            self.index_loaded = vector_store.load_index()
+            return vector_store
+
+        def load_reranker():
+            return CrossEncoderReranker(
+                RagConfig.CROSS_ENCODER_MODEL,
+                first_stage_model_name=RagConfig.CASCADE_FIRST_STAGE_MODEL if RagConfig.USE_CASCADE_RERANK else None
+            )
+
+        load_image, load_embeddings = ImageService, EmbeddingGenerator
+
+        if RagConfig.USE_INFERENCE_WORKERS:
+            from rag.inference_workers import RemoteImageModel, RemoteSentenceTransformer, RemoteCrossEncoder
+
+            # Same classes, but the forward passes run in separate worker pools
+            def load_image():
+                return ImageService(model=RemoteImageModel(self._start_pool("image", RagConfig.INFERENCE_IMAGE_WORKERS)))
+
+            def load_embeddings():
+                return EmbeddingGenerator(model=RemoteSentenceTransformer(self._start_pool("embed", RagConfig.INFERENCE_EMBED_WORKERS)))
+
+            def load_reranker():
+                first_stage_model_name = RagConfig.CASCADE_FIRST_STAGE_MODEL if RagConfig.USE_CASCADE_RERANK else None
+                pool = self._start_pool(
+                    "rerank", RagConfig.INFERENCE_RERANK_WORKERS,
+                    model_name=RagConfig.CROSS_ENCODER_MODEL, first_stage_model_name=first_stage_model_name
+                )
+                return CrossEncoderReranker(
+                    RagConfig.CROSS_ENCODER_MODEL,
+                    first_stage_model_name=first_stage_model_name,
+                    model=RemoteCrossEncoder(pool),
+                    first_stage_model=RemoteCrossEncoder(pool, "first_stage") if first_stage_model_name else None
+                )
+
+        loads = [
+            self._load("image", load_image),
+            self._load("embeddings", load_embeddings),
+            self._load("vector_store", load_vector_store),
+            self._load("llm", GeminiLLM),
+        ]
+        if RagConfig.USE_RERANKING:
+            loads.append(self._load("reranker", load_reranker))
+        else:
+            self.components["reranker"].status = "disabled"
+        await asyncio.gather(*loads)
+
+        if self.components["reranker"].status == "failed":
+            logger.warning("Continuing without re-ranking")
+            RagConfig.USE_RERANKING = False
+
+        dependencies = ["embeddings", "vector_store", "llm"]
+        if all(self.components[name].status == "ready" for name in dependencies):
+            def build_rag():
+                rag_service = RagService(
+                    llm=self.components["llm"].instance,
+                    vector_store=self.components["vector_store"].instance,
+                    embedding_generator=self.components["embeddings"].instance,
+                    reranker=self.components["reranker"].instance
+                )
+                rag_service.is_indexed = self.index_loaded
+                if not self.index_loaded:
+                    logger.warning("No existing index found. Please run with --ingest first.")
+                return rag_service
+            await self._load("rag", build_rag)
+        else:
+            failed = [name for name in dependencies if self.components[name].status != "ready"]
+            self.components["rag"].status = "failed"
+            self.components["rag"].error = f"Dependencies failed: {', '.join(failed)}"
+
+    async def warm_up_components(self):
+        """Warm up the loaded components and record cold start time"""
+        await asyncio.gather(self._warm_up("rag"), self._warm_up("image"))
+
+        self.cold_start_seconds = round(time.time() - self.process_started_at, 3)
+        if self.is_ready():
+            COLD_START.set(self.cold_start_seconds)
+            logger.info(f"All components ready, cold start {self.cold_start_seconds}s", extra={"components": self.report()["components"]})
+        else:
+            logger.error("Startup finished with failed components", extra={"components": self.report()["components"]})
+
+    def is_ready(self) -> bool:
+        return (
+            all(state.status in ("ready", "disabled") for state in self.components.values() if state.required)
+            # A pool that gave up on all its workers cannot serve its model
+            and all(pool.available for pool in self.pools.values())
+        )
+
+    def require(self, name: str):
+        """
+        Get a loaded component or raise 503 while it is loading / after it failed
+
+        Args:
+            name: Component name
+
+        Returns:
+            The component instance
+        """
+        state = self.components[name]
+        if state.status != "ready":
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Component '{name}' is {state.status}",
+                headers={"Retry-After": "10"}
+            )
+        return state.instance
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "cold_start_seconds": self.cold_start_seconds,
+            "index_loaded": self.index_loaded,
+            "preloaded": self.preloaded,
+            "pid": os.getpid(),
+            "rss_mb": round(psutil.Process().memory_info().rss / 2**20, 1),
+            "components": {name: state.to_dict() for name, state in self.components.items()},
+            "inference_pools": {kind: pool.get_stats() for kind, pool in self.pools.items()},
+            "degraded": any(pool.degraded for pool in self.pools.values()),
+            "cpu_budget": cpu_budget.to_dict(),
+            "admission": admission_service.get_stats()
+        }
+
+
+startup_service = StartupService()
@@ -1,18 +1,82 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer, APIKeyCookie
 from utils.AuthUtlis import AuthUtils
+from utils.metrics import record_cache
 from pydantics.user import UserBase
 from config.database import db
 from dotenv import load_dotenv
-from datetime import timedelta
-from typing import Annotated
+from datetime import timedelta, timezone
+from typing import Annotated, Optional
+from cachetools import TTLCache
+from bson import ObjectId
 import os
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 
 load_dotenv()
 api_key_cookie = APIKeyCookie(name="access_token", auto_error=False)
 
+# User records by id, so most authenticated requests need no database round trip.
+# Per process: another worker sees a password change after at most USER_CACHE_TTL seconds
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# The password hash never enters the cache
+USER_PROJECTION = {"password": 0}
+
 class UserService:
+    async def get_user_by_id(user_id: str) -> Optional[dict]:
+        """User record (without password) from the TTL cache, loaded from MongoDB on a miss"""
+        user = user_cache.get(user_id)
+        if user is not None:
+            record_cache("user", 1, 0)
+            return user
+        record_cache("user", 0, 1)
+        try:
+            user = await db["users"].find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+        except Exception:
+            # Malformed id in a token signed with our key: treat as unknown user
+            return None
+        if user is not None:
+            user_cache[user_id] = user
+        return user
+    def invalidate_user(user_id) -> None:
+        """Drop a cached user record after it changed (password, role, deletion)"""
+        user_cache.pop(str(user_id), None)
+    def is_token_current(payload: dict, user: dict) -> bool:
+        """
+        False for tokens issued before the user's last password change
+
+        iat has whole-second precision, so the comparison is at second granularity: tokens
+        issued in the same second as the change (the session's re-issued cookies) are current.
+        Refresh tokens from that second are revoked separately (RefreshTokenService.revoke_user).
+        """
+        changed_at = user.get("password_changed_at")
+        if changed_at is None:
+            return True
+        return payload.get("iat", 0) >= int(changed_at.replace(tzinfo=timezone.utc).timestamp())
+    async def user_from_payload(payload: dict) -> Optional[dict]:
+        """
+        User a decoded token belongs to
+
+        Args:
+            payload: Verified JWT claims
+
+        Returns:
+            The user record, or None if it does not exist or the token was issued before a password change
+        """
+        user_id = payload.get("uid")
+        if user_id is None:
+            # Tokens issued before the uid claim existed
+            if payload.get("email") is None:
+                return None
+            user = await db["users"].find_one({"email": payload["email"]}, USER_PROJECTION)
+            if user is not None:
+                user_cache[str(user["_id"])] = user
+        else:
+            user = await UserService.get_user_by_id(user_id)
+        if user is None or not UserService.is_token_current(payload, user):
+            return None
+        return user
     async def get_current_user(access_token: Annotated[str, Depends(api_key_cookie)]) -> dict:
         # print("access_token",access_token)
         credentials_exception = HTTPException(
@@ -31,16 +95,38 @@ class UserService:
             )
         except (InvalidTokenError, Exception):
             raise credentials_exception
-            
-        email = payload.get("email")
-        
-        if email is None:
-            raise credentials_exception
 
-        user = await db["users"].find_one({"email": email})
+        user = await UserService.user_from_payload(payload)
 
         if user is None:
             raise credentials_exception
             
         # return UserBase(email=user['email'])
-        return user
\ No newline at end of file
+        return user
+    async def get_optional_user(access_token: Annotated[str, Depends(api_key_cookie)]) -> Optional[dict]:
+        """Logged-in user for endpoints that also serve anonymous clients: None instead of 401"""
+        if not access_token:
+            return None
+        try:
+            payload = AuthUtils.verify_token(access_token)
+        except Exception:
+            return None
+        return await UserService.user_from_payload(payload)
+    async def get_current_admin(current_user: Annotated[dict, Depends(get_current_user)]) -> dict:
+        if current_user.get("role") != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin privileges required",
+            )
+        return current_user
+    async def is_admin_token(access_token: str) -> bool:
+        """Cheap admin check for middleware: False for missing/invalid tokens instead of raising"""
+        if not access_token:
+            return False
+        try:
+            payload = AuthUtils.verify_token(access_token)
+        except Exception:
+            return False
+        # The role claim may be stale (demoted admin): use the cached user record instead
+        user = await UserService.user_from_payload(payload)
+        return user is not None and user.get("role") == "admin"
\ No newline at end of file
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# Tests import backend modules the way main.py does (config.*, rag.*, utils.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings read at import time; the client is never connected (see the mongo fixture)
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:1")
+os.environ.setdefault("DATABASE_NAME", "asksnake_test")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-with-enough-bytes-for-hs256")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_SECOND", "900")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_SECOND", "604800")
+# Cheap hashes: the work factor is not under test
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import config.database  # noqa: E402
+from mongomock.collection import BulkOperationBuilder  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+def _drop_sort(method):
+    # pymongo >= 4.11 passes sort= to bulk builders; mongomock does not know it yet
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+BulkOperationBuilder.add_update = _drop_sort(BulkOperationBuilder.add_update)
+BulkOperationBuilder.add_replace = _drop_sort(BulkOperationBuilder.add_replace)
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """In-memory MongoDB (mongomock) in place of config.database.db in every module that imported it"""
+    database = AsyncMongoMockClient()[os.environ["DATABASE_NAME"]]
+    real_db = config.database.db
+    for module in list(sys.modules.values()):
+        if getattr(module, "db", None) is real_db:
+            monkeypatch.setattr(module, "db", database)
+    return database
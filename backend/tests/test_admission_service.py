@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from services.AdmissionService import PRIORITY_HIGH, PRIORITY_NORMAL, AdmissionRejectedError, StageLimiter
+
+
+async def hold(limiter: StageLimiter, release: asyncio.Event, order: list = None, name: str = None, **kwargs):
+    async with limiter.admit(**kwargs):
+        if order is not None:
+            order.append(name)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_full_queue():
+    limiter = StageLimiter("test", max_concurrency=1, max_queue=1, max_wait=5)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(limiter, release))
+    queued = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+    assert (limiter.in_flight, limiter.waiting) == (1, 1)
+
+    with pytest.raises(AdmissionRejectedError) as error:
+        async with limiter.admit():
+            pass
+    assert error.value.status_code == 503
+    assert error.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert (limiter.in_flight, limiter.waiting) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_wait_longer_than_max_wait_is_rejected():
+    limiter = StageLimiter("test", max_concurrency=1, max_queue=5, max_wait=0.05)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejectedError) as error:
+        async with limiter.admit():
+            pass
+    assert error.value.status_code == 503
+    assert limiter.waiting == 0
+
+    release.set()
+    await running
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_per_client_limit_returns_429():
+    limiter = StageLimiter("test", max_concurrency=4, max_queue=4, max_wait=5, max_per_client=1)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(limiter, release, client_id="a"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejectedError) as error:
+        async with limiter.admit(client_id="a"):
+            pass
+    assert error.value.status_code == 429
+    # Other clients are not affected
+    async with limiter.admit(client_id="b"):
+        pass
+
+    release.set()
+    await running
+    async with limiter.admit(client_id="a"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_high_priority_waiters_are_served_first():
+    limiter = StageLimiter("test", max_concurrency=1, max_queue=5, max_wait=5)
+    gate, release = asyncio.Event(), asyncio.Event()
+    release.set()
+    order = []
+    running = asyncio.ensure_future(hold(limiter, gate))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.ensure_future(hold(limiter, release, order, "normal-1", priority=PRIORITY_NORMAL)),
+        asyncio.ensure_future(hold(limiter, release, order, "normal-2", priority=PRIORITY_NORMAL)),
+        asyncio.ensure_future(hold(limiter, release, order, "high", priority=PRIORITY_HIGH)),
+    ]
+    await asyncio.sleep(0)
+
+    gate.set()
+    await asyncio.gather(running, *waiters)
+
+    assert order == ["high", "normal-1", "normal-2"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_its_slot():
+    limiter = StageLimiter("test", max_concurrency=1, max_queue=5, max_wait=5)
+    release = asyncio.Event()
+    running = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+    cancelled = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    release.set()
+    await running
+    assert (limiter.in_flight, limiter.waiting) == (0, 0)
+    async with limiter.admit():
+        assert limiter.get_stats()["in_flight"] == 1
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from routers.auth_router import app_router as auth_router
+from services.UserService import UserService, user_cache
+from utils.AuthUtlis import AuthUtils
+
+
+def at_second(moment: datetime) -> int:
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+@pytest.mark.parametrize("iat_offset, current", [(-1, False), (0, True), (1, True)])
+def test_token_current_at_second_granularity(iat_offset, current):
+    # Changed late in the second: iat only has whole seconds
+    changed_at = datetime(2026, 1, 1, 12, 0, 0, 900000)
+    user = {"password_changed_at": changed_at}
+    payload = {"iat": at_second(changed_at) + iat_offset}
+    assert UserService.is_token_current(payload, user) is current
+
+
+def test_token_current_without_password_change_or_iat():
+    assert UserService.is_token_current({"iat": 0}, {}) is True
+    assert UserService.is_token_current({}, {"password_changed_at": datetime(2026, 1, 1)}) is False
+
+
+async def add_user(mongo, role: str = "user") -> dict:
+    user = {
+        "email": f"{role}@example.com",
+        "password": AuthUtils.hash_password("old-password"),
+        "role": role,
+        "create_at": datetime.utcnow()
+    }
+    user["_id"] = (await mongo["users"].insert_one(user)).inserted_id
+    return user
+
+
+@pytest.mark.asyncio
+async def test_admin_token_follows_the_stored_role(mongo):
+    user = await add_user(mongo, role="admin")
+    token = AuthUtils.create_token(data=AuthUtils.user_claims(user), expires_delta=900)
+    assert await UserService.is_admin_token(token) is True
+
+    # Demoted: the role claim still says admin
+    await mongo["users"].update_one({"_id": user["_id"]}, {"$set": {"role": "user"}})
+    UserService.invalidate_user(user["_id"])
+    assert await UserService.is_admin_token(token) is False
+    assert await UserService.is_admin_token(None) is False
+    assert await UserService.is_admin_token("not-a-jwt") is False
+
+
+def test_update_password_keeps_the_session_and_revokes_old_tokens(mongo):
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+
+    @app.get("/me")
+    async def me(current_user: dict = Depends(UserService.get_current_user)):
+        return {"email": current_user["email"]}
+
+    asyncio.run(add_user(mongo))
+    with TestClient(app) as client:
+        assert client.post("/auth/login", json={"email": "user@example.com", "password": "old-password"}).status_code == 200
+        old_refresh = client.cookies.get("refresh_token")
+
+        response = client.post("/auth/update-password", json={"old_password": "old-password", "new_password": "new-password", "confirm_new_password": "new-password"})
+        assert response.status_code == 201
+        # Issued right after password_changed_at, usually within the same second: accepted
+        assert client.get("/me").json() == {"email": "user@example.com"}
+        assert client.cookies.get("refresh_token") != old_refresh
+        assert client.post("/auth/refresh-token").status_code == 200
+
+        client.cookies.set("refresh_token", old_refresh)
+        assert client.post("/auth/refresh-token").status_code == 401
+        assert client.post("/auth/login", json={"email": "user@example.com", "password": "old-password"}).status_code == 401
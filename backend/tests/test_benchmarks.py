@@ -0,0 +1,66 @@
+import argparse
+import json
+
+import pytest
+
+from benchmarks.compare import case_key, case_value, change
+from benchmarks.reporting import run_metadata, summarize, write_results
+from benchmarks.stubs import StubLLM, build_labeled_questions, build_synthetic_corpus
+from config.rag_config import RagConfig
+
+
+def test_summarize_percentiles():
+    summary = summarize([float(value) for value in range(1, 101)])
+    assert summary["count"] == 100
+    assert summary["mean"] == 50.5
+    assert summary["p50"] == 50.5
+    assert summary["p95"] == pytest.approx(95.05)
+    assert summary["max"] == 100.0
+    assert summarize([]) == {"count": 0}
+
+
+def test_write_results_round_trip(tmp_path):
+    args = argparse.Namespace(concurrency=8, mode="text")
+    report = {"meta": run_metadata(args), "latency_ms": {"total": summarize([1.0, 2.0])}}
+
+    path = write_results(report, "load_test", str(tmp_path / "run.json"))
+
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == report
+    assert report["meta"]["args"] == {"concurrency": 8, "mode": "text"}
+
+
+def test_compare_helpers():
+    assert change(100, 80) == "-20.0%"
+    assert change(0, 5) == "n/a"
+    microbench = {"name": "chunk", "params": {"size": 2}, "wall_ms": {"median": 3.0}}
+    assert case_key(microbench) == 'chunk {"size": 2}'
+    assert case_value(microbench) == 3.0
+    evaluation = {
+        "chunk_scale": 1.0, "backend": "faiss", "index_type": "flat", "rerank_top_k": 15, "final_top_k": 5,
+        "alpha": 0.7, "latency_ms": {"total": {"p95": 12.0}}
+    }
+    assert case_key(evaluation) == "x1.0 faiss:flat rk=15 k=5 a=0.7"
+    assert case_value(evaluation) == 12.0
+
+
+def test_synthetic_corpus_is_deterministic_and_labeled():
+    documents = build_synthetic_corpus(12)
+    assert documents == build_synthetic_corpus(12)
+    assert all(set(RagConfig.FIELD_CHUNK_CONFIG) <= set(document) for document in documents)
+
+    names = {document["name_vn"] for document in documents}
+    labeled = build_labeled_questions(documents, 20)
+    assert len(labeled) == 20
+    for item in labeled:
+        label = item["relevant"][0]
+        assert label["species"] in names
+        assert label["species"] in item["question"]
+        assert label["field"] in RagConfig.FIELD_CHUNK_CONFIG
+
+
+@pytest.mark.asyncio
+async def test_stub_llm_answers_without_api():
+    llm = StubLLM(latency=0, jitter=0, response_words=5)
+    assert len((await llm.agenerate("prompt")).split()) == 5
+    assert llm.generate_response("question", ["context"]) == llm.response
@@ -0,0 +1,39 @@
+import pytest
+
+from utils.bloom import BloomFilter
+
+
+def test_added_keys_are_always_found():
+    bloom = BloomFilter(1000)
+    keys = [f"user:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    # str and its UTF-8 bytes are the same key
+    assert b"user:1" in bloom
+
+
+def test_false_positive_rate_near_target_at_capacity():
+    bloom = BloomFilter(2000, error_rate=0.01)
+    for i in range(2000):
+        bloom.add(f"revoked:{i}".encode())
+    false_positives = sum(f"live:{i}".encode() in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_is_full_at_capacity():
+    bloom = BloomFilter(3)
+    assert "anything" not in bloom
+    for key in ("a", "b"):
+        bloom.add(key)
+    assert not bloom.is_full()
+    bloom.add("c")
+    assert bloom.is_full()
+
+
+@pytest.mark.parametrize("capacity", [1, 10, 100000])
+def test_sizing(capacity):
+    bloom = BloomFilter(capacity)
+    assert bloom.size >= 8
+    assert bloom.hash_count >= 1
+    assert len(bloom.bits) * 8 >= bloom.size
@@ -0,0 +1,55 @@
+import pytest
+
+from rag.context_assembler import ContextAssembler
+
+
+@pytest.fixture
+def assembler():
+    return ContextAssembler(token_budget=1000, chars_per_token=1.0, min_section_tokens=10, field_names=["Đặc điểm", "Sơ cứu"])
+
+
+def words(start: int, end: int) -> str:
+    return " ".join(f"w{i}" for i in range(start, end))
+
+
+def test_split_prefix(assembler):
+    assert assembler.split_prefix("Naja kaouthia - Sơ cứu: băng ép") == ("Naja kaouthia", "Sơ cứu", "băng ép")
+    assert assembler.split_prefix("không có tiền tố") == (None, None, "không có tiền tố")
+
+
+def test_overlapping_and_contained_chunks_of_one_source_are_merged(assembler):
+    chunks = [
+        f"Naja - Đặc điểm: {words(0, 20)}",
+        "Naja - Sơ cứu: băng ép",
+        # Continues the first chunk with a 6-word overlap, listed before the piece it follows
+        f"Naja - Đặc điểm: {words(14, 30)}",
+        f"Naja - Đặc điểm: {words(3, 9)}",
+    ]
+    sections, stats = assembler.assemble(chunks)
+    assert sections == [f"Naja - Đặc điểm: {words(0, 30)}", "Naja - Sơ cứu: băng ép"]
+    assert stats["merged_chunks"] == 2
+    assert not stats["truncated"]
+
+
+def test_short_overlaps_and_other_sources_stay_separate(assembler):
+    # A 4-word overlap is below CONTEXT_MIN_OVERLAP_WORDS
+    chunks = [f"Naja - Đặc điểm: {words(0, 10)}", f"Naja - Đặc điểm: {words(6, 16)}", f"Bungarus - Đặc điểm: {words(0, 10)}"]
+    sections, stats = assembler.assemble(chunks)
+    assert sections == [f"Naja - Đặc điểm: {words(0, 10)} [...] {words(6, 16)}", f"Bungarus - Đặc điểm: {words(0, 10)}"]
+    assert stats["merged_chunks"] == 0
+
+
+def test_sections_are_packed_in_rank_order_and_the_last_one_truncated(assembler):
+    chunks = ["a" * 40, "b " * 30, "c" * 40]
+    sections, stats = assembler.assemble(chunks, token_budget=60)
+    assert sections[0] == "a" * 40
+    # 20 tokens left: the second section is cut at a word boundary
+    assert sections[1].endswith(" ...") and len(sections[1]) <= 24
+    assert len(sections) == 2
+    assert stats["truncated"] and stats["context_tokens_estimate"] <= 60
+
+
+def test_remainder_below_the_minimum_section_is_dropped(assembler):
+    sections, stats = assembler.assemble(["a" * 55, "b " * 30], token_budget=60)
+    assert sections == ["a" * 55]
+    assert stats["truncated"] and stats["context_tokens_estimate"] == 55
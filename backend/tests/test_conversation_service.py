@@ -0,0 +1,152 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from config.rag_config import RagConfig
+from services.ConversationService import ConversationService, before_cursor, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def service(mongo):
+    return ConversationService()
+
+
+@pytest.mark.asyncio
+async def test_turns_are_written_in_bulk(service, mongo):
+    user_id = ObjectId()
+    conversation_id = service.new_conversation_id()
+    service.record_turn(user_id, conversation_id, "Rắn hổ mang có độc không?", "Có.")
+    service.record_turn(user_id, conversation_id, "Sơ cứu thế nào?", "Băng ép.")
+    assert await mongo["messages"].count_documents({}) == 0
+
+    await service.flush()
+
+    conversation = await mongo["conversations"].find_one({"_id": ObjectId(conversation_id)})
+    assert conversation["message_count"] == 4
+    assert conversation["title"] == "Rắn hổ mang có độc không?"
+    assert conversation["last_message_preview"] == "Băng ép."
+    assert await mongo["messages"].count_documents({"conversation_id": ObjectId(conversation_id)}) == 4
+
+
+@pytest.mark.asyncio
+async def test_dropped_messages_are_not_counted(service, mongo, monkeypatch):
+    monkeypatch.setattr(RagConfig, "CHAT_HISTORY_MAX_PENDING", 4)
+    user_id = ObjectId()
+    old, new = service.new_conversation_id(), service.new_conversation_id()
+    service.record_turn(user_id, old, "q1", "a1")
+    service.record_turn(user_id, new, "q2", "a2")
+    service.record_turn(user_id, new, "q3", "a3")
+
+    await service.flush()
+
+    # The first turn was dropped: its conversation is not written at all
+    assert await mongo["conversations"].find_one({"_id": ObjectId(old)}) is None
+    conversation = await mongo["conversations"].find_one({"_id": ObjectId(new)})
+    stored = await mongo["messages"].count_documents({"conversation_id": ObjectId(new)})
+    assert conversation["message_count"] == stored == 4
+
+
+@pytest.mark.asyncio
+async def test_partly_dropped_conversation_keeps_an_exact_count(service, mongo, monkeypatch):
+    monkeypatch.setattr(RagConfig, "CHAT_HISTORY_MAX_PENDING", 5)
+    user_id = ObjectId()
+    conversation_id = service.new_conversation_id()
+    for i in range(3):
+        service.record_turn(user_id, conversation_id, f"q{i}", f"a{i}")
+
+    await service.flush()
+
+    conversation = await mongo["conversations"].find_one({"_id": ObjectId(conversation_id)})
+    assert conversation["message_count"] == await mongo["messages"].count_documents({}) == 5
+
+
+@pytest.mark.asyncio
+async def test_ownership_of_buffered_written_and_unknown_conversations(service, mongo):
+    owner, other = ObjectId(), ObjectId()
+    conversation_id = service.new_conversation_id()
+    service.record_turn(owner, conversation_id, "q", "a")
+    assert await service.is_owner(owner, conversation_id)
+    assert not await service.is_owner(other, conversation_id)
+
+    await service.flush()
+    fresh = ConversationService()
+    assert await fresh.is_owner(owner, conversation_id)
+    assert not await fresh.is_owner(other, conversation_id)
+    assert not await fresh.is_owner(owner, str(ObjectId()))
+    with pytest.raises(ValueError):
+        await fresh.is_owner(owner, "not-an-id")
+
+
+@pytest.mark.asyncio
+async def test_deleted_conversation_is_no_longer_owned(service, mongo):
+    owner = ObjectId()
+    conversation_id = service.new_conversation_id()
+    service.record_turn(owner, conversation_id, "q", "a", asked_at=datetime.utcnow())
+    assert await service.delete_conversation(owner, conversation_id)
+    assert not await service.is_owner(owner, conversation_id)
+    assert await mongo["messages"].count_documents({}) == 0
+
+
+def test_cursor_round_trip_and_malformed_cursor():
+    timestamp, document_id = datetime(2026, 1, 1, 12, 0, 0, 123000), ObjectId()
+    assert decode_cursor(encode_cursor(timestamp, document_id)) == (timestamp, document_id)
+    for cursor in ("", "!!!", encode_cursor(timestamp, document_id)[:-4], "MTIzOm5vdC1hbi1pZA"):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_before_cursor_breaks_timestamp_ties_by_id():
+    timestamp, document_id = datetime(2026, 1, 1), ObjectId()
+    assert before_cursor("create_at", None) == {}
+    assert before_cursor("create_at", encode_cursor(timestamp, document_id)) == {
+        "$or": [{"create_at": {"$lt": timestamp}}, {"create_at": timestamp, "_id": {"$lt": document_id}}]
+    }
+
+
+@pytest.mark.asyncio
+async def test_message_pages_have_no_gaps_or_duplicates(service, mongo):
+    user_id = ObjectId()
+    conversation_id = service.new_conversation_id()
+    # Every question asked in the same millisecond: only _id orders them
+    asked_at = datetime(2026, 1, 1, 12, 0, 0)
+    for i in range(5):
+        service.record_turn(user_id, conversation_id, f"q{i}", f"a{i}", asked_at=asked_at)
+    await service.flush()
+
+    pages, cursor = [], None
+    while True:
+        page = await service.list_messages(user_id, conversation_id, limit=3, cursor=cursor)
+        pages.append([message["content"] for message in page["messages"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # Newest page first, each page oldest first
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    contents = [content for page in reversed(pages) for content in page]
+    expected = await mongo["messages"].find({}).sort([("create_at", 1), ("_id", 1)]).to_list(None)
+    assert contents == [message["content"] for message in expected]
+    assert sorted(contents) == sorted([f"q{i}" for i in range(5)] + [f"a{i}" for i in range(5)])
+
+
+@pytest.mark.asyncio
+async def test_conversation_pages_follow_updated_at_then_id(service, mongo):
+    user_id, other = ObjectId(), ObjectId()
+    updated_at = datetime(2026, 1, 1)
+    documents = [
+        {"_id": ObjectId(), "user_id": user_id, "title": f"c{i}", "message_count": 2, "create_at": updated_at, "updated_at": updated_at}
+        for i in range(4)
+    ]
+    documents.append({"_id": ObjectId(), "user_id": other, "title": "other", "create_at": updated_at, "updated_at": updated_at})
+    await mongo["conversations"].insert_many(documents)
+
+    first = await service.list_conversations(user_id, limit=2)
+    second = await service.list_conversations(user_id, limit=2, cursor=first["next_cursor"])
+    assert first["next_cursor"] is not None
+    assert second["next_cursor"] is None
+    titles = [conversation["title"] for conversation in first["conversations"] + second["conversations"]]
+    assert titles == ["c3", "c2", "c1", "c0"]
+
+    with pytest.raises(ValueError):
+        await service.list_conversations(user_id, cursor="not-a-cursor")
@@ -0,0 +1,192 @@
+import pytest
+from bson import ObjectId
+
+from rag.conversation_state import ConversationState, EntityLexicon, chunk_entity, normalize_name
+from services.ConversationService import ConversationService
+
+
+@pytest.fixture
+def lexicon():
+    return EntityLexicon(["Naja kaouthia", "Naja", "Bungarus candidus", "Trimeresurus albolabris"])
+
+
+def chunk(name: str, text: str = "mô tả") -> str:
+    return f"{name} - Đặc điểm: {text}"
+
+
+def test_normalize_name_folds_case_diacritics_and_underscores():
+    assert normalize_name("Rắn_Hổ  Mang Đất") == "ran ho mang dat"
+
+
+def test_chunk_entity():
+    assert chunk_entity(chunk("Naja kaouthia")) == "Naja kaouthia"
+    assert chunk_entity("no separator here") is None
+
+
+def test_names_next_to_punctuation_are_found(lexicon):
+    assert lexicon.find("Còn Naja kaouthia?") == ["Naja kaouthia", "Naja"]
+    assert lexicon.find("(bungarus candidus), nguy hiểm!") == ["Bungarus candidus"]
+
+
+def test_lexicon_lists_longest_name_first(lexicon):
+    assert lexicon.find("naja kaouthia có độc không?") == ["Naja kaouthia", "Naja"]
+    assert lexicon.find("Rắn NAJA ở đâu") == ["Naja"]
+
+
+def test_question_naming_a_snake_is_not_a_follow_up(lexicon):
+    state = ConversationState(entities=["Naja kaouthia"])
+    assert not state.is_follow_up("Bungarus candidus có độc không?", lexicon)
+    # A snake of this conversation that the lexicon does not know yet
+    state = ConversationState(entities=["Rắn lục đuôi đỏ"])
+    assert not state.is_follow_up("rắn lục đuôi đỏ sống ở đâu?", lexicon)
+
+
+def test_follow_up_queries_carry_the_focus(lexicon):
+    state = ConversationState(entities=["Naja kaouthia"])
+    assert state.is_follow_up("còn cách sơ cứu thì sao?", lexicon)
+    assert state.retrieval_query("còn cách sơ cứu thì sao?", lexicon) == "Naja kaouthia - còn cách sơ cứu thì sao?"
+    assert state.prompt_question("còn cách sơ cứu thì sao?", lexicon).startswith("còn cách sơ cứu thì sao?\n")
+
+
+def test_queries_are_unchanged_without_focus_or_with_a_named_snake(lexicon):
+    assert ConversationState().retrieval_query("cách sơ cứu?", lexicon) == "cách sơ cứu?"
+    state = ConversationState(entities=["Naja kaouthia"])
+    assert state.retrieval_query("Bungarus candidus sống ở đâu?", lexicon) == "Bungarus candidus sống ở đâu?"
+
+
+def test_prediction_becomes_the_focus():
+    state = ConversationState(entities=["Naja kaouthia"])
+    state.observe_prediction("Bungarus_candidus")
+    assert state.species == "Bungarus candidus"
+    assert state.focus == "Bungarus candidus"
+    assert state.entities == ["Bungarus candidus", "Naja kaouthia"]
+
+
+def test_update_pushes_mentioned_snakes_and_learns_chunk_names(lexicon):
+    state = ConversationState(entities=["Naja kaouthia"])
+    state.update("Trimeresurus albolabris có độc không?", [chunk("Rắn lục mép trắng")], lexicon)
+    assert state.focus == "Trimeresurus albolabris"
+    assert state.turns == 1
+    assert lexicon.find("rắn lục mép trắng") == ["Rắn lục mép trắng"]
+
+
+def test_first_unnamed_question_takes_the_answer_topic(lexicon):
+    state = ConversationState()
+    state.update("loài nào nguy hiểm nhất?", [chunk("Bungarus candidus"), chunk("Naja")], lexicon)
+    assert state.focus == "Bungarus candidus"
+
+
+def test_entities_are_capped():
+    state = ConversationState()
+    for i in range(10):
+        state.observe_prediction(f"snake_{i}")
+    assert len(state.entities) == 5
+    assert state.focus == "snake 9"
+
+
+def test_round_trip():
+    state = ConversationState("Naja kaouthia", ["Naja kaouthia", "Naja"], 3)
+    restored = ConversationState.from_dict(state.to_dict())
+    assert restored.to_dict() == state.to_dict()
+
+
+def test_copies_merge_without_losing_turns(lexicon):
+    shared = ConversationState(entities=["Naja kaouthia"])
+    first, second = shared.copy(), shared.copy()
+    first.observe_prediction("Bungarus_candidus")
+    second.update("Trimeresurus albolabris thì sao?", [], lexicon)
+    # The copies do not see each other, the shared state is untouched until merged
+    assert shared.entities == ["Naja kaouthia"]
+
+    assert first.merge_into() is shared
+    assert second.merge_into() is shared
+    assert shared.turns == 1
+    assert shared.entities == ["Trimeresurus albolabris", "Bungarus candidus", "Naja kaouthia"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_of_one_conversation_are_both_kept(mongo, lexicon):
+    service = ConversationService()
+    user_id = ObjectId()
+    conversation_id = service.new_conversation_id()
+    state = await service.get_state(user_id, conversation_id)
+    state.update("Naja kaouthia?", [], lexicon)
+    service.record_turn(user_id, conversation_id, "Naja kaouthia?", "...", state=state)
+
+    # Two requests read the state before either records its turn
+    first = await service.get_state(user_id, conversation_id)
+    second = await service.get_state(user_id, conversation_id)
+    first.observe_prediction("Bungarus_candidus")
+    first.update("", [], lexicon)
+    # The other request keeps answering about what the conversation was on when it started
+    assert second.focus == "Naja kaouthia"
+    second.update("Trimeresurus albolabris thì sao?", [], lexicon)
+    service.record_turn(user_id, conversation_id, "", "Bungarus candidus", state=first)
+    service.record_turn(user_id, conversation_id, "Trimeresurus albolabris thì sao?", "...", state=second)
+
+    state = await service.get_state(user_id, conversation_id)
+    assert state.turns == 3
+    assert state.entities[:3] == ["Trimeresurus albolabris", "Bungarus candidus", "Naja kaouthia"]
+    await service.flush()
+    stored = await mongo["conversations"].find_one({"_id": ObjectId(conversation_id)})
+    assert stored["state"]["turns"] == 3
+
+
+@pytest.mark.asyncio
+async def test_other_users_state_is_not_shared(mongo):
+    service = ConversationService()
+    owner, other = ObjectId(), ObjectId()
+    conversation_id = service.new_conversation_id()
+    state = await service.get_state(owner, conversation_id)
+    state.observe_prediction("Naja_kaouthia")
+    service.record_turn(owner, conversation_id, "", "Naja kaouthia", state=state)
+    assert (await service.get_state(other, conversation_id)).focus is None
+
+
+def test_missing_state_is_empty():
+    state = ConversationState.from_dict(None)
+    assert (state.focus, state.entities, state.turns) == (None, [], 0)
+
+
+@pytest.mark.asyncio
+async def test_state_is_loaded_from_the_stored_conversation(mongo, lexicon):
+    service = ConversationService()
+    user_id = ObjectId()
+    conversation_id = service.new_conversation_id()
+    state = await service.get_state(user_id, conversation_id)
+    state.observe_prediction("Naja_kaouthia")
+    state.update("", [], lexicon)
+    service.record_turn(user_id, conversation_id, "", "Naja kaouthia", state=state)
+    await service.flush()
+    stored = await mongo["conversations"].find_one({"_id": ObjectId(conversation_id)})
+
+    # A restarted process has no cached state: it is read once from the conversation document
+    restarted = ConversationService()
+    loaded = await restarted.get_state(user_id, conversation_id)
+    assert loaded.to_dict() == stored["state"]
+    assert loaded.focus == "Naja kaouthia"
+    assert (await restarted.get_state(ObjectId(), conversation_id)).focus is None
+
+    loaded.update("Cách sơ cứu?", [], lexicon)
+    restarted.record_turn(user_id, conversation_id, "Cách sơ cứu?", "...", state=loaded)
+    await restarted.flush()
+    stored = await mongo["conversations"].find_one({"_id": ObjectId(conversation_id)})
+    assert stored["state"]["turns"] == 2
+    assert stored["state"]["entities"][0] == "Naja kaouthia"
+    assert stored["message_count"] == 4
+
+
+@pytest.mark.asyncio
+async def test_state_falls_back_to_empty_when_the_database_fails(mongo, monkeypatch):
+    service = ConversationService()
+    user_id, conversation = ObjectId(), ObjectId()
+    await mongo["conversations"].insert_one({"_id": conversation, "user_id": user_id, "state": {"species": "Naja kaouthia", "turns": 1}})
+
+    async def find_one(*args, **kwargs):
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(type(mongo["conversations"]), "find_one", find_one)
+    # The request is answered without the conversation context
+    state = await service.get_state(user_id, str(conversation))
+    assert state.to_dict() == ConversationState().to_dict()
+    assert (await service.get_state(ObjectId(), None)).turns == 0
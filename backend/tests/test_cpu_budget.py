@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+from config.rag_config import RagConfig
+from utils import cpu_budget as cpu_budget_module
+from utils.cpu_budget import CpuBudget, available_cpus, blas_env, cgroup_cpu_limit
+
+
+def fake_files(monkeypatch, files: dict):
+    def fake_open(path, *args, **kwargs):
+        if path not in files:
+            raise FileNotFoundError(path)
+        return io.StringIO(files[path])
+    monkeypatch.setattr(cpu_budget_module, "open", fake_open, raising=False)
+
+
+def test_budget_splits_cpus_by_weight():
+    budget = CpuBudget(cpus=8, weights={"image": 2, "embed": 1, "rerank": 1}, overrides={})
+    assert budget.threads == {"image": 4, "embed": 2, "rerank": 2}
+    assert budget.threads_for("image", workers=2) == 2
+    assert budget.threads_for("embed", workers=4) == 1
+
+
+def test_budget_overrides_and_minimum_of_one_thread():
+    budget = CpuBudget(cpus=2, weights={"image": 1, "embed": 1, "rerank": 1}, overrides={"rerank": 3})
+    assert budget.threads == {"image": 1, "embed": 1, "rerank": 3}
+
+
+def test_limit_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(RagConfig, "CPU_THREAD_BUDGET", None)
+    budget = CpuBudget(cpus=4)
+    with budget.limit("image"):
+        pass
+    assert budget.to_dict()["enabled"] is False
+
+
+@pytest.mark.parametrize("files, expected", [
+    ({"/sys/fs/cgroup/cpu.max": "150000 100000\n"}, 1.5),
+    ({"/sys/fs/cgroup/cpu.max": "max 100000\n"}, None),
+    ({"/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "200000", "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000"}, 2.0),
+    ({"/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "-1", "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000"}, None),
+    ({}, None),
+])
+def test_cgroup_cpu_limit(monkeypatch, files, expected):
+    fake_files(monkeypatch, files)
+    assert cgroup_cpu_limit() == expected
+
+
+def test_available_cpus_respects_affinity_and_quota(monkeypatch):
+    monkeypatch.setattr(cpu_budget_module.os, "sched_getaffinity", lambda pid: set(range(16)), raising=False)
+    fake_files(monkeypatch, {"/sys/fs/cgroup/cpu.max": "250000 100000"})
+    assert available_cpus() == 3
+
+    fake_files(monkeypatch, {})
+    assert available_cpus() == 16
+
+
+def test_blas_env():
+    assert blas_env(3) == {"OMP_NUM_THREADS": "3", "MKL_NUM_THREADS": "3", "OPENBLAS_NUM_THREADS": "3"}
@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from config.rag_config import RagConfig
+from utils import deadline as deadline_module
+from utils.deadline import Deadline, LatencyEstimator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(deadline_module.time, "monotonic", clock)
+    return clock
+
+
+def test_remaining_and_expiry(clock):
+    deadline = Deadline(2.0)
+    assert deadline.remaining() == 2.0
+    clock.now += 1.5
+    assert deadline.remaining() == pytest.approx(0.5)
+    assert not deadline.expired()
+    clock.now += 0.5
+    assert deadline.expired()
+    assert deadline.to_dict() == {"budget_ms": 2000, "elapsed_ms": 2000.0}
+
+
+def test_no_deadline_never_expires(clock):
+    deadline = Deadline(None)
+    clock.now += 1e6
+    assert deadline.remaining() == math.inf
+    assert not deadline.expired()
+    assert deadline.to_dict()["budget_ms"] is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, 10.0),
+    ("3000", 3.0),
+    # The client can only shorten the server budget
+    ("60000", 10.0),
+    ("0", 10.0),
+    ("-5", 10.0),
+    ("soon", 10.0),
+])
+def test_header_tightens_the_server_budget(monkeypatch, header, expected):
+    monkeypatch.setattr(RagConfig, "REQUEST_DEADLINE", 10.0)
+    assert Deadline.from_header(header).budget == expected
+
+
+def test_header_applies_without_server_budget(monkeypatch):
+    monkeypatch.setattr(RagConfig, "REQUEST_DEADLINE", None)
+    assert Deadline.from_header("1500").budget == 1.5
+    assert Deadline.from_header(None).budget is None
+
+
+def test_latency_estimator_ewma():
+    estimator = LatencyEstimator({"rerank": 1.0}, smoothing=0.5)
+    assert estimator.estimate("rerank") == 1.0
+    assert estimator.estimate("unknown") == 0.0
+
+    estimator.observe("rerank", 3.0)
+    assert estimator.estimate("rerank") == 2.0
+    # First observation of a stage without default is taken as is
+    estimator.observe("llm", 4.0)
+    assert estimator.estimate("llm") == 4.0
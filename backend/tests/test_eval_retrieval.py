@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+import pytest
+
+from benchmarks.eval_retrieval import (
+    RelevanceJudge,
+    fit_fusion,
+    normalize_labels,
+    recommend,
+    scaled_chunk_config,
+    score_ranking,
+)
+from config.rag_config import RagConfig
+
+TOXICITY = "Độc tính"
+HABITAT = "Phân bố địa lý và môi trường sống"
+
+
+def chunk(species: str, field: str, body: str = "nội dung") -> str:
+    return f"{species} - {field}: {body}"
+
+
+def test_labels_accept_both_formats():
+    assert normalize_labels({"relevant": [{"species": " Rắn Lục ", "field": TOXICITY}]}) == [("rắn lục", TOXICITY)]
+    assert normalize_labels({"species": "Rắn Lục"}) == [("rắn lục", None)]
+
+
+def test_judge_matches_species_and_optional_field():
+    judge = RelevanceJudge()
+    labels = [("rắn lục", TOXICITY), ("rắn hổ", None)]
+    assert judge.matching_labels(chunk("Rắn Lục", TOXICITY), labels) == [0]
+    assert judge.matching_labels(chunk("Rắn Lục", HABITAT), labels) == []
+    assert judge.matching_labels(chunk("Rắn Hổ", HABITAT), labels) == [1]
+    assert judge.matching_labels("no prefix at all", labels) == []
+
+
+def test_score_ranking_recall_mrr_ndcg():
+    judge = RelevanceJudge()
+    labels = [("rắn lục", TOXICITY), ("rắn hổ", TOXICITY)]
+    ranked = [chunk("Rắn Ráo", TOXICITY), chunk("Rắn Lục", TOXICITY), chunk("Rắn Lục", TOXICITY)]
+
+    scores = score_ranking(ranked, labels, total_relevant=3, k=3, judge=judge)
+
+    assert scores["recall"] == 0.5
+    assert scores["mrr"] == 0.5
+    dcg = 1 / math.log2(3) + 1 / math.log2(4)
+    ideal = 1 + 1 / math.log2(3) + 1 / math.log2(4)
+    assert scores["ndcg"] == pytest.approx(dcg / ideal)
+
+
+def test_recommend_picks_fastest_within_tolerance():
+    def result(ndcg, recall, p95):
+        return {"quality": {"ndcg": ndcg, "recall": recall}, "latency_ms": {"total": {"p95": p95}}}
+
+    best, close, fast_but_worse = result(0.9, 0.9, 100), result(0.895, 0.9, 40), result(0.7, 0.9, 10)
+
+    recommendation = recommend([best, close, fast_but_worse], tolerance=0.01)
+
+    assert recommendation["config"] is close
+    assert recommend([], 0.01) == {}
+
+
+def test_scaled_chunk_config_is_restored():
+    original = RagConfig.FIELD_CHUNK_CONFIG
+    with scaled_chunk_config(2.0):
+        field, config = next(iter(RagConfig.FIELD_CHUNK_CONFIG.items()))
+        assert config["chunk_size"] == original[field]["chunk_size"] * 2
+    assert RagConfig.FIELD_CHUNK_CONFIG is original
+
+
+class KeywordReranker:
+    """Cross-encoder stand-in: high score when the body says "đúng\""""
+
+    def predict_scores(self, query, passages):
+        return np.array([3.0 if passage.endswith("đúng") else 0.0 for passage in passages], dtype=np.float32)
+
+
+def test_fit_fusion_learns_from_labeled_candidates():
+    judge = RelevanceJudge()
+    rng = np.random.default_rng(1)
+    questions, hits, labels = [], [], []
+    for i in range(30):
+        texts = [chunk(f"Rắn {j}", TOXICITY, "đúng" if j == i % 5 else "sai") for j in range(5)]
+        hits.append((texts, rng.random(5).tolist()))
+        labels.append([(f"rắn {i % 5}", TOXICITY)])
+        questions.append(f"câu hỏi {i}")
+
+    fitted = fit_fusion(KeywordReranker(), questions, hits, labels, judge)
+
+    assert fitted["candidates"] == 150
+    assert fitted["relevant"] == 30
+    assert fitted["weights"][0] > abs(fitted["weights"][1])
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from rag.fusion import LearnedFusion, LinearFusion, min_max_normalize
+
+
+def test_min_max_keeps_equal_scores():
+    assert min_max_normalize(np.array([0.4, 0.4])).tolist() == pytest.approx([0.4, 0.4])
+    assert min_max_normalize(np.array([1.0, 3.0, 2.0])).tolist() == [0.0, 1.0, 0.5]
+
+
+def test_linear_fusion_of_equal_dense_scores_follows_cross_encoder():
+    fused = LinearFusion([0.7, 0.3], "minmax").fuse([np.array([2.0, 4.0]), np.array([0.5, 0.5])])
+    assert fused.tolist() == pytest.approx([0.15, 0.85])
+
+
+def test_learned_fusion_fit_weights_the_informative_signal():
+    rng = np.random.default_rng(0)
+    queries, labels = [], []
+    for _ in range(50):
+        relevant = (rng.random(15) < 0.2).astype(np.float32)
+        # Only the first signal separates relevant candidates
+        queries.append([relevant * 2 + rng.normal(0, 1, 15), rng.normal(0, 1, 15)])
+        labels.append(relevant)
+
+    fusion = LearnedFusion.fit(queries, labels)
+
+    assert fusion.weights[0] > 1.0
+    assert abs(fusion.weights[1]) < 0.3
+    scores = fusion.fuse(queries[0])
+    assert scores[labels[0] == 1].mean() > scores[labels[0] == 0].mean()
+
+
+def test_learned_fusion_fit_needs_both_classes():
+    with pytest.raises(ValueError):
+        LearnedFusion.fit([[np.ones(3), np.ones(3)]], [np.zeros(3)])
@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+import pytest
+
+from config.rag_config import RagConfig
+from multiprocessing import resource_tracker
+from rag.inference_workers import InferencePool, attach_shared_memory, read_array, write_array
+
+
+class FakeProcess:
+    def __init__(self, name: str):
+        self.name = name
+        self.pid = 1
+
+    def kill(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeConn:
+    def close(self):
+        pass
+
+
+class FakeWorker:
+    """InferenceWorker stand-in: start() fails `failures` times, call() raises `error` if set"""
+
+    def __init__(self, index: int = 0, failures: int = 0, error: Exception = None):
+        self.index = index
+        self.failures = failures
+        self.error = error
+        self.starts = 0
+        self.process = FakeProcess(f"inference-test-{index}")
+        self.conn = FakeConn()
+
+    def start(self):
+        self.starts += 1
+
+    def wait_ready(self, timeout):
+        if self.starts <= self.failures:
+            raise RuntimeError("model failed to load")
+
+    def call(self, method, array, args, kwargs, timeout):
+        if self.error is not None:
+            raise self.error
+        return np.zeros(1)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(RagConfig, "INFERENCE_RESTART_ATTEMPTS", 3)
+    monkeypatch.setattr(RagConfig, "INFERENCE_RESTART_BACKOFF", 0.001)
+    pool = InferencePool("embed", 1, threads=1, slot_mb=1, timeout=0.2)
+    yield pool
+    pool.close()
+
+
+def test_arrays_round_trip_through_the_slot():
+    buffer = memoryview(bytearray(64))
+    array = np.arange(6, dtype=np.float32).reshape(2, 3)
+    assert np.array_equal(read_array(buffer, write_array(buffer, array)), array)
+    # Too large for the slot: passed inline
+    large = np.zeros(100, dtype=np.float32)
+    assert "inline" in write_array(buffer, large)
+
+
+def test_attaching_does_not_register_with_the_resource_tracker(pool, monkeypatch):
+    registered = []
+    monkeypatch.setattr(resource_tracker, "register", lambda name, rtype: registered.append(name))
+    shm = attach_shared_memory(pool.workers[0].shm.name)
+    shm.close()
+    assert registered == []
+
+
+def test_handler_error_returns_the_worker(pool):
+    worker = FakeWorker(error=RuntimeError("inference-test-0: ValueError: bad input"))
+    pool._idle = type(pool._idle)()
+    pool._idle.put(worker)
+    with pytest.raises(RuntimeError, match="bad input"):
+        pool.call("encode")
+    assert pool._idle.qsize() == 1
+    assert not pool.degraded
+
+
+def test_transport_error_restarts_the_worker_in_the_background(pool):
+    worker = FakeWorker(error=EOFError())
+    pool._idle = type(pool._idle)()
+    pool._idle.put(worker)
+    with pytest.raises(RuntimeError, match="Inference worker failed"):
+        pool.call("encode")
+    deadline = time.monotonic() + 2
+    while pool._idle.qsize() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.starts == 1
+    assert pool._idle.qsize() == 1
+    assert not pool.degraded
+
+
+def test_restart_retries_with_backoff(pool):
+    worker = FakeWorker(failures=2)
+    pool.restarting.add(worker.index)
+    pool._restart(worker)
+    assert worker.starts == 3
+    assert pool._idle.get_nowait() is worker
+    assert not pool.degraded
+
+
+def test_restart_gives_up_and_marks_the_pool(pool):
+    worker = FakeWorker(failures=10)
+    pool.restarting.add(worker.index)
+    pool._restart(worker)
+    assert worker.starts == RagConfig.INFERENCE_RESTART_ATTEMPTS
+    assert pool.degraded
+    assert not pool.available
+    assert pool.get_stats()["failed"] == 1
+    # Fails fast instead of waiting for a worker that will never come back
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="no workers left"):
+        pool.call("encode")
+    assert time.monotonic() - start < pool.timeout
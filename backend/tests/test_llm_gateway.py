@@ -0,0 +1,230 @@
+import asyncio
+import time
+
+import pytest
+
+from rag.llm_gateway import (
+    LLMGateway,
+    LLMDeadlineExceededError,
+    LLMQueueFullError,
+    LLMUnavailableError,
+    TokenBucket,
+)
+
+
+class StatusError(Exception):
+    """Error carrying an HTTP status, like the Gemini client errors"""
+
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class StubLLM:
+    """Stands in for GeminiLLM: records prompts and answers after a delay"""
+
+    def __init__(self, delay: float = 0.0, errors=None):
+        self.delay = delay
+        self.errors = list(errors or [])
+        self.prompts = []
+        self.call_times = []
+        self.cancelled = 0
+
+    async def agenerate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        self.call_times.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"answer: {prompt}"
+
+
+def make_gateway(llm, **kwargs) -> LLMGateway:
+    options = dict(
+        requests_per_minute=6000,
+        min_interval=0.0,
+        burst_size=100,
+        max_queue_size=50,
+        max_concurrency=4,
+        max_retries=3,
+        backoff_base=0.01,
+        backoff_max=0.05,
+    )
+    options.update(kwargs)
+    return LLMGateway(llm, **options)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        await bucket.acquire()
+    # First token is there already, the other four come at 20/s
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_deadline():
+    bucket = TokenBucket(rate=1, capacity=1)
+    await bucket.acquire()
+    with pytest.raises(LLMDeadlineExceededError):
+        await bucket.acquire(deadline=time.monotonic() + 0.1)
+
+
+@pytest.mark.asyncio
+async def test_gateway_respects_rate():
+    llm = StubLLM()
+    gateway = make_gateway(llm, requests_per_minute=60 * 20, burst_size=1)
+    await asyncio.gather(*(gateway.generate(f"q{i}") for i in range(5)))
+    spacing = [b - a for a, b in zip(llm.call_times, llm.call_times[1:])]
+    assert min(spacing) >= 1 / 20 * 0.8
+
+
+@pytest.mark.asyncio
+async def test_round_robin_across_clients():
+    llm = StubLLM()
+    gateway = make_gateway(llm, requests_per_minute=60 * 50, burst_size=1, max_concurrency=1)
+    calls = [gateway.generate(f"a{i}", client_id="a") for i in range(3)]
+    calls += [gateway.generate(f"b{i}", client_id="b") for i in range(3)]
+    await asyncio.gather(*calls)
+    # The heavy client's backlog does not delay the other client's first request
+    assert llm.prompts == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("code", [429, 500, 503])
+async def test_retries_429_and_5xx(code):
+    llm = StubLLM(errors=[StatusError(code), StatusError(code)])
+    gateway = make_gateway(llm)
+    assert await gateway.generate("q") == "answer: q"
+    assert len(llm.prompts) == 3
+    assert gateway.counters["retries"] == 2
+    # Backoff: the retries are spaced out
+    assert llm.call_times[1] - llm.call_times[0] >= 0.01 * 0.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("code", [400, 403, 404])
+async def test_no_retry_on_4xx(code):
+    llm = StubLLM(errors=[StatusError(code)])
+    gateway = make_gateway(llm)
+    with pytest.raises(LLMUnavailableError):
+        await gateway.generate("q")
+    assert len(llm.prompts) == 1
+    assert gateway.counters["retries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    llm = StubLLM(errors=[StatusError(503)] * 10)
+    gateway = make_gateway(llm, max_retries=2)
+    with pytest.raises(LLMUnavailableError):
+        await gateway.generate("q")
+    assert len(llm.prompts) == 3
+
+
+@pytest.mark.asyncio
+async def test_deadline_expires_while_queued():
+    llm = StubLLM(delay=0.3)
+    gateway = make_gateway(llm, max_concurrency=1)
+    first = asyncio.ensure_future(gateway.generate("slow", timeout=5))
+    await asyncio.sleep(0.01)
+    with pytest.raises(LLMDeadlineExceededError):
+        await gateway.generate("late", timeout=0.05)
+    assert await first == "answer: slow"
+    assert llm.prompts == ["slow"]
+    assert gateway.counters["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_full_is_rejected():
+    llm = StubLLM(delay=0.2)
+    gateway = make_gateway(llm, max_queue_size=2, max_concurrency=1)
+    running = asyncio.ensure_future(gateway.generate("running"))
+    await asyncio.sleep(0.01)
+    # Taken off the queue by the dispatcher, waits for the busy slot
+    next_up = asyncio.ensure_future(gateway.generate("next"))
+    await asyncio.sleep(0.01)
+    queued = [asyncio.ensure_future(gateway.generate(f"q{i}")) for i in range(2)]
+    await asyncio.sleep(0)
+    assert gateway.queue_depth == 2
+    with pytest.raises(LLMQueueFullError) as error:
+        await gateway.generate("rejected")
+    assert error.value.retry_after > 0
+    assert gateway.counters["rejected"] == 1
+    await asyncio.gather(running, next_up, *queued)
+    assert "rejected" not in llm.prompts
+
+
+@pytest.mark.asyncio
+async def test_cancelled_while_queued_never_reaches_llm():
+    llm = StubLLM(delay=0.1)
+    gateway = make_gateway(llm, max_concurrency=1)
+    first = asyncio.ensure_future(gateway.generate("first"))
+    second = asyncio.ensure_future(gateway.generate("second"))
+    await asyncio.sleep(0.01)
+    second.cancel()
+    assert await first == "answer: first"
+    await asyncio.sleep(0.05)
+    assert llm.prompts == ["first"]
+    # The slot the cancelled request would have used is free
+    assert await gateway.generate("third") == "answer: third"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_callers_leave_the_queue_at_once():
+    llm = StubLLM(delay=0.2)
+    gateway = make_gateway(llm, max_queue_size=2, max_concurrency=1)
+    running = asyncio.ensure_future(gateway.generate("running"))
+    await asyncio.sleep(0.01)
+    next_up = asyncio.ensure_future(gateway.generate("next"))
+    await asyncio.sleep(0.01)
+    gone = [asyncio.ensure_future(gateway.generate(f"gone{i}", client_id="b")) for i in range(2)]
+    await asyncio.sleep(0)
+    assert gateway.queue_depth == 2
+    for call in gone:
+        call.cancel()
+    await asyncio.sleep(0)
+    # Not rejected as full although the dispatcher has not popped the cancelled entries yet
+    assert gateway.queue_depth == 0
+    queued = [asyncio.ensure_future(gateway.generate(f"q{i}")) for i in range(2)]
+    await asyncio.gather(running, next_up, *queued)
+    assert gateway.counters["rejected"] == 0
+    assert gateway.counters["cancelled"] == 2
+    assert gateway.queue_depth == 0
+    assert not any(prompt.startswith("gone") for prompt in llm.prompts)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_while_rate_limited_never_reaches_llm():
+    llm = StubLLM()
+    gateway = make_gateway(llm, requests_per_minute=60 * 10, burst_size=1)
+    assert await gateway.generate("first") == "answer: first"
+    # The bucket is empty: this one waits ~0.1s for a token and is cancelled meanwhile
+    waiting = asyncio.ensure_future(gateway.generate("second"))
+    await asyncio.sleep(0.02)
+    waiting.cancel()
+    await asyncio.sleep(0.15)
+    assert llm.prompts == ["first"]
+    assert gateway.counters["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_mid_call_cancels_llm_call():
+    llm = StubLLM(delay=1.0)
+    gateway = make_gateway(llm, max_concurrency=1)
+    call = asyncio.ensure_future(gateway.generate("slow"))
+    await asyncio.sleep(0.05)
+    assert gateway.in_flight == 1
+    call.cancel()
+    await asyncio.sleep(0.05)
+    assert llm.cancelled == 1
+    assert gateway.in_flight == 0
+    # The concurrency slot was released
+    llm.delay = 0
+    assert await gateway.generate("next") == "answer: next"
@@ -0,0 +1,65 @@
+import json
+import logging
+import sys
+
+import pytest
+
+from utils import logger as logger_module
+from utils.logger import JsonFormatter, RequestContextFilter, end_request_context, start_request_context
+
+
+def make_record(level: int = logging.INFO, msg: str = "hello %s", args=("world",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("asksnake.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = make_record(request_id="req-1", stage="embed", elapsed_ms=12.5)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["msg"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "asksnake.test"
+    assert entry["request_id"] == "req-1"
+    assert entry["stage"] == "embed"
+    assert entry["elapsed_ms"] == 12.5
+
+
+def test_json_formatter_serializes_exceptions_and_unicode():
+    try:
+        raise ValueError("rắn hổ mang")
+    except ValueError:
+        record = make_record(level=logging.ERROR, msg="failed", args=None)
+        record.exc_info = sys.exc_info()
+
+    line = JsonFormatter().format(record)
+
+    assert "rắn hổ mang" in line
+    assert "ValueError" in json.loads(line)["exc_info"]
+
+
+def test_filter_attaches_the_request_id():
+    tokens = start_request_context("req-2")
+    try:
+        record = make_record()
+        assert RequestContextFilter().filter(record)
+        assert record.request_id == "req-2"
+    finally:
+        end_request_context(tokens)
+    record = make_record()
+    RequestContextFilter().filter(record)
+    assert record.request_id is None
+
+
+@pytest.mark.parametrize("sampled", [True, False])
+def test_debug_lines_follow_the_request_sampling_decision(monkeypatch, sampled):
+    monkeypatch.setattr(logger_module, "LOG_DEBUG_SAMPLE_RATE", 1.0 if sampled else 0.0)
+    tokens = start_request_context("req-3")
+    try:
+        assert RequestContextFilter().filter(make_record(level=logging.DEBUG)) is sampled
+        # Higher levels are never sampled away
+        assert RequestContextFilter().filter(make_record(level=logging.WARNING)) is True
+    finally:
+        end_request_context(tokens)
@@ -0,0 +1,52 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from utils.metrics import record_cache, stage_timer
+from utils.profiling import ProfileSession, _active_session
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_timer_records_histogram_and_request_timings():
+    labels = {"stage": "test_embed", "backend": "cpu", "model": "e5"}
+    before = sample("asksnake_stage_latency_seconds_count", **labels)
+    timings = {}
+
+    with stage_timer("test_embed", timings, backend="cpu", model="e5"):
+        pass
+
+    assert sample("asksnake_stage_latency_seconds_count", **labels) == before + 1
+    assert timings["test_embed"] >= 0
+
+
+def test_stage_timer_records_failed_stages():
+    timings = {}
+    with pytest.raises(RuntimeError):
+        with stage_timer("test_failing", timings):
+            raise RuntimeError("boom")
+    assert "test_failing" in timings
+    assert sample("asksnake_stage_latency_seconds_count", stage="test_failing", backend="", model="") == 1
+
+
+def test_stage_timer_reports_to_the_active_profile():
+    session = ProfileSession("/chat/prompt", "admin")
+    token = _active_session.set(session)
+    try:
+        with stage_timer("test_profiled"):
+            pass
+    finally:
+        _active_session.reset(token)
+    assert "test_profiled" in session.timings
+
+
+def test_record_cache_counts_hits_and_misses():
+    hits = sample("asksnake_cache_events_total", cache="test_cache", result="hit")
+    misses = sample("asksnake_cache_events_total", cache="test_cache", result="miss")
+
+    record_cache("test_cache", 3, 0)
+    record_cache("test_cache", 0, 2)
+
+    assert sample("asksnake_cache_events_total", cache="test_cache", result="hit") == hits + 3
+    assert sample("asksnake_cache_events_total", cache="test_cache", result="miss") == misses + 2
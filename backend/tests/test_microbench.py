@@ -0,0 +1,37 @@
+import argparse
+
+import numpy as np
+
+from benchmarks.microbench import bench_chunk, measure, synthetic_text, synthetic_vectors
+
+
+def test_measure_runs_warmup_timed_and_traced_runs():
+    calls = []
+
+    result = measure("case", lambda: calls.append(bytearray(1024)), repeat=3, warmup=2, size=1)
+
+    assert len(calls) == 2 + 3 + 1
+    assert result["name"] == "case"
+    assert result["params"] == {"size": 1}
+    assert result["repeat"] == 3
+    assert set(result["wall_ms"]) == {"min", "median", "mean", "stdev"}
+    assert result["wall_ms"]["min"] <= result["wall_ms"]["median"]
+    # The traced run allocated at least the kilobyte it kept
+    assert result["alloc_kib"] >= 1
+
+
+def test_synthetic_inputs_are_deterministic():
+    text = synthetic_text(45, seed=3)
+    assert text == synthetic_text(45, seed=3)
+    assert len(text.split()) == 45
+    assert text.count(".") == 3
+
+    vectors = synthetic_vectors(4, dimension=8)
+    assert vectors.shape == (4, 8)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_bench_chunk_covers_both_chunkers():
+    results = bench_chunk(argparse.Namespace(repeat=1))
+    assert {result["name"] for result in results} == {"chunk_by_words", "chunk_by_chars"}
+    assert sorted({result["params"]["words"] for result in results}) == [500, 2000, 10000]
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+from passlib.hash import bcrypt
+
+from services.AuthService import AuthService
+from utils import AuthUtlis
+from utils.AuthUtlis import BCRYPT_ROUNDS, AuthUtils
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_run_on_the_hashing_pool(monkeypatch):
+    threads = []
+    real_hash = AuthUtlis.pwd_context.hash
+
+    def recording_hash(password):
+        threads.append(threading.current_thread().name)
+        return real_hash(password)
+
+    monkeypatch.setattr(AuthUtlis.pwd_context, "hash", recording_hash)
+    hashed = await AuthUtils.ahash_password("secret-1")
+
+    assert threads[0].startswith("password-hash")
+    assert await AuthUtils.averify_password("secret-1", hashed)
+    assert not await AuthUtils.averify_password("secret-2", hashed)
+
+
+@pytest.mark.asyncio
+async def test_event_loop_keeps_running_while_hashing():
+    ticks = 0
+    stop = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.ensure_future(ticker())
+    # A costly work factor, so a blocking hash would starve the ticker
+    await AuthUtlis._run_hashing("password_hash", bcrypt.using(rounds=10).hash, "secret-1")
+    stop.set()
+    await task
+    assert ticks > 10
+
+
+@pytest.mark.asyncio
+async def test_verify_and_update_rehashes_other_work_factors():
+    old_hash = bcrypt.using(rounds=BCRYPT_ROUNDS + 1).hash("secret-1")
+
+    valid, new_hash = await AuthUtils.averify_and_update("secret-1", old_hash)
+    assert valid
+    assert new_hash is not None and new_hash != old_hash
+    assert bcrypt.from_string(new_hash).rounds == BCRYPT_ROUNDS
+
+    assert await AuthUtils.averify_and_update("secret-1", new_hash) == (True, None)
+    assert await AuthUtils.averify_and_update("wrong-1", old_hash) == (False, None)
+    # Unknown user: same work, no hash
+    assert await AuthUtils.averify_and_update("secret-1", None) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_login_upgrades_the_stored_hash(mongo):
+    old_hash = bcrypt.using(rounds=BCRYPT_ROUNDS + 1).hash("secret-1")
+    await mongo["users"].insert_one({"email": "user@example.com", "password": old_hash, "role": "user", "create_at": datetime.utcnow()})
+
+    token = await AuthService.get_token("user@example.com", "secret-1")
+
+    assert token.access_token
+    stored = (await mongo["users"].find_one({"email": "user@example.com"}))["password"]
+    assert stored != old_hash
+    assert bcrypt.from_string(stored).rounds == BCRYPT_ROUNDS
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.profiling import ProfileSession
+
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def profiled_request():
+    for _ in range(5):
+        busy(0.02)
+        await asyncio.sleep(0)
+
+
+async def other_request():
+    for _ in range(5):
+        busy(0.02)
+        await asyncio.sleep(0)
+
+
+async def run_profiled(session: ProfileSession):
+    token = session.start()
+    try:
+        # Child task, like Starlette's call_next
+        await asyncio.create_task(profiled_request())
+    finally:
+        session.stop(token)
+
+
+@pytest.mark.asyncio
+async def test_profile_only_samples_its_own_tasks():
+    session = ProfileSession("/chat/prompt", "admin")
+    session.sampler.interval = 0.002
+
+    await asyncio.gather(run_profiled(session), other_request())
+
+    stacks = session.collapsed_stacks()
+    assert "profiled_request" in stacks
+    assert "other_request" not in stacks
+    assert session.sampler.other_task_samples > 0
+    assert session.summary()["other_task_samples"] == session.sampler.other_task_samples
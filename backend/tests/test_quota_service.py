@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.rag_config import RagConfig
+from services.QuotaService import QUOTA_COLLECTION, QUOTA_DAILY_COLLECTION, QuotaExceededError, QuotaService
+
+USER = {"_id": "u1"}
+
+
+@pytest.fixture
+def quota(mongo, monkeypatch):
+    monkeypatch.setattr(RagConfig, "USE_QUOTA", True)
+    service = QuotaService()
+    service.limits = {"user": (1.0, 3), "ip": (10.0, 100)}
+    return service
+
+
+@pytest.mark.asyncio
+async def test_burst_is_enforced_and_rejections_cost_nothing(quota):
+    for _ in range(3):
+        await quota.consume(USER, "1.2.3.4")
+    with pytest.raises(QuotaExceededError) as error:
+        await quota.consume(USER, "1.2.3.4")
+    assert error.value.retry_after >= 1
+
+    ip_bucket = quota._buckets["ip:1.2.3.4"]
+    assert ip_bucket.tokens == pytest.approx(97, abs=0.1)
+    assert quota._buckets["user:u1"].pending == {"requests": 3, "text_requests": 3, "rejected": 1}
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_totals_and_one_document_per_day(quota, mongo):
+    await quota.consume(USER, "1.2.3.4", kind="image")
+    await quota.flush()
+    await quota.consume(USER, "1.2.3.4")
+    await quota.flush()
+
+    totals = await mongo[QUOTA_COLLECTION].find_one({"_id": "user:u1"})
+    assert totals["usage"] == {"requests": 2, "image_requests": 1, "text_requests": 1}
+    assert "daily" not in totals
+
+    days = await mongo[QUOTA_DAILY_COLLECTION].find({"key": "user:u1"}).to_list(None)
+    assert len(days) == 1
+    assert days[0]["counters"] == {"requests": 2, "image_requests": 1, "text_requests": 1}
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    assert days[0]["expires_at"].replace(tzinfo=None) == today + timedelta(days=RagConfig.QUOTA_DAILY_RETENTION_DAYS)
+
+
+@pytest.mark.asyncio
+async def test_flush_drops_legacy_daily_field(quota, mongo):
+    await mongo[QUOTA_COLLECTION].insert_one({"_id": "user:u1", "usage": {"requests": 5}, "daily": {"2020-01-01": {"requests": 5}}})
+    await quota.consume(USER)
+    await quota.flush()
+
+    totals = await mongo[QUOTA_COLLECTION].find_one({"_id": "user:u1"})
+    assert totals["usage"]["requests"] == 6
+    assert "daily" not in totals
+
+
+@pytest.mark.asyncio
+async def test_usage_includes_unflushed_deltas_and_recent_days_only(quota, mongo, monkeypatch):
+    monkeypatch.setattr(RagConfig, "QUOTA_DAILY_RETENTION_DAYS", 2)
+    await mongo[QUOTA_DAILY_COLLECTION].insert_many([
+        {"_id": f"user:u1|{day}", "key": "user:u1", "day": day, "counters": {"requests": 1}}
+        for day in ("2020-01-01", "2020-01-02", "2020-01-03")
+    ])
+    await quota.consume(USER)
+
+    usage = await quota.get_usage("user:u1")
+
+    assert usage["usage"]["requests"] == 1
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    assert set(usage["daily"]) == {"2020-01-03", "2020-01-02", today}
+    assert usage["daily"][today] == {"requests": 1, "text_requests": 1}
+
+
+@pytest.mark.asyncio
+async def test_failed_daily_write_is_retried_without_double_counting_totals(quota, mongo, monkeypatch):
+    await quota.consume(USER)
+    collection_type = type(mongo[QUOTA_DAILY_COLLECTION])
+    real_bulk_write = collection_type.bulk_write
+    daily_down = True
+
+    async def bulk_write(self, *args, **kwargs):
+        if daily_down and self.name == QUOTA_DAILY_COLLECTION:
+            raise RuntimeError("down")
+        return await real_bulk_write(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "bulk_write", bulk_write)
+    await quota.flush()
+    assert len(quota._daily_backlog) == 1
+
+    daily_down = False
+    await quota.flush()
+
+    assert quota._daily_backlog == []
+    assert (await mongo[QUOTA_COLLECTION].find_one({"_id": "user:u1"}))["usage"]["requests"] == 1
+    assert (await mongo[QUOTA_DAILY_COLLECTION].find_one({"key": "user:u1"}))["counters"]["requests"] == 1
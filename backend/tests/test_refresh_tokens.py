@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from routers.auth_router import app_router as auth_router
+from services.AuthService import AuthService
+from services.RefreshTokenService import (
+    REFRESH_TOKEN_ROTATE_SECOND,
+    REVOCATION_COLLECTION,
+    TOKEN_COLLECTION,
+    RefreshTokenService,
+    token_key,
+    user_key,
+)
+from utils.AuthUtlis import AuthUtils
+
+
+async def add_user(mongo, email: str = "user@example.com") -> dict:
+    user = {"email": email, "password": "x", "role": "user", "create_at": datetime.utcnow()}
+    user["_id"] = (await mongo["users"].insert_one(user)).inserted_id
+    return user
+
+
+async def add_legacy_token(mongo, user: dict) -> str:
+    """Refresh token as issued before the jti: email claim only, full token stored"""
+    token = AuthUtils.create_token(data={"email": user["email"]}, expires_delta=3600)
+    await mongo[TOKEN_COLLECTION].insert_one({
+        "user_id": user["_id"], "token": token,
+        "create_at": datetime.utcnow(), "expires_at": datetime.utcnow() + timedelta(days=7)
+    })
+    return token
+
+
+@pytest.mark.asyncio
+async def test_legacy_refresh_token_is_accepted_once_and_rotated(mongo):
+    user = await add_user(mongo)
+    legacy = await add_legacy_token(mongo, user)
+
+    token = await AuthService.get_access_token(legacy)
+    assert token.refresh_token is not None
+    assert AuthUtils.verify_token(token.refresh_token)["jti"]
+    assert await mongo[TOKEN_COLLECTION].count_documents({"token": legacy}) == 0
+
+    with pytest.raises(HTTPException) as error:
+        await AuthService.get_access_token(legacy)
+    assert error.value.status_code == 401
+    # The rotated token works
+    assert (await AuthService.get_access_token(token.refresh_token)).access_token
+
+
+@pytest.mark.asyncio
+async def test_revoke_refresh_token_handles_every_token_kind(mongo):
+    user = await add_user(mongo)
+    legacy = await add_legacy_token(mongo, user)
+    current = (await AuthService.issue_tokens(user)).refresh_token
+
+    assert await AuthService.revoke_refresh_token(legacy) is True
+    assert await AuthService.revoke_refresh_token(current) is True
+    assert await AuthService.revoke_refresh_token(current) is False
+    assert await AuthService.revoke_refresh_token("not-a-jwt") is False
+    assert await AuthService.revoke_refresh_token(None) is False
+    assert await mongo[TOKEN_COLLECTION].count_documents({}) == 0
+
+
+@pytest.mark.parametrize("cookie", [None, "not-a-jwt", "expired", "legacy"])
+def test_logout_always_clears_cookies(mongo, cookie):
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+    client = TestClient(app)
+    if cookie == "expired":
+        cookie = AuthUtils.create_token(data={"email": "user@example.com"}, expires_delta=-10)
+    elif cookie == "legacy":
+        cookie = AuthUtils.create_token(data={"email": "user@example.com"}, expires_delta=3600)
+    if cookie is not None:
+        client.cookies.set("refresh_token", cookie)
+
+    response = client.post("/auth/logout")
+
+    assert response.status_code == 200
+    cleared = response.headers.get_list("set-cookie")
+    assert any(header.startswith("refresh_token=") for header in cleared)
+    assert any(header.startswith("access_token=") for header in cleared)
+
+
+@pytest.mark.asyncio
+async def test_only_a_hash_of_the_jti_is_stored(mongo):
+    service = RefreshTokenService()
+    jti, expires_at = await service.issue("u1", 3600)
+
+    document = await mongo[TOKEN_COLLECTION].find_one({})
+    assert document["_id"] == token_key(jti)
+    assert len(document["_id"]) == 16
+    assert jti.encode() not in document["_id"]
+    # MongoDB keeps milliseconds
+    assert abs(document["expires_at"] - expires_at) < timedelta(milliseconds=1)
+
+
+@pytest.mark.asyncio
+async def test_unrevoked_tokens_skip_the_database_after_sync(mongo):
+    service = RefreshTokenService()
+    jti, _ = await service.issue("u1", 3600)
+    # Before the first sync the filter is not trusted
+    assert await service.is_valid({"jti": jti, "uid": "u1"})
+    assert service.checked == 1
+
+    await service.sync()
+    assert await service.is_valid({"jti": jti, "uid": "u1"})
+    assert service.fast_path == 1
+
+
+@pytest.mark.asyncio
+async def test_revoked_tokens_are_rejected(mongo):
+    service = RefreshTokenService()
+    await service.sync()
+    jti, expires_at = await service.issue("u1", 3600)
+
+    assert await service.revoke(jti, expires_at) is True
+    assert await service.revoke(jti, expires_at) is False
+    assert not await service.is_valid({"jti": jti, "uid": "u1"})
+    assert await mongo[REVOCATION_COLLECTION].count_documents({"_id": token_key(jti)}) == 1
+
+
+@pytest.mark.asyncio
+async def test_revoke_user_rejects_all_of_their_tokens(mongo):
+    service = RefreshTokenService()
+    await service.sync()
+    first, _ = await service.issue("u1", 3600)
+    second, _ = await service.issue("u1", 3600)
+    other, _ = await service.issue("u2", 3600)
+
+    assert await service.revoke_user("u1", 3600) == 2
+
+    assert not await service.is_valid({"jti": first, "uid": "u1"})
+    assert not await service.is_valid({"jti": second, "uid": "u1"})
+    assert await service.is_valid({"jti": other, "uid": "u2"})
+
+
+@pytest.mark.asyncio
+async def test_revocations_of_other_processes_arrive_with_sync(mongo):
+    this_process, other_process = RefreshTokenService(), RefreshTokenService()
+    await this_process.sync()
+    jti, expires_at = await other_process.issue("u1", 3600)
+    await other_process.revoke(jti, expires_at)
+    # Until the next sync this process does not know (at most REFRESH_REVOCATION_SYNC_SECOND)
+    assert await this_process.is_valid({"jti": jti, "uid": "u1"})
+
+    await this_process.sync()
+    assert token_key(jti) in this_process.bloom
+    assert user_key("u1") not in this_process.bloom
+    assert not await this_process.is_valid({"jti": jti, "uid": "u1"})
+
+
+def test_should_rotate_near_expiry():
+    service = RefreshTokenService()
+    now = datetime.utcnow().timestamp()
+    assert service.should_rotate({"exp": now + REFRESH_TOKEN_ROTATE_SECOND - 60})
+    assert not service.should_rotate({"exp": now + REFRESH_TOKEN_ROTATE_SECOND + 60})
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import ASCENDING, IndexModel
+
+from services.SchemaService import SchemaService
+
+INDEXES = {
+    "refresh_token": [IndexModel([("user_id", ASCENDING)], name="user_id")],
+    "users": [IndexModel([("email", ASCENDING)], name="email_unique", unique=True)],
+}
+LEGACY_INDEXES = {
+    "refresh_token": [(IndexModel([("token", ASCENDING)], name="token"), {"token": {"$exists": True}})],
+}
+
+
+def indexes_of(report: dict, collection: str):
+    return report["collections"][collection]
+
+
+@pytest.mark.asyncio
+async def test_undeclared_indexes_are_dropped(mongo):
+    await mongo["users"].create_indexes([IndexModel([("name", ASCENDING)], name="old_name")])
+    service = SchemaService(INDEXES, LEGACY_INDEXES)
+
+    await service.ensure_indexes()
+
+    assert service.status == "ready"
+    assert indexes_of(service.report(), "users") == {"status": "ready", "indexes": ["email_unique"], "dropped": ["old_name"]}
+    assert set(await mongo["users"].index_information()) == {"_id_", "email_unique"}
+
+
+@pytest.mark.asyncio
+async def test_legacy_index_lives_as_long_as_legacy_documents(mongo):
+    await mongo["refresh_token"].insert_one({"token": "legacy", "expires_at": datetime.utcnow() + timedelta(days=1)})
+    service = SchemaService(INDEXES, LEGACY_INDEXES)
+    await service.ensure_indexes()
+    assert set(await mongo["refresh_token"].index_information()) == {"_id_", "user_id", "token"}
+
+    # Expired and removed by the TTL index: the next startup drops the lookup index
+    await mongo["refresh_token"].delete_many({"token": {"$exists": True}})
+    service = SchemaService(INDEXES, LEGACY_INDEXES)
+    await service.ensure_indexes()
+    assert indexes_of(service.report(), "refresh_token")["dropped"] == ["token"]
+    assert "token" not in await mongo["refresh_token"].index_information()
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_dropped_when_disabled(mongo):
+    await mongo["users"].create_indexes([IndexModel([("name", ASCENDING)], name="old_name")])
+    service = SchemaService(INDEXES, LEGACY_INDEXES, drop_undeclared=False)
+
+    await service.ensure_indexes()
+
+    assert "old_name" in await mongo["users"].index_information()
+
+
+@pytest.mark.asyncio
+async def test_failure_is_reported_not_raised(mongo):
+    await mongo["users"].insert_many([{"email": "a@example.com"}, {"email": "a@example.com"}])
+    service = SchemaService(INDEXES, LEGACY_INDEXES)
+
+    await service.ensure_indexes()
+
+    assert service.status == "failed"
+    assert indexes_of(service.report(), "users")["status"] == "failed"
+    assert indexes_of(service.report(), "refresh_token")["status"] == "ready"
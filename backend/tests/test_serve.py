@@ -0,0 +1,68 @@
+import argparse
+import time
+
+import pytest
+
+import serve
+from serve import Master
+
+
+def make_master(monkeypatch, uptimes):
+    """Master with one worker whose successive processes live for the given seconds (no fork)"""
+    args = argparse.Namespace(
+        workers=1, threads_per_worker=1, host="127.0.0.1", port=0, memory_report_interval=0,
+        min_uptime=10, restart_backoff=1, restart_backoff_max=5, max_rapid_restarts=3
+    )
+    master = Master(args)
+    uptimes = list(uptimes)
+    delays = []
+    pids = iter(range(100, 200))
+
+    def spawn(sock):
+        master.workers[next(pids)] = time.monotonic() - uptimes.pop(0)
+
+    def wait():
+        if not master.workers:
+            raise ChildProcessError
+        return next(iter(master.workers)), 256
+
+    def backoff(delay):
+        delays.append(delay)
+        return master.stopping
+
+    monkeypatch.setattr(master, "preload", lambda: None)
+    monkeypatch.setattr(master, "bind", lambda: None)
+    monkeypatch.setattr(master, "spawn", spawn)
+    monkeypatch.setattr(master.stopped, "wait", backoff)
+    monkeypatch.setattr(serve.os, "wait", wait)
+    monkeypatch.setattr(serve.signal, "signal", lambda *args: None)
+    return master, delays
+
+
+def test_rapid_failures_back_off_then_give_up(monkeypatch):
+    master, delays = make_master(monkeypatch, [0] * 10)
+
+    assert master.run() == 1
+
+    # Doubling from --restart-backoff; the fourth rapid failure exceeds --max-rapid-restarts
+    assert delays == [1, 2, 4]
+    assert master.rapid_failures == 4
+    assert master.stopping
+
+
+def test_worker_that_ran_long_enough_resets_the_backoff(monkeypatch):
+    # Two startup crashes, one crash after a long run, then crashes until giving up
+    master, delays = make_master(monkeypatch, [0, 0, 60] + [0] * 10)
+
+    assert master.run() == 1
+
+    assert delays == [1, 2, 1, 2, 4]
+
+
+def test_backoff_is_capped(monkeypatch):
+    master, delays = make_master(monkeypatch, [0] * 10)
+    master.args.max_rapid_restarts = 6
+
+    master.run()
+
+    assert delays == [1, 2, 4, 5, 5, 5]
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+class Work:
+    """Counts executions; each one waits until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight("test")
+    work = Work()
+    callers = [asyncio.ensure_future(flights.do("key", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    work.release.set()
+    results = await asyncio.gather(*callers)
+    assert work.calls == 1
+    assert [result for result, _ in results] == [1, 1, 1]
+    assert [shared for _, shared in results] == [False, True, True]
+    assert flights.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flights = SingleFlight("test")
+    work = Work()
+    work.release.set()
+    await asyncio.gather(flights.do("a", work), flights.do("b", work))
+    assert work.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_key_is_forgotten_after_completion():
+    flights = SingleFlight("test")
+    work = Work()
+    work.release.set()
+    await flights.do("key", work)
+    result, shared = await flights.do("key", work)
+    assert (result, shared) == (2, False)
+
+
+@pytest.mark.asyncio
+async def test_exception_reaches_every_waiter():
+    flights = SingleFlight("test")
+    started = asyncio.Event()
+
+    async def fail():
+        started.set()
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    callers = [asyncio.ensure_future(flights.do("key", fail)) for _ in range(2)]
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_one_waiter_cancelling_does_not_cancel_the_others():
+    flights = SingleFlight("test")
+    work = Work()
+    first = asyncio.ensure_future(flights.do("key", work))
+    second = asyncio.ensure_future(flights.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    work.release.set()
+    assert await second == (1, True)
+
+
+@pytest.mark.asyncio
+async def test_new_caller_after_all_waiters_cancelled_starts_fresh():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        try:
+            await asyncio.sleep(0.05)
+            return calls
+        except asyncio.CancelledError:
+            # Cleanup on cancellation (releasing a slot, ...) keeps the task unfinished a little longer
+            await asyncio.sleep(0.01)
+            raise
+
+    abandoned = asyncio.ensure_future(flights.do("key", work))
+    await asyncio.sleep(0)
+    abandoned.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await abandoned
+
+    # Must not join the cancelled execution
+    assert await flights.do("key", work) == (2, False)
+    assert flights.in_flight == 0
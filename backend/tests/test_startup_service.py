@@ -0,0 +1,98 @@
+import pytest
+from fastapi import HTTPException
+
+from config.rag_config import RagConfig
+from services.StartupService import StartupService
+
+
+class Model:
+    def __init__(self, fail_warm_up: bool = False):
+        self.fail_warm_up = fail_warm_up
+        self.warmed_up = False
+
+    def warm_up(self):
+        if self.fail_warm_up:
+            raise RuntimeError("warm-up failed")
+        self.warmed_up = True
+
+
+class Pool:
+    def __init__(self, available: bool = True, degraded: bool = False):
+        self.available = available
+        self.degraded = degraded
+
+    def get_stats(self):
+        return {"available": self.available}
+
+
+def broken():
+    raise OSError("weights not found")
+
+
+async def load_everything(service: StartupService, **instances):
+    for name in service.components:
+        await service._load(name, lambda name=name: instances.get(name) or Model())
+
+
+@pytest.mark.asyncio
+async def test_load_records_state_and_errors():
+    service = StartupService()
+    await service._load("image", Model)
+    await service._load("llm", broken)
+
+    assert service.components["image"].status == "ready"
+    assert service.components["image"].load_seconds is not None
+    assert service.components["llm"].status == "failed"
+    assert "weights not found" in service.components["llm"].error
+    assert not service.is_ready()
+
+
+@pytest.mark.asyncio
+async def test_ready_once_required_components_are_ready():
+    service = StartupService()
+    await load_everything(service)
+    # The reranker is optional
+    await service._load("reranker", broken)
+    assert service.is_ready()
+    assert service.report()["components"]["reranker"]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_warm_up_failure_only_costs_latency(monkeypatch):
+    monkeypatch.setattr(RagConfig, "WARMUP_ON_STARTUP", True)
+    service = StartupService()
+    rag, image = Model(), Model(fail_warm_up=True)
+    await load_everything(service, rag=rag, image=image)
+
+    await service.warm_up_components()
+
+    assert rag.warmed_up
+    assert service.components["image"].status == "ready"
+    assert service.components["image"].warmup_seconds is not None
+    assert service.cold_start_seconds is not None
+
+
+@pytest.mark.asyncio
+async def test_require_raises_503_until_ready():
+    service = StartupService()
+    with pytest.raises(HTTPException) as error:
+        service.require("rag")
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "10"
+
+    model = Model()
+    await service._load("rag", lambda: model)
+    assert service.require("rag") is model
+
+
+@pytest.mark.asyncio
+async def test_pools_make_readiness_degraded_or_failed():
+    service = StartupService()
+    await load_everything(service)
+
+    service.pools = {"embed": Pool(degraded=True)}
+    assert service.is_ready()
+    assert service.report()["degraded"] is True
+
+    service.pools = {"embed": Pool(available=False, degraded=True)}
+    assert not service.is_ready()
@@ -1,6 +1,10 @@
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from dotenv import load_dotenv
+from typing import Optional, Tuple
+from utils.metrics import stage_timer
+import asyncio
 import os
 import jwt
 import bcrypt
@@ -8,17 +12,50 @@ from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 
 load_dotenv()
 
+# bcrypt work factor for new hashes; hashes with other rounds are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so hashes run in parallel up to this many threads
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Built once: CryptContext setup is not free and it is safe to share between threads
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+# Read once: verify_token runs on every authenticated request
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+ALGORITHMS = [ALGORITHM]
+
+# Dedicated pool so a burst of logins cannot starve the default executor (asyncio.to_thread)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+async def _run_hashing(stage: str, fn, *args):
+    with stage_timer(stage, backend="bcrypt", model=str(BCRYPT_ROUNDS)):
+        return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+
+
 class AuthUtils:
     def create_token(data: dict, expires_delta: int = 86400) -> str:
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(seconds=expires_delta)
-        to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, os.getenv("SECRET_KEY"), algorithm=os.getenv("ALGORITHM"))
+        now = datetime.utcnow()
+        expire = now + timedelta(seconds=expires_delta)
+        # iat lets tokens issued before a password change be rejected
+        to_encode.update({"exp": expire, "iat": now})
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
+    def user_claims(user: dict) -> dict:
+        """Claims identifying a user in access/refresh tokens, so requests can skip the email lookup"""
+        return {"email": user["email"], "uid": str(user["_id"]), "role": user.get("role", "user")}
+
     def verify_token(token: str) -> dict:
         try:
-            payload = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
+            payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHMS)
             return payload
         except ExpiredSignatureError:
             raise ExpiredSignatureError("Token has expired")
@@ -26,9 +63,32 @@ class AuthUtils:
             raise InvalidTokenError("Invalid token")
 
     def hash_password(password: str) -> str:
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
         return pwd_context.hash(password)
 
     def verify_password(password: str, hashed_password: str) -> bool:
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        return pwd_context.verify(password, hashed_password)
\ No newline at end of file
+        return pwd_context.verify(password, hashed_password)
+
+    async def ahash_password(password: str) -> str:
+        """hash_password on the password hashing pool, without blocking the event loop"""
+        return await _run_hashing("password_hash", pwd_context.hash, password)
+
+    async def averify_password(password: str, hashed_password: str) -> bool:
+        """verify_password on the password hashing pool, without blocking the event loop"""
+        return await _run_hashing("password_verify", pwd_context.verify, password, hashed_password)
+
+    async def averify_and_update(password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and re-hash it if the stored hash uses another work factor
+
+        Args:
+            password: Plain password from the login form
+            hashed_password: Stored hash, None if the user does not exist
+
+        Returns:
+            tuple of (valid, new_hash) where new_hash is the hash to store, or None if the stored hash is current
+        """
+        if hashed_password is None:
+            # Spend the same time as a real check so unknown emails cannot be told apart by latency
+            await _run_hashing("password_verify", pwd_context.dummy_verify)
+            return False, None
+        return await _run_hashing("password_verify", pwd_context.verify_and_update, password, hashed_password)
@@ -0,0 +1,172 @@
+"""
+CPU thread budgets for the local models
+
+ConvNeXt, E5 and the cross-encoder otherwise each use torch's default intra-op thread
+count (all cores), so an image request and a text request running together
+oversubscribe every core. The budget splits the CPUs available to this process (CPU
+affinity and cgroup quota aware) between the models by RagConfig.CPU_BUDGET_WEIGHTS.
+"""
+from contextlib import contextmanager
+from config.rag_config import RagConfig
+from utils.logger import get_logger
+from typing import Dict
+import math
+import os
+
+logger = get_logger(__name__)
+
+MODEL_KINDS = ("image", "embed", "rerank")
+
+# Read by OpenMP/MKL/OpenBLAS when they initialize, i.e. only effective before torch/numpy are imported
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def cgroup_cpu_limit() -> float:
+    """
+    CPU quota of the container (cgroup v2 cpu.max or v1 cfs quota/period)
+
+    Returns:
+        Number of CPUs the quota allows, or None if unlimited / not in a cgroup
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs this process can actually use: min of affinity mask, cgroup quota and cpu_count"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def blas_env(threads: int) -> Dict[str, str]:
+    """Environment for a child process whose BLAS/OpenMP pools should use `threads` threads"""
+    return {name: str(threads) for name in BLAS_ENV_VARS}
+
+
+def _openmp_backend() -> bool:
+    import torch
+    return "OpenMP" in torch.__config__.parallel_info()
+
+
+class CpuBudget:
+    """
+    Intra-op thread budget per model for one process
+
+    Budgets are shares of the available CPUs by weight (RagConfig.CPU_BUDGET_WEIGHTS),
+    overridable per model (RagConfig.CPU_BUDGET_THREADS), at least 1 thread each.
+    """
+
+    def __init__(self, cpus: int = None, weights: Dict[str, float] = None, overrides: Dict[str, int] = None):
+        """
+        Args:
+            cpus: CPUs to split (default: available_cpus())
+            weights: Relative share per model kind
+            overrides: Fixed thread counts per model kind
+        """
+        self.configure(cpus, weights, overrides)
+        self._per_thread = None
+
+    def configure(self, cpus: int = None, weights: Dict[str, float] = None, overrides: Dict[str, int] = None):
+        """Recompute the budgets (e.g. in a serve.py worker that owns only part of the machine)"""
+        self.cpus = cpus or available_cpus()
+        weights = weights or RagConfig.CPU_BUDGET_WEIGHTS
+        overrides = overrides if overrides is not None else RagConfig.CPU_BUDGET_THREADS
+        total_weight = sum(weights.get(kind, 1) for kind in MODEL_KINDS)
+        self.threads = {
+            kind: max(1, int(overrides.get(kind) or self.cpus * weights.get(kind, 1) // total_weight))
+            for kind in MODEL_KINDS
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return RagConfig.CPU_THREAD_BUDGET == "auto"
+
+    def threads_for(self, kind: str, workers: int = 1) -> int:
+        """
+        Threads per worker process for a model served by `workers` processes
+
+        Args:
+            kind: "image", "embed" or "rerank"
+            workers: Number of processes sharing the model's budget
+
+        Returns:
+            Intra-op threads for each of those processes
+        """
+        return max(1, self.threads[kind] // max(1, workers))
+
+    def apply_process(self, intra_op: int = None, inter_op: int = None):
+        """
+        Set the process-wide torch thread pools (call once at startup, before inference)
+
+        Args:
+            intra_op: Intra-op threads (default: the available CPUs)
+            inter_op: Inter-op threads (default: RagConfig.CPU_INTER_OP_THREADS)
+        """
+        import torch
+        torch.set_num_threads(intra_op or self.cpus)
+        try:
+            torch.set_num_interop_threads(inter_op or RagConfig.CPU_INTER_OP_THREADS)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work of the process
+            pass
+
+    @contextmanager
+    def limit(self, kind: str):
+        """
+        Run one model call within its intra-op budget
+
+        torch's OpenMP backend keeps the thread count per calling thread, so concurrent
+        image and text calls each get their own budget; other backends share one pool
+        and are left alone.
+        """
+        if not self.enabled:
+            yield
+            return
+        import torch
+        if self._per_thread is None:
+            self._per_thread = _openmp_backend()
+            if not self._per_thread:
+                logger.warning("torch is not using OpenMP; per-model thread budgets are disabled")
+        if not self._per_thread:
+            yield
+            return
+        previous = torch.get_num_threads()
+        torch.set_num_threads(self.threads[kind])
+        try:
+            yield
+        finally:
+            torch.set_num_threads(previous)
+
+    def to_dict(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "cpus": self.cpus,
+            "cgroup_limit": cgroup_cpu_limit(),
+            "threads": self.threads,
+            "inter_op_threads": RagConfig.CPU_INTER_OP_THREADS
+        }
+
+
+cpu_budget = CpuBudget()
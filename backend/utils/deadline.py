@@ -0,0 +1,69 @@
+from config.rag_config import RagConfig
+from typing import Dict
+import threading
+import time
+
+# Optional client-supplied budget in ms; it can only tighten the server default
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class Deadline:
+    """Latency budget of one request (time.monotonic() based)"""
+
+    def __init__(self, budget: float = RagConfig.REQUEST_DEADLINE):
+        """
+        Args:
+            budget: Seconds from now until the request should be answered (None = no deadline)
+        """
+        self.started_at = time.monotonic()
+        self.budget = budget
+        self.at = self.started_at + budget if budget is not None else None
+
+    @classmethod
+    def from_header(cls, value: str = None) -> "Deadline":
+        """Server default budget, shortened by the client's X-Request-Deadline-Ms header if given"""
+        budget = RagConfig.REQUEST_DEADLINE
+        try:
+            if value is not None and float(value) > 0:
+                client_budget = float(value) / 1000
+                budget = client_budget if budget is None else min(budget, client_budget)
+        except ValueError:
+            pass
+        return cls(budget)
+
+    def remaining(self) -> float:
+        """Seconds left (inf without a deadline, negative once exceeded)"""
+        if self.at is None:
+            return float("inf")
+        return self.at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "budget_ms": round(self.budget * 1000) if self.budget is not None else None,
+            "elapsed_ms": round((time.monotonic() - self.started_at) * 1000, 2)
+        }
+
+
+class LatencyEstimator:
+    """EWMA of recent stage durations, used to decide what still fits in a deadline"""
+
+    def __init__(self, defaults: Dict[str, float], smoothing: float = 0.2):
+        """
+        Args:
+            defaults: Initial estimate in seconds per stage (used until the stage is observed)
+            smoothing: Weight of the newest observation
+        """
+        self.estimates = dict(defaults)
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            previous = self.estimates.get(stage)
+            self.estimates[stage] = seconds if previous is None else (1 - self.smoothing) * previous + self.smoothing * seconds
+
+    def estimate(self, stage: str) -> float:
+        return self.estimates.get(stage, 0.0)
@@ -0,0 +1,125 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose DEBUG lines are kept (decided once per request)
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default=None)
+debug_sampled_var: ContextVar[bool] = ContextVar("debug_sampled", default=None)
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with request id and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key != "request_id":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the request id and drop DEBUG lines of requests that were not sampled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if record.levelno <= logging.DEBUG:
+            sampled = debug_sampled_var.get()
+            if sampled is None:
+                sampled = random.random() < LOG_DEBUG_SAMPLE_RATE
+            return sampled
+        return True
+
+
+def setup_logging():
+    """
+    Route "asksnake.*" loggers through a queue so request handlers never block on stdout
+
+    Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger("asksnake")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _start_listener(log_queue)
+    atexit.register(lambda: _listener.stop())
+    # The listener thread does not survive fork (serve.py workers): start a new one in the child
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def _start_listener(log_queue):
+    global _listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_after_fork():
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _start_listener(log_queue)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Get a structured logger under the "asksnake" namespace"""
+    setup_logging()
+    return logging.getLogger(f"asksnake.{name}")
+
+
+def start_request_context(request_id: str):
+    """
+    Bind a request id to the current context and decide DEBUG sampling for it
+
+    Returns:
+        Tokens to pass to end_request_context
+    """
+    return (
+        request_id_var.set(request_id),
+        debug_sampled_var.set(random.random() < LOG_DEBUG_SAMPLE_RATE),
+    )
+
+
+def end_request_context(tokens):
+    """Restore the context saved by start_request_context"""
+    request_token, sampled_token = tokens
+    request_id_var.reset(request_token)
+    debug_sampled_var.reset(sampled_token)
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+from utils.profiling import current_session
+import time
+
+# Buckets cover fast local stages (ms) up to rate-limited LLM calls (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_LATENCY = Histogram(
+    "asksnake_stage_latency_seconds",
+    "Latency of request pipeline stages",
+    ["stage", "backend", "model"],
+    buckets=LATENCY_BUCKETS
+)
+
+QUEUE_DEPTH = Gauge(
+    "asksnake_queue_depth",
+    "Requests waiting in a queue",
+    ["queue"]
+)
+
+QUEUE_WAIT = Histogram(
+    "asksnake_queue_wait_seconds",
+    "Time requests spent waiting in a queue",
+    ["queue"],
+    buckets=LATENCY_BUCKETS
+)
+
+CACHE_EVENTS = Counter(
+    "asksnake_cache_events_total",
+    "Cache lookups by result",
+    ["cache", "result"]
+)
+
+RERANK_DECISIONS = Counter(
+    "asksnake_rerank_decisions_total",
+    "Adaptive re-ranking decisions (full, pruned or skipped)",
+    ["decision"]
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "asksnake_admission_in_flight",
+    "Requests currently admitted to a stage",
+    ["stage"]
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "asksnake_admission_rejections_total",
+    "Requests shed by admission control",
+    ["stage", "reason"]
+)
+
+COMPONENT_STARTUP = Gauge(
+    "asksnake_component_startup_seconds",
+    "Time to load or warm up a component at startup",
+    ["component", "phase"]
+)
+
+COLD_START = Gauge(
+    "asksnake_cold_start_seconds",
+    "Time from process start until all required components were ready"
+)
+
+
+@contextmanager
+def stage_timer(stage: str, timings: dict = None, backend: str = "", model: str = ""):
+    """
+    Time a pipeline stage into the latency histogram
+
+    Args:
+        stage: Stage name (embed, vector_search, rerank, context_assembly, llm, image, ...)
+        timings: Optional per-request dict receiving the stage duration in ms
+        backend: Backend label (e.g. qdrant, faiss, gemini, cpu)
+        model: Model label
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage, backend=backend, model=model).observe(elapsed)
+        if timings is not None:
+            timings[stage] = round(elapsed * 1000, 2)
+        session = current_session()
+        if session is not None:
+            session.timings[stage] = round(elapsed * 1000, 2)
+
+
+def record_cache(cache: str, hits: int, misses: int):
+    """Count cache hits and misses"""
+    if hits:
+        CACHE_EVENTS.labels(cache=cache, result="hit").inc(hits)
+    if misses:
+        CACHE_EVENTS.labels(cache=cache, result="miss").inc(misses)
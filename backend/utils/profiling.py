@@ -0,0 +1,255 @@
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from functools import wraps
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import weakref
+
+load_dotenv()
+
+# Fraction of /chat/prompt requests profiled without the admin header (0 = only on request)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # seconds between stack samples
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+PROFILE_HEADER = "X-Profile"
+
+_active_session: ContextVar["ProfileSession"] = ContextVar("active_profile_session", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _install_task_tracking(loop):
+    """
+    Wrap the loop's task factory (once) so tasks created while a request is profiled join its session
+
+    Covers the tasks a request spawns (Starlette's call_next, gather, create_task, ...):
+    they inherit the creator's context, where the session is set.
+    """
+    previous = loop.get_task_factory()
+    if getattr(previous, "tracks_profile_tasks", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        session = context.get(_active_session) if context is not None else _active_session.get()
+        if session is not None:
+            session.tasks.add(task)
+        return task
+
+    factory.tracks_profile_tasks = True
+    loop.set_task_factory(factory)
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler for a set of threads
+
+    A daemon thread reads the registered threads' stacks every interval and counts
+    collapsed stacks ("root;caller;callee"), the input format of flame graph tools.
+    An event loop thread is shared by all requests: it is only sampled while one of
+    the given tasks is running on it.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        # Event loop samples taken while another request's task (or no task) was running
+        self.other_task_samples = 0
+        self._threads = {}
+        self._loops = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_thread(self, ident: int, label: str):
+        with self._lock:
+            self._threads[ident] = label
+
+    def remove_thread(self, ident: int):
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    def add_event_loop(self, ident: int, loop, tasks, label: str = "event_loop"):
+        """Sample the thread running loop, but only while one of tasks is the loop's current task"""
+        with self._lock:
+            self._threads[ident] = label
+            self._loops[ident] = (loop, tasks)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+                loops = dict(self._loops)
+            for ident, label in threads:
+                if ident in loops:
+                    loop, tasks = loops[ident]
+                    # Read after the frames: a task switch in between can misattribute one sample
+                    if asyncio.current_task(loop) not in tasks:
+                        self.other_task_samples += 1
+                        continue
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    stack.append(label)
+                    self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class ProfileSession:
+    """One profiled request: stack samples plus the stage timings recorded while it ran"""
+
+    def __init__(self, path: str, reason: str, request_id: str = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.reason = reason
+        self.request_id = request_id
+        self.started_at = time.time()
+        self.timings = {}
+        self.sampler = StackSampler()
+        # Event loop tasks of this request (see _install_task_tracking)
+        self.tasks = weakref.WeakSet()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.status_code = None
+
+    def start(self):
+        """Start sampling; call from the request's task on the event loop"""
+        loop = asyncio.get_running_loop()
+        _install_task_tracking(loop)
+        self.tasks.add(asyncio.current_task())
+        self.sampler.add_event_loop(threading.get_ident(), loop, self.tasks)
+        self.sampler.start()
+        return _active_session.set(self)
+
+    def stop(self, token, status_code: int = None):
+        _active_session.reset(token)
+        self.sampler.stop()
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        self.status_code = status_code
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "reason": self.reason,
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status_code": self.status_code,
+            "samples": self.sampler.samples,
+            "other_task_samples": self.sampler.other_task_samples,
+            "timings": self.timings
+        }
+
+    def collapsed_stacks(self) -> str:
+        """Flame graph input (flamegraph.pl, speedscope, ...): one "stack count" line per stack"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.sampler.stacks.most_common())
+
+    def call_tree(self, min_percent: float = 1.0) -> str:
+        """Top-down call tree with the share of samples spent in each frame"""
+        tree = {}
+        total = sum(self.sampler.stacks.values())
+        for stack, count in self.sampler.stacks.items():
+            node = tree
+            for frame in stack.split(";"):
+                child = node.setdefault(frame, [0, {}])
+                child[0] += count
+                node = child[1]
+
+        lines = []
+
+        def render(node: dict, depth: int):
+            for frame, (count, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+                percent = count / total * 100
+                if percent < min_percent:
+                    continue
+                lines.append(f"{'  ' * depth}{percent:5.1f}%  {frame}")
+                render(children, depth + 1)
+
+        if total:
+            render(tree, 0)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "call_tree": self.call_tree()}
+
+
+class ProfileStore:
+    """Keeps the most recent profiles in memory (per worker process) for the admin endpoints"""
+
+    def __init__(self, max_items: int = PROFILE_MAX_STORED):
+        self.max_items = max_items
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session: ProfileSession):
+        with self._lock:
+            self._profiles[session.id] = session
+            while len(self._profiles) > self.max_items:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> ProfileSession:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [session.summary() for session in reversed(self._profiles.values())]
+
+
+profile_store = ProfileStore()
+
+
+def should_sample() -> bool:
+    """Random sampling decision (never true when PROFILE_SAMPLE_RATE is 0)"""
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def current_session() -> ProfileSession:
+    """Profile session of the current request, or None"""
+    return _active_session.get()
+
+
+def profile_thread(label: str, fn):
+    """
+    Include a function run in a worker thread (asyncio.to_thread) in the request profile
+
+    Returns fn unchanged when the request is not profiled.
+    """
+    session = _active_session.get()
+    if session is None:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        session.sampler.add_thread(ident, label)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.sampler.remove_thread(ident)
+    return wrapper
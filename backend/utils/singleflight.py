@@ -0,0 +1,71 @@
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from utils.metrics import record_cache
+import asyncio
+
+
+class _Flight:
+    """One in-flight execution and the number of callers waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async calls into one execution
+
+    The first caller for a key starts the work; callers arriving with the same key while
+    it runs wait for the same result (or exception). The key is forgotten as soon as the
+    work finishes, so this is not a cache. If every waiter is cancelled the work is
+    cancelled too. Runs on one event loop; not thread-safe.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Label for the coalescing metrics (cache="singleflight_<name>")
+        """
+        self.name = name
+        self._flights: Dict[Any, _Flight] = {}
+
+    async def do(self, key: Any, fn: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per key among concurrent callers
+
+        Args:
+            key: Hashable key identifying identical calls
+            fn: Zero-argument coroutine function doing the work
+
+        Returns:
+            tuple of (result, shared) where shared is True if this caller joined another caller's execution
+        """
+        flight = self._flights.get(key)
+        if flight is not None and flight.task.cancelled():
+            # Abandoned by all its waiters; not forgotten yet only because its done callback has not run
+            flight = None
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.get_running_loop().create_task(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        record_cache(f"singleflight_{self.name}", int(shared), int(not shared))
+
+        flight.waiters += 1
+        try:
+            # shield: one caller going away must not cancel the others' result
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Forget first: a caller arriving before the done callback runs starts a new execution
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Any, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)